@@ -0,0 +1,34 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join('database', 'csi_data.db')
+SCHEMA_PATH = os.path.join('database', 'schema_v4.sql')
+
+def apply_schema():
+    print(f"Connecting to {DB_PATH}...")
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    print(f"Reading schema from {SCHEMA_PATH}...")
+    with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
+        cursor.executescript(f.read())
+
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(assembly_components)")}
+    if not columns:
+        print("ERROR: 'assembly_components' not found, apply schema_v3.sql first.")
+    elif 'crew_count' not in columns:
+        cursor.execute("ALTER TABLE assembly_components ADD COLUMN crew_count INTEGER DEFAULT 1")
+        print("Added assembly_components.crew_count")
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='assembly_dependencies'")
+    if cursor.fetchone():
+        print("SUCCESS: 'assembly_dependencies' table ready.")
+    else:
+        print("ERROR: 'assembly_dependencies' table NOT created.")
+
+    conn.commit()
+    conn.close()
+    print("Done.")
+
+if __name__ == "__main__":
+    apply_schema()
@@ -0,0 +1,38 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join('database', 'csi_data.db')
+SCHEMA_PATH = os.path.join('database', 'schema_v5.sql')
+
+def apply_schema():
+    print(f"Connecting to {DB_PATH}...")
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(assembly_components)")}
+    if 'crew_count' not in columns:
+        print("ERROR: assembly_components.crew_count missing, run apply_schema_v4.py first.")
+        conn.close()
+        return
+
+    print(f"Reading schema from {SCHEMA_PATH}...")
+    with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
+        cursor.executescript(f.read())
+
+    # Verify
+    plan = cursor.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM assembly_expansion WHERE assembly_id = 1"
+    ).fetchall()
+    for row in plan:
+        print(f"  {row[-1]}")
+    if any(row[-1].startswith('SCAN') for row in plan):
+        print("WARNING: assembly_expansion still scans a table.")
+    else:
+        print("SUCCESS: 'assembly_expansion' view uses the indexes.")
+
+    conn.commit()
+    conn.close()
+    print("Done.")
+
+if __name__ == "__main__":
+    apply_schema()
@@ -0,0 +1,34 @@
+import sqlite3
+import os
+import sys
+
+sys.path.insert(0, 'backend')
+from check_query_plans import check_query_plans
+
+DB_PATH = os.path.join('database', 'csi_data.db')
+SCHEMA_PATH = os.path.join('database', 'schema_v6.sql')
+
+def apply_schema():
+    print(f"Connecting to {DB_PATH}...")
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    print(f"Reading schema from {SCHEMA_PATH}...")
+    with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
+        cursor.executescript(f.read())
+
+    conn.commit()
+    conn.close()
+
+    # Verify
+    problems = check_query_plans(DB_PATH)
+    for problem in problems:
+        print(f"  {problem}")
+    if problems:
+        print("WARNING: some app.py queries still scan csi_items (see backend/check_query_plans.py).")
+    else:
+        print("SUCCESS: app.py queries use the csi_items indexes.")
+    print("Done.")
+
+if __name__ == "__main__":
+    apply_schema()
@@ -2,12 +2,16 @@ from flask import Flask, jsonify, request, send_from_directory
 from flask_cors import CORS
 import sqlite3
 import os
-import requests
 import json
+import hashlib
 
 app = Flask(__name__)
 CORS(app)
 
+# Per-route latency, SQL counts and the slow-request log (served at /metrics)
+from metrics import init_metrics, add_collector, metrics_response, record_llm_tokens
+init_metrics(app)
+
 import math
 
 # ===== Groq AI Configuration =====
@@ -38,47 +42,23 @@ elif GROQ_AVAILABLE and not GROQ_API_KEY:
 else:
     GROQ_CLIENT = None
 
-# User-provided Rates & Defaults
-RATES = {
-    "ar": {
-        "carpentry_m2_per_day_per_carpenter": 15,
-        "rebar_ton_per_day_per_steel_fixer": 0.8,
-        "concrete_m3_per_hour_pump": 20,
-        "crew_defaults": {
-            "excavation": "حفار + 2 عمّال",
-            "formwork": "4 نجّارين + 2 عمّال",
-            "rebar": "3 حدادين + 2 عمّال",
-            "pour": "فريق صب 6 عمّال",
-            "curing": "2 عمّال"
-        },
-        "equipment_defaults": {
-            "excavation": "حفّار + قلابات",
-            "formwork": "معدات يدويّة",
-            "rebar": "معدات حدادة",
-            "pour": "خلاطة + مضخة",
-            "curing": "رشّ مياه"
-        }
-    },
-    "en": {
-        "carpentry_m2_per_day_per_carpenter": 15,
-        "rebar_ton_per_day_per_steel_fixer": 0.8,
-        "concrete_m3_per_hour_pump": 20,
-        "crew_defaults": {
-            "excavation": "Excavator + 2 laborers",
-            "formwork": "4 carpenters + 2 laborers",
-            "rebar": "3 steel fixers + 2 laborers",
-            "pour": "Pouring crew 6 laborers",
-            "curing": "2 laborers"
-        },
-        "equipment_defaults": {
-            "excavation": "Excavator + trucks",
-            "formwork": "Hand tools",
-            "rebar": "Rebar tools",
-            "pour": "Mixer + pump",
-            "curing": "Water spray"
-        }
-    }
-}
+# Optional Gemini model for the conversational branch of /api/ai
+# (GEMINI_MODEL was referenced there but never defined)
+try:
+    import google.generativeai as genai
+    GEMINI_AVAILABLE = True
+except ImportError:
+    GEMINI_AVAILABLE = False
+
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+if GEMINI_AVAILABLE and GEMINI_API_KEY:
+    genai.configure(api_key=GEMINI_API_KEY)
+    GEMINI_MODEL = genai.GenerativeModel(os.environ.get("GEMINI_MODEL_NAME", "gemini-1.5-flash"))
+else:
+    GEMINI_MODEL = None
+
+# Element plans for /api/ai come from declarative templates (plan_templates.py)
+from planning import detect_scope, build_plan
 
 def parse_query(q):
     """Parse user query to extract quantity, unit, and scope/element type"""
@@ -104,715 +84,48 @@ def parse_query(q):
             except:
                 qty = None
 
-    # Detect scope/element type from keywords
-    # Order matters - more specific matches first
-    
-    # Slabs
-    if any(k in q for k in ["slab", "slabs", "بلاطة", "بلاطات", "سقف", "أسقف"]):
-        scope = "slabs"
-    # Beams
-    elif any(k in q for k in ["beam", "beams", "كمرة", "كمرات", "جسر", "جسور"]):
-        scope = "beams"
-    # Columns
-    elif any(k in q for k in ["column", "columns", "عمود", "أعمدة", "عامود"]):
-        scope = "columns"
-    # Piles
-    elif any(k in q for k in ["pile", "piles", "خازوق", "خوازيق"]):
-        scope = "piles"
-        # For piles, interpret qty as number of piles
-        unit = "piles"
-    # Strip foundations
-    elif any(k in q for k in ["strip", "continuous", "شريطي", "شريطية", "مستمر", "سملات"]):
-        scope = "strip_foundation"
-    # Raft foundations
-    elif any(k in q for k in ["raft", "mat", "labsha", "لبشة", "حصيرية"]):
-        scope = "raft_foundation"
-    # Isolated foundations (default foundation type)
-    elif any(k in q for k in ["foundation", "foundations", "أساسات", "قواعد", "isolated", "منفصلة", "منفصل"]):
-        scope = "isolated_foundations"
-    # Generic fallback
-    else:
-        scope = "unknown"
-
-    return qty, unit or "m3", scope
-
-def plan_isolated_foundations(qty_m3, lang):
-    L = RATES[lang]
-    rows = []
-
-    # Assumptions (Isolated: High Formwork Ratio)
-    formwork_area = qty_m3 * 1.2
-    rebar_ton = qty_m3 * 0.08
-    
-    carp_rate = L["carpentry_m2_per_day_per_carpenter"] * 4
-    rebar_rate = L["rebar_ton_per_day_per_steel_fixer"] * 3
-    pump_rate_m3_per_day = L["concrete_m3_per_hour_pump"] * 6
-
-    # Excavation
-    exc_days = math.ceil(qty_m3 / 40.0)
-    rows.append({
-        "task": "حفر" if lang == "ar" else "Excavation",
-        "qty": f"{qty_m3:.1f}",
-        "unit": "م³" if lang == "ar" else "m3",
-        "crew": L["crew_defaults"]["excavation"],
-        "equipment": L["equipment_defaults"]["excavation"],
-        "duration": f"{exc_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Formwork
-    form_days = math.ceil(formwork_area / carp_rate)
-    rows.append({
-        "task": "نجارة شدّات" if lang == "ar" else "Formwork",
-        "qty": f"{formwork_area:.1f}",
-        "unit": "م²" if lang == "ar" else "m2",
-        "crew": L["crew_defaults"]["formwork"],
-        "equipment": L["equipment_defaults"]["formwork"],
-        "duration": f"{form_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Rebar
-    rebar_days = math.ceil(rebar_ton / rebar_rate)
-    rows.append({
-        "task": "حدادة مسلّحة" if lang == "ar" else "Rebar",
-        "qty": f"{rebar_ton:.2f}",
-        "unit": "طن" if lang == "ar" else "ton",
-        "crew": L["crew_defaults"]["rebar"],
-        "equipment": L["equipment_defaults"]["rebar"],
-        "duration": f"{rebar_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Pouring
-    pour_days = math.ceil(qty_m3 / pump_rate_m3_per_day)
-    rows.append({
-        "task": "صب خرسانة" if lang == "ar" else "Concrete Pour",
-        "qty": f"{qty_m3:.1f}",
-        "unit": "م³" if lang == "ar" else "m3",
-        "crew": L["crew_defaults"]["pour"],
-        "equipment": L["equipment_defaults"]["pour"],
-        "duration": f"{pour_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Curing
-    cure_days = 7
-    rows.append({
-        "task": "معالجة خرسانة" if lang == "ar" else "Curing",
-        "qty": f"{qty_m3:.1f}",
-        "unit": "م³" if lang == "ar" else "m3",
-        "crew": L["crew_defaults"]["curing"],
-        "equipment": L["equipment_defaults"]["curing"],
-        "duration": f"{cure_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Overall text
-    if lang == "ar":
-        text = (
-            "تم توليد خطة للأساسات المنفصلة:\n"
-            f"- الكمية: {qty_m3} م³\n"
-            f"- تقدير شدّات: {formwork_area:.1f} م²\n"
-            f"- تقدير حديد: {rebar_ton:.2f} طن\n"
-            f"- المدة التقريبية: {exc_days + form_days + rebar_days + pour_days + cure_days} يوم"
-        )
-        notes = "معدلات تقريبية للأساسات المنفصلة."
-    else:
-        text = (
-            "Generated plan for Isolated Foundations:\n"
-            f"- Quantity: {qty_m3} m3\n"
-            f"- Formwork: {formwork_area:.1f} m2\n"
-            f"- Rebar: {rebar_ton:.2f} ton\n"
-            f"- Approx Duration: {exc_days + form_days + rebar_days + pour_days + cure_days} days"
-        )
-        notes = "Approximate rates for isolated footings."
-
-    return {
-        "text": text,
-        "table": { "rows": rows },
-        "notes": notes
-    }
-
-def plan_raft_foundation(qty_m3, lang):
-    L = RATES[lang]
-    rows = []
-
-    # Assumptions (Raft: Lower Formwork Ratio, Higher Rebar)
-    # Raft is mostly volume, less side area.
-    formwork_area = qty_m3 * 0.4  # significantly less per m3 than isolated
-    rebar_ton = qty_m3 * 0.10     # often heavier reinforcement (100kg/m3)
-    
-    carp_rate = L["carpentry_m2_per_day_per_carpenter"] * 4
-    rebar_rate = L["rebar_ton_per_day_per_steel_fixer"] * 3
-    pump_rate_m3_per_day = L["concrete_m3_per_hour_pump"] * 8  # Long pour days for rafts
-
-    # Excavation (Mass excavation)
-    exc_days = math.ceil(qty_m3 / 80.0) # Faster (larger equipment)
-    rows.append({
-        "task": "حفر لبشة" if lang == "ar" else "Mass Excavation",
-        "qty": f"{qty_m3:.1f}",
-        "unit": "م³" if lang == "ar" else "m3",
-        "crew": L["crew_defaults"]["excavation"],
-        "equipment": L["equipment_defaults"]["excavation"],
-        "duration": f"{exc_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Formwork
-    form_days = math.ceil(formwork_area / carp_rate)
-    rows.append({
-        "task": "نجارة جوانب اللبشة" if lang == "ar" else "Raft Side Formwork",
-        "qty": f"{formwork_area:.1f}",
-        "unit": "م²" if lang == "ar" else "m2",
-        "crew": L["crew_defaults"]["formwork"],
-        "equipment": L["equipment_defaults"]["formwork"],
-        "duration": f"{form_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Rebar (Takes longer usually)
-    rebar_days = math.ceil(rebar_ton / rebar_rate)
-    rows.append({
-        "task": "حدادة اللبشة" if lang == "ar" else "Raft Rebar",
-        "qty": f"{rebar_ton:.2f}",
-        "unit": "طن" if lang == "ar" else "ton",
-        "crew": L["crew_defaults"]["rebar"],
-        "equipment": L["equipment_defaults"]["rebar"],
-        "duration": f"{rebar_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Pouring (Massive pour)
-    pour_days = math.ceil(qty_m3 / pump_rate_m3_per_day)
-    rows.append({
-        "task": "صب خرسانة اللبشة" if lang == "ar" else "Raft Concrete Pour",
-        "qty": f"{qty_m3:.1f}",
-        "unit": "م³" if lang == "ar" else "m3",
-        "crew": "2x " + L["crew_defaults"]["pour"], # Double crew for raft
-        "equipment": "2x " + L["equipment_defaults"]["pour"],
-        "duration": f"{pour_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Curing
-    cure_days = 14 # Longer curing for mass concrete
-    rows.append({
-        "task": "معالجة (غمْر بالمياه)" if lang == "ar" else "Curing (Ponding)",
-        "qty": f"{qty_m3:.1f}",
-        "unit": "م³" if lang == "ar" else "m3",
-        "crew": L["crew_defaults"]["curing"],
-        "equipment": L["equipment_defaults"]["curing"],
-        "duration": f"{cure_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Overall text
-    if lang == "ar":
-        text = (
-            "تم توليد خطة للبشة الخرسانية (Raft):\n"
-            f"- الكمية: {qty_m3} م³\n"
-            f"- مساحة الجوانب التقديرية: {formwork_area:.1f} م²\n"
-            f"- حديد التسليح التقديري (100كجم/م³): {rebar_ton:.2f} طن\n"
-            f"- المدة الزمنية: {exc_days + form_days + rebar_days + pour_days + cure_days} يوم"
-        )
-        notes = "تم افتراض صب اللبشة باستخدام مضختين وفريقين لضمان الاستمرارية."
-    else:
-        text = (
-            "Generated plan for Raft Foundation (Mat):\n"
-            f"- Quantity: {qty_m3} m3\n"
-            f"- Side Formwork: {formwork_area:.1f} m2\n"
-            f"- Rebar (approx 100kg/m3): {rebar_ton:.2f} ton\n"
-            f"- Duration: {exc_days + form_days + rebar_days + pour_days + cure_days} days"
-        )
-        notes = "Assumed usage of 2 concrete pumps and double crew for massive pour continuity."
-
-    return {
-        "text": text,
-        "table": { "rows": rows },
-        "notes": notes
-    }
-
-def plan_strip_foundation(qty_m3, lang):
-    """Plan for strip/continuous foundations"""
-    L = RATES[lang]
-    rows = []
-
-    # Strip foundations have linear formwork
-    formwork_area = qty_m3 * 0.9  # Less than isolated, more than raft
-    rebar_ton = qty_m3 * 0.07    # 70 kg/m3 typical
-    
-    carp_rate = L["carpentry_m2_per_day_per_carpenter"] * 4
-    rebar_rate = L["rebar_ton_per_day_per_steel_fixer"] * 3
-    pump_rate_m3_per_day = L["concrete_m3_per_hour_pump"] * 6
-
-    # Excavation (Linear trenches)
-    exc_days = math.ceil(qty_m3 / 50.0)
-    rows.append({
-        "task": "حفر خنادق" if lang == "ar" else "Trench Excavation",
-        "qty": f"{qty_m3:.1f}",
-        "unit": "م³" if lang == "ar" else "m3",
-        "crew": L["crew_defaults"]["excavation"],
-        "equipment": L["equipment_defaults"]["excavation"],
-        "duration": f"{exc_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Formwork
-    form_days = math.ceil(formwork_area / carp_rate)
-    rows.append({
-        "task": "نجارة شدّات شريطية" if lang == "ar" else "Strip Formwork",
-        "qty": f"{formwork_area:.1f}",
-        "unit": "م²" if lang == "ar" else "m2",
-        "crew": L["crew_defaults"]["formwork"],
-        "equipment": L["equipment_defaults"]["formwork"],
-        "duration": f"{form_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Rebar
-    rebar_days = math.ceil(rebar_ton / rebar_rate)
-    rows.append({
-        "task": "حدادة مسلّحة" if lang == "ar" else "Rebar Installation",
-        "qty": f"{rebar_ton:.2f}",
-        "unit": "طن" if lang == "ar" else "ton",
-        "crew": L["crew_defaults"]["rebar"],
-        "equipment": L["equipment_defaults"]["rebar"],
-        "duration": f"{rebar_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Pouring
-    pour_days = math.ceil(qty_m3 / pump_rate_m3_per_day)
-    rows.append({
-        "task": "صب خرسانة" if lang == "ar" else "Concrete Pour",
-        "qty": f"{qty_m3:.1f}",
-        "unit": "م³" if lang == "ar" else "m3",
-        "crew": L["crew_defaults"]["pour"],
-        "equipment": L["equipment_defaults"]["pour"],
-        "duration": f"{pour_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Curing
-    cure_days = 7
-    rows.append({
-        "task": "معالجة خرسانة" if lang == "ar" else "Curing",
-        "qty": f"{qty_m3:.1f}",
-        "unit": "م³" if lang == "ar" else "m3",
-        "crew": L["crew_defaults"]["curing"],
-        "equipment": L["equipment_defaults"]["curing"],
-        "duration": f"{cure_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    total_days = exc_days + form_days + rebar_days + pour_days + cure_days
-    
-    if lang == "ar":
-        text = (
-            "تم توليد خطة للأساسات الشريطية:\n"
-            f"- الكمية: {qty_m3} م³\n"
-            f"- تقدير شدّات: {formwork_area:.1f} م²\n"
-            f"- تقدير حديد: {rebar_ton:.2f} طن\n"
-            f"- المدة التقريبية: {total_days} يوم"
-        )
-        notes = "معدلات تقريبية للأساسات الشريطية المستمرة."
-    else:
-        text = (
-            "Generated plan for Strip Foundations:\n"
-            f"- Quantity: {qty_m3} m3\n"
-            f"- Formwork: {formwork_area:.1f} m2\n"
-            f"- Rebar: {rebar_ton:.2f} ton\n"
-            f"- Approx Duration: {total_days} days"
-        )
-        notes = "Approximate rates for continuous strip footings."
-
-    return {
-        "text": text,
-        "table": { "rows": rows },
-        "notes": notes
-    }
-
-def plan_pile_foundation(qty_piles, lang):
-    """Plan for pile foundation (qty = number of piles)"""
-    L = RATES[lang]
-    rows = []
-
-    # Pile assumptions: 10m deep, 0.5m diameter average
-    avg_pile_volume = 2.0  # m3 per pile
-    total_concrete = qty_piles * avg_pile_volume
-    rebar_ton = qty_piles * 0.15  # 150kg per pile
-    
-    # Drilling rate: 3 piles per day
-    drill_days = math.ceil(qty_piles / 3)
-    rows.append({
-        "task": "حفر الخوازيق" if lang == "ar" else "Pile Drilling",
-        "qty": f"{qty_piles}",
-        "unit": "خازوق" if lang == "ar" else "pile",
-        "crew": "2 مشغّلين + 3 عمّال" if lang == "ar" else "2 operators + 3 laborers",
-        "equipment": "ماكينة حفر خوازيق" if lang == "ar" else "Pile drilling rig",
-        "duration": f"{drill_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Rebar cage installation
-    rebar_days = math.ceil(qty_piles / 6)  # 6 cages per day
-    rows.append({
-        "task": "تركيب أقفاص الحديد" if lang == "ar" else "Rebar Cage Installation",
-        "qty": f"{qty_piles}",
-        "unit": "قفص" if lang == "ar" else "cage",
-        "crew": L["crew_defaults"]["rebar"],
-        "equipment": "رافعة + معدات حدادة" if lang == "ar" else "Crane + rebar tools",
-        "duration": f"{rebar_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Concrete pouring (tremie method)
-    pour_days = math.ceil(qty_piles / 8)  # 8 piles per day
-    rows.append({
-        "task": "صب خرسانة بالتريمي" if lang == "ar" else "Tremie Concrete Pour",
-        "qty": f"{total_concrete:.1f}",
-        "unit": "م³" if lang == "ar" else "m3",
-        "crew": L["crew_defaults"]["pour"],
-        "equipment": "مضخة + ترمي" if lang == "ar" else "Pump + tremie pipe",
-        "duration": f"{pour_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Pile cap preparation
-    cap_days = math.ceil(qty_piles / 10)
-    rows.append({
-        "task": "تكسير رؤوس الخوازيق" if lang == "ar" else "Pile Head Breaking",
-        "qty": f"{qty_piles}",
-        "unit": "خازوق" if lang == "ar" else "pile",
-        "crew": "4 عمّال + مشرف" if lang == "ar" else "4 laborers + supervisor",
-        "equipment": "هيلتي + كمبريسور" if lang == "ar" else "Jack hammer + compressor",
-        "duration": f"{cap_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    total_days = drill_days + rebar_days + pour_days + cap_days
-    
-    if lang == "ar":
-        text = (
-            "تم توليد خطة لأعمال الخوازيق:\n"
-            f"- عدد الخوازيق: {qty_piles}\n"
-            f"- حجم الخرسانة: {total_concrete:.1f} م³\n"
-            f"- حديد التسليح: {rebar_ton:.2f} طن\n"
-            f"- المدة التقريبية: {total_days} يوم"
-        )
-        notes = "تفترض الخطة خوازيق بقطر 50سم وعمق 10م."
-    else:
-        text = (
-            "Generated plan for Pile Foundation:\n"
-            f"- Number of Piles: {qty_piles}\n"
-            f"- Concrete Volume: {total_concrete:.1f} m3\n"
-            f"- Rebar: {rebar_ton:.2f} ton\n"
-            f"- Duration: {total_days} days"
-        )
-        notes = "Plan assumes 500mm diameter piles at 10m depth."
-
-    return {
-        "text": text,
-        "table": { "rows": rows },
-        "notes": notes
-    }
-
-def plan_columns(qty_m3, lang):
-    """Plan for reinforced concrete columns"""
-    L = RATES[lang]
-    rows = []
-
-    # Columns have high formwork ratio (all sides)
-    formwork_area = qty_m3 * 2.5  # High ratio
-    rebar_ton = qty_m3 * 0.15    # 150 kg/m3 (heavy reinforcement)
-    
-    carp_rate = L["carpentry_m2_per_day_per_carpenter"] * 3  # Slower for columns
-    rebar_rate = L["rebar_ton_per_day_per_steel_fixer"] * 2
-    pump_rate_m3_per_day = L["concrete_m3_per_hour_pump"] * 4  # Slower for columns
-
-    # Formwork
-    form_days = math.ceil(formwork_area / carp_rate)
-    rows.append({
-        "task": "نجارة شدّات أعمدة" if lang == "ar" else "Column Formwork",
-        "qty": f"{formwork_area:.1f}",
-        "unit": "م²" if lang == "ar" else "m2",
-        "crew": L["crew_defaults"]["formwork"],
-        "equipment": L["equipment_defaults"]["formwork"],
-        "duration": f"{form_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Rebar
-    rebar_days = math.ceil(rebar_ton / rebar_rate)
-    rows.append({
-        "task": "حدادة أعمدة" if lang == "ar" else "Column Rebar",
-        "qty": f"{rebar_ton:.2f}",
-        "unit": "طن" if lang == "ar" else "ton",
-        "crew": L["crew_defaults"]["rebar"],
-        "equipment": L["equipment_defaults"]["rebar"],
-        "duration": f"{rebar_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Pouring
-    pour_days = math.ceil(qty_m3 / pump_rate_m3_per_day)
-    rows.append({
-        "task": "صب خرسانة أعمدة" if lang == "ar" else "Column Concrete Pour",
-        "qty": f"{qty_m3:.1f}",
-        "unit": "م³" if lang == "ar" else "m3",
-        "crew": L["crew_defaults"]["pour"],
-        "equipment": L["equipment_defaults"]["pour"],
-        "duration": f"{pour_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Stripping
-    strip_days = math.ceil(formwork_area / (carp_rate * 1.5))
-    rows.append({
-        "task": "فك الشدّات" if lang == "ar" else "Form Stripping",
-        "qty": f"{formwork_area:.1f}",
-        "unit": "م²" if lang == "ar" else "m2",
-        "crew": L["crew_defaults"]["formwork"],
-        "equipment": L["equipment_defaults"]["formwork"],
-        "duration": f"{strip_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    total_days = form_days + rebar_days + pour_days + strip_days
-    
-    if lang == "ar":
-        text = (
-            "تم توليد خطة للأعمدة الخرسانية:\n"
-            f"- الكمية: {qty_m3} م³\n"
-            f"- مساحة الشدّات: {formwork_area:.1f} م²\n"
-            f"- حديد التسليح: {rebar_ton:.2f} طن\n"
-            f"- المدة التقريبية: {total_days} يوم"
-        )
-        notes = "معدلات تقريبية للأعمدة (تسليح 150 كجم/م³)."
-    else:
-        text = (
-            "Generated plan for RC Columns:\n"
-            f"- Quantity: {qty_m3} m3\n"
-            f"- Formwork: {formwork_area:.1f} m2\n"
-            f"- Rebar (150kg/m3): {rebar_ton:.2f} ton\n"
-            f"- Duration: {total_days} days"
-        )
-        notes = "Rates for typical RC columns with heavy reinforcement."
-
-    return {
-        "text": text,
-        "table": { "rows": rows },
-        "notes": notes
-    }
-
-def plan_beams(qty_m3, lang):
-    """Plan for reinforced concrete beams"""
-    L = RATES[lang]
-    rows = []
-
-    # Beams formwork includes bottom and sides
-    formwork_area = qty_m3 * 2.0
-    rebar_ton = qty_m3 * 0.12    # 120 kg/m3
-    
-    carp_rate = L["carpentry_m2_per_day_per_carpenter"] * 3.5
-    rebar_rate = L["rebar_ton_per_day_per_steel_fixer"] * 2.5
-    pump_rate_m3_per_day = L["concrete_m3_per_hour_pump"] * 5
-
-    # Formwork
-    form_days = math.ceil(formwork_area / carp_rate)
-    rows.append({
-        "task": "نجارة شدّات كمرات" if lang == "ar" else "Beam Formwork",
-        "qty": f"{formwork_area:.1f}",
-        "unit": "م²" if lang == "ar" else "m2",
-        "crew": L["crew_defaults"]["formwork"],
-        "equipment": L["equipment_defaults"]["formwork"],
-        "duration": f"{form_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
+    # Detect scope/element type from the planning templates' keywords
+    # (checked in match_order - more specific matches first)
+    scope, scope_unit = detect_scope(q)
 
-    # Rebar
-    rebar_days = math.ceil(rebar_ton / rebar_rate)
-    rows.append({
-        "task": "حدادة كمرات" if lang == "ar" else "Beam Rebar",
-        "qty": f"{rebar_ton:.2f}",
-        "unit": "طن" if lang == "ar" else "ton",
-        "crew": L["crew_defaults"]["rebar"],
-        "equipment": L["equipment_defaults"]["rebar"],
-        "duration": f"{rebar_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
+    return qty, scope_unit or unit or "m3", scope
 
-    # Pouring
-    pour_days = math.ceil(qty_m3 / pump_rate_m3_per_day)
-    rows.append({
-        "task": "صب خرسانة كمرات" if lang == "ar" else "Beam Concrete Pour",
-        "qty": f"{qty_m3:.1f}",
-        "unit": "م³" if lang == "ar" else "m3",
-        "crew": L["crew_defaults"]["pour"],
-        "equipment": L["equipment_defaults"]["pour"],
-        "duration": f"{pour_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Curing + Stripping (after 14 days)
-    cure_days = 14
-    rows.append({
-        "task": "معالجة وفك شدّات" if lang == "ar" else "Curing & Stripping",
-        "qty": f"{qty_m3:.1f}",
-        "unit": "م³" if lang == "ar" else "m3",
-        "crew": L["crew_defaults"]["curing"],
-        "equipment": L["equipment_defaults"]["curing"],
-        "duration": f"{cure_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
 
-    total_days = form_days + rebar_days + pour_days + cure_days
-    
-    if lang == "ar":
-        text = (
-            "تم توليد خطة للكمرات الخرسانية:\n"
-            f"- الكمية: {qty_m3} م³\n"
-            f"- مساحة الشدّات: {formwork_area:.1f} م²\n"
-            f"- حديد التسليح: {rebar_ton:.2f} طن\n"
-            f"- المدة التقريبية: {total_days} يوم"
-        )
-        notes = "معدلات تقريبية للكمرات (فك الشدّات بعد 14 يوم)."
-    else:
-        text = (
-            "Generated plan for RC Beams:\n"
-            f"- Quantity: {qty_m3} m3\n"
-            f"- Formwork: {formwork_area:.1f} m2\n"
-            f"- Rebar: {rebar_ton:.2f} ton\n"
-            f"- Duration: {total_days} days"
-        )
-        notes = "Form stripping after 14 days curing period."
-
-    return {
-        "text": text,
-        "table": { "rows": rows },
-        "notes": notes
-    }
-
-def plan_slabs(qty_m3, lang):
-    """Plan for reinforced concrete slabs"""
-    L = RATES[lang]
-    rows = []
-
-    # Slabs - large bottom form area, minimal sides
-    # Assume 20cm thick slab: 1 m3 = 5 m2
-    formwork_area = qty_m3 * 5.0
-    rebar_ton = qty_m3 * 0.08    # 80 kg/m3
-    
-    carp_rate = L["carpentry_m2_per_day_per_carpenter"] * 5  # Faster for slabs
-    rebar_rate = L["rebar_ton_per_day_per_steel_fixer"] * 3
-    pump_rate_m3_per_day = L["concrete_m3_per_hour_pump"] * 8  # Faster for slabs
-
-    # Formwork + Shoring
-    form_days = math.ceil(formwork_area / carp_rate)
-    rows.append({
-        "task": "نجارة وتدعيم بلاطة" if lang == "ar" else "Slab Formwork & Shoring",
-        "qty": f"{formwork_area:.1f}",
-        "unit": "م²" if lang == "ar" else "m2",
-        "crew": L["crew_defaults"]["formwork"],
-        "equipment": "شدّات + جكات تدعيم" if lang == "ar" else "Forms + shoring jacks",
-        "duration": f"{form_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Rebar (mesh + additional)
-    rebar_days = math.ceil(rebar_ton / rebar_rate)
-    rows.append({
-        "task": "حدادة بلاطة" if lang == "ar" else "Slab Rebar",
-        "qty": f"{rebar_ton:.2f}",
-        "unit": "طن" if lang == "ar" else "ton",
-        "crew": L["crew_defaults"]["rebar"],
-        "equipment": L["equipment_defaults"]["rebar"],
-        "duration": f"{rebar_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # MEP conduits
-    mep_days = math.ceil(formwork_area / 200)  # 200 m2 per day
-    rows.append({
-        "task": "تمديدات كهربائية" if lang == "ar" else "MEP Conduits",
-        "qty": f"{formwork_area:.1f}",
-        "unit": "م²" if lang == "ar" else "m2",
-        "crew": "2 كهربائيين + 2 سباكين" if lang == "ar" else "2 electricians + 2 plumbers",
-        "equipment": "معدات يدوية" if lang == "ar" else "Hand tools",
-        "duration": f"{mep_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Pouring
-    pour_days = math.ceil(qty_m3 / pump_rate_m3_per_day)
-    rows.append({
-        "task": "صب خرسانة بلاطة" if lang == "ar" else "Slab Concrete Pour",
-        "qty": f"{qty_m3:.1f}",
-        "unit": "م³" if lang == "ar" else "m3",
-        "crew": L["crew_defaults"]["pour"],
-        "equipment": L["equipment_defaults"]["pour"],
-        "duration": f"{pour_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    # Curing + Stripping
-    cure_days = 21  # 21 days for slabs
-    rows.append({
-        "task": "معالجة وفك تدعيم" if lang == "ar" else "Curing & Reshoring",
-        "qty": f"{qty_m3:.1f}",
-        "unit": "م³" if lang == "ar" else "m3",
-        "crew": L["crew_defaults"]["curing"],
-        "equipment": L["equipment_defaults"]["curing"],
-        "duration": f"{cure_days} { 'يوم' if lang=='ar' else 'day' }"
-    })
-
-    total_days = form_days + rebar_days + mep_days + pour_days + cure_days
-    
-    if lang == "ar":
-        text = (
-            "تم توليد خطة للبلاطات الخرسانية:\n"
-            f"- الكمية: {qty_m3} م³\n"
-            f"- مساحة الشدّات: {formwork_area:.1f} م²\n"
-            f"- حديد التسليح: {rebar_ton:.2f} طن\n"
-            f"- المدة التقريبية: {total_days} يوم"
-        )
-        notes = "البلاطة المفترضة 20سم سمك. فك التدعيم بعد 21 يوم."
-    else:
-        text = (
-            "Generated plan for RC Slab:\n"
-            f"- Quantity: {qty_m3} m3\n"
-            f"- Formwork: {formwork_area:.1f} m2\n"
-            f"- Rebar: {rebar_ton:.2f} ton\n"
-            f"- Duration: {total_days} days"
-        )
-        notes = "Assumes 200mm thick slab. Reshoring removal after 21 days."
-
-    return {
-        "text": text,
-        "table": { "rows": rows },
-        "notes": notes
-    }
+# Ollama server (OLLAMA_HOST points the app at another machine or a test server)
+from ollama_client import OllamaClient
 
-OLLAMA_API_URL = "http://localhost:11434/api/chat"
-TAGS_API_URL = "http://localhost:11434/api/tags"
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
 DEFAULT_MODEL = "llama3.2" 
 
-# Global variable to cache the working model
-CURRENT_MODEL = None
+# Pooled keep-alive client; caches the discovered model (see ollama_client)
+OLLAMA_CLIENT = OllamaClient(OLLAMA_HOST, DEFAULT_MODEL)
 
 def get_working_model():
-    global CURRENT_MODEL
-    if CURRENT_MODEL:
-        return CURRENT_MODEL
-    
-    # Try default first
-    try:
-        # Check if default model exists in tags
-        res = requests.get(TAGS_API_URL)
-        if res.status_code == 200:
-            models = res.json().get('models', [])
-            model_names = [m['name'] for m in models]
-            
-            # 1. Try exact match
-            if DEFAULT_MODEL in model_names:
-                CURRENT_MODEL = DEFAULT_MODEL
-                return DEFAULT_MODEL
-            
-            # 2. Try partial match (e.g. 'llama3.2:latest' matches 'llama3.2')
-            for m in model_names:
-                if DEFAULT_MODEL in m:
-                    CURRENT_MODEL = m
-                    return m
-            
-            # 3. Fallback to 'llama3' or 'mistral'
-            for m in model_names:
-                if 'llama3' in m or 'mistral' in m:
-                    CURRENT_MODEL = m
-                    return m
-            
-            # 4. Fallback to ANY model that isn't an embedder
-            for m in model_names:
-                if 'embed' not in m:
-                    CURRENT_MODEL = m
-                    return m
-                    
-    except Exception as e:
-        print(f"Error checking models: {e}")
-    
-    return DEFAULT_MODEL # Hope for the best
+    """Installed Ollama model to use (cached, refreshed in the background)."""
+    return OLLAMA_CLIENT.get_model()
+
+# Database configuration - pooled read-only SQLite connections (see db_config)
+from db_config import db_connection, get_pool_stats
+from fts_search import fts_available, build_match_query, search_items
+from catalog import get_catalog
+from data_sources import validate_sources, data_source_status
+from search_index import search_index_for
+from crew_calculator import (
+    CrewCalculationError, MAX_BATCH_LINES,
+    parse_crew_input, calculate_crew_requirements, calculate_crew_batch
+)
+from scheduler import Activity, Link, ScheduleError, crew_demands, schedule
+from project_plan import ProjectPlanError, assembly_links, build_project_plan
+from assembly_expansion import expand_assemblies, expansion_cache_stats
+
+# Load the catalog snapshot once per worker (reloaded when the DB file changes)
+try:
+    get_catalog()
+except Exception as e:
+    print(f"[WARNING] CSI catalog not loaded: {e}")
 
-# Database configuration - supports both local SQLite and PostgreSQL cloud database
-from db_config import get_db_connection
+# Validate data sources once; catalog reloads re-validate them
+validate_sources()
 
 # Health check endpoint for Railway
 @app.route('/health', methods=['GET'])
@@ -828,12 +141,9 @@ def health_check():
         error_detail = None
         
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM csi_items")
-            result = cursor.fetchone()
+            with db_connection() as conn:
+                result = conn.execute("SELECT COUNT(*) FROM csi_items").fetchone()
             count = result[0] if result else 0
-            conn.close()
             db_connected = True
         except Exception as e:
             error_detail = str(e)
@@ -844,7 +154,13 @@ def health_check():
             "database": db_status,
             "database_connected": db_connected,
             "items_count": count,
-            "environment": "production" if db_url != 'Not set' else "development"
+            "environment": "production" if db_url != 'Not set' else "development",
+            "db_pool": get_pool_stats(),
+            "data_sources": data_source_status(),
+            "ai_cache": AI_RESPONSE_CACHE.stats(),
+            "llm_limits": llm_limit_stats(),
+            "ollama": OLLAMA_CLIENT.stats(),
+            "circuits": circuit_status()
         }
         
         if error_detail:
@@ -857,18 +173,59 @@ def health_check():
             "error": str(e)
         }), 500
 
+def runtime_metrics():
+    """Cache, pool and LLM limiter figures for /metrics (read at scrape time)."""
+    cache_stats = {'ai_response': AI_RESPONSE_CACHE.stats()}
+    for name, func in (('normalize_text', normalize_text), ('semantic_similarity', semantic_similarity)):
+        info = func.cache_info()
+        cache_stats[name] = {'hits': info.hits, 'misses': info.misses, 'entries': info.currsize}
+    cache_stats['assembly_expansion'] = expansion_cache_stats()
+    yield ('csi_cache_hits_total', 'counter', 'Cache hits',
+           [({'cache': name}, stats['hits']) for name, stats in cache_stats.items()])
+    yield ('csi_cache_misses_total', 'counter', 'Cache misses',
+           [({'cache': name}, stats['misses']) for name, stats in cache_stats.items()])
+    yield ('csi_cache_entries', 'gauge', 'Entries held by the cache',
+           [({'cache': name}, stats['entries']) for name, stats in cache_stats.items()])
+    
+    pool = get_pool_stats()
+    yield ('csi_db_pool_connections', 'gauge', 'Pooled SQLite connections',
+           [({'state': 'in_use'}, pool['in_use']), ({'state': 'idle'}, pool['idle'])])
+    
+    limits = llm_limit_stats()
+    yield ('csi_llm_in_flight', 'gauge', 'LLM calls holding a provider slot',
+           [({'provider': name}, stats['in_flight']) for name, stats in limits.items()])
+    yield ('csi_llm_busy_rejections_total', 'counter', 'LLM calls turned away with no free slot',
+           [({'provider': name}, stats['rejected']) for name, stats in limits.items()])
+    states = {'closed': 0, 'half_open': 1, 'open': 2}
+    yield ('csi_llm_circuit_state', 'gauge', 'Circuit breaker state (0 closed, 1 half-open, 2 open)',
+           [({'provider': name}, states[stats['state']]) for name, stats in circuit_status().items()])
+
+add_collector(runtime_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text exposition of this worker's metrics (see metrics.py)."""
+    return metrics_response()
+
+def catalog_response(payload, catalog):
+    """
+    JSON response for catalog data with a strong ETag derived from the
+    catalog version (plus path and query string). Replies 304 Not Modified
+    when the client's If-None-Match still matches.
+    """
+    tag_source = f"{catalog.version}|{request.path}|{request.query_string.decode('utf-8', 'ignore')}"
+    response = jsonify(payload)
+    response.set_etag(f"{catalog.version}-{hashlib.sha1(tag_source.encode('utf-8')).hexdigest()[:12]}")
+    # Clients may keep the data but must revalidate (cheap 304) after imports
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response.make_conditional(request)
+
 @app.route('/api/divisions', methods=['GET'])
 def get_divisions():
     try:
-        conn = get_db_connection()
-        # Get distinct Main Divisions - ORDER BY CAST for proper numeric sorting (SQLite compatible)
-        divisions = conn.execute(
-            "SELECT DISTINCT main_div_code, main_div_name FROM csi_items "
-            "WHERE main_div_code IS NOT NULL AND main_div_code != '' "
-            "ORDER BY CAST(main_div_code AS INTEGER)"
-        ).fetchall()
-        conn.close()
-        return jsonify([{'code': row['main_div_code'], 'name': row['main_div_name']} for row in divisions])
+        # Distinct Main Divisions in numeric order (precomputed at catalog load)
+        catalog = get_catalog()
+        return catalog_response(catalog.hierarchy.divisions, catalog)
     except Exception as e:
         print(f"Error in get_divisions: {e}")
         import traceback
@@ -882,17 +239,9 @@ def get_subdivisions1():
         return jsonify([])
     
     try:
-        conn = get_db_connection()
-        # GROUP BY name to avoid duplicates, MIN(code) to get representative code
-        subs = conn.execute(
-            "SELECT MIN(sub_div1_code) as sub_div1_code, sub_div1_name FROM csi_items "
-            "WHERE main_div_code = ? AND sub_div1_code IS NOT NULL AND sub_div1_code != '' "
-            "GROUP BY sub_div1_name "
-            "ORDER BY CAST(MIN(sub_div1_code) AS INTEGER)",
-            (main_code,)
-        ).fetchall()
-        conn.close()
-        return jsonify([{'code': row['sub_div1_code'], 'name': row['sub_div1_name']} for row in subs])
+        # Grouped by name, MIN(code) as representative code
+        catalog = get_catalog()
+        return catalog_response(catalog.hierarchy.get_subdivisions1(main_code), catalog)
     except Exception as e:
         print(f"Error in get_subdivisions1: {e}")
         return jsonify({"error": str(e)}), 500
@@ -905,41 +254,62 @@ def get_subdivisions2():
         return jsonify([])
     
     try:
-        conn = get_db_connection()
-        # GROUP BY name to avoid duplicates, MIN(code) to get representative code
-        if main_code:
-            subs = conn.execute(
-                "SELECT MIN(sub_div2_code) as sub_div2_code, sub_div2_name FROM csi_items "
-                "WHERE main_div_code = ? AND sub_div1_code = ? "
-                "AND sub_div2_code IS NOT NULL AND sub_div2_code != '' "
-                "GROUP BY sub_div2_name "
-                "ORDER BY CAST(MIN(sub_div2_code) AS INTEGER)",
-                (main_code, sub1_code)
-            ).fetchall()
-        else:
-            # Fallback for backward compatibility
-            subs = conn.execute(
-                "SELECT MIN(sub_div2_code) as sub_div2_code, sub_div2_name FROM csi_items "
-                "WHERE sub_div1_code = ? "
-                "AND sub_div2_code IS NOT NULL AND sub_div2_code != '' "
-                "GROUP BY sub_div2_name "
-                "ORDER BY CAST(MIN(sub_div2_code) AS INTEGER)",
-                (sub1_code,)
-            ).fetchall()
-            
-        conn.close()
-        return jsonify([{'code': row['sub_div2_code'], 'name': row['sub_div2_name']} for row in subs])
+        # Grouped by name, MIN(code) as representative code.
+        # Without main_code only sub1_code is used (backward compatibility)
+        catalog = get_catalog()
+        return catalog_response(catalog.hierarchy.get_subdivisions2(sub1_code, main_code), catalog)
     except Exception as e:
         print(f"Error in get_subdivisions2: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/hierarchy', methods=['GET'])
+def get_hierarchy():
+    """
+    Whole division tree in one round trip:
+    [{code, name, subdivisions1: [{code, name, subdivisions2: [{code, name}]}]}]
+    """
+    try:
+        catalog = get_catalog()
+        return catalog_response({
+            'version': catalog.version,
+            'divisions': catalog.hierarchy.tree()
+        }, catalog)
+    except Exception as e:
+        print(f"Error in get_hierarchy: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/items', methods=['GET'])
 def get_items():
+    """
+    List/search items.
+    Query params: q, limit, main_code, sub1_code, sub2_code,
+    mode=fts for bm25-ranked full-text search with snippets
+    (falls back to LIKE matching when the FTS index is not built)
+    """
     query = request.args.get('q', '')
-    limit = request.args.get('limit', 50)
+    try:
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        limit = 50
     main_code = request.args.get('main_code')
     sub1_code = request.args.get('sub1_code')
     sub2_code = request.args.get('sub2_code')
+    mode = request.args.get('mode', 'like')
+    
+    if mode == 'fts' and query:
+        match_query = build_match_query(query)
+        with db_connection() as conn:
+            if match_query and fts_available(conn):
+                items = search_items(
+                    conn, match_query, limit=limit,
+                    filters={'main_div_code': main_code, 'sub_div1_code': sub1_code, 'sub_div2_code': sub2_code},
+                    with_snippet=True
+                )
+                return jsonify({
+                    'items': [dict(row) for row in items],
+                    'count': len(items),
+                    'mode': 'fts'
+                })
     
     sql = 'SELECT * FROM csi_items WHERE 1=1'
     params = []
@@ -958,59 +328,54 @@ def get_items():
         sql += ' AND description LIKE ?'
         params.append(f'%{query}%')
         
-    sql += f' LIMIT {limit}'
+    sql += ' LIMIT ?'
+    params.append(limit)
     
-    conn = get_db_connection()
-    items = conn.execute(sql, params).fetchall()
-    conn.close()
+    with db_connection() as conn:
+        items = conn.execute(sql, params).fetchall()
     
-    return jsonify({
+    result = {
         'items': [dict(row) for row in items],
         'count': len(items)
-    })
+    }
+    if mode == 'fts':
+        result['mode'] = 'like'  # FTS requested but index/query unusable
+    return jsonify(result)
 
 @app.route('/api/search-index', methods=['GET'])
 def get_search_index():
     """
     Return all items for client-side quick search
     Optimized index with just essential fields
+
+    Query params:
+        format: 'columnar' for parallel arrays instead of a list of objects
+        since: catalog version the client already has -> only the delta
+
+    The payloads are precomputed per catalog version (search_index.py) and
+    sent precompressed (br/gzip) according to Accept-Encoding. The current
+    catalog version is returned in the X-Catalog-Version header.
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get all items with essential info
-        query = """
-        SELECT 
-            full_code as code,
-            description as name_ar,
-            main_div_code,
-            main_div_name as division,
-            sub_div1_name as subdivision1,
-            sub_div2_name as subdivision2,
-            unit
-        FROM csi_items
-        ORDER BY description
-        """
-        
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        conn.close()
-        
-        # Build index
-        search_index = []
-        for row in rows:
-            search_index.append({
-                'code': row[0],
-                'name_ar': row[1] or '',
-                'name_en': '',  # Can be added later if needed
-                'division': row[3] or '',
-                'subdivision1': row[4] or '',
-                'subdivision2': row[5] or '',
-                'unit': row[6] or ''
-            })
-        
-        return jsonify(search_index)
+        index = search_index_for(get_catalog())
+
+        since = request.args.get('since')
+        if since:
+            payload = index.delta_since(since)
+        elif request.args.get('format') == 'columnar':
+            payload = index.columnar
+        else:
+            payload = index.rows
+
+        encoding = request.accept_encodings.best_match(payload.encodings, default='identity')
+        response = app.response_class(payload.bodies[encoding], mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['X-Catalog-Version'] = index.version
+        response.headers['Cache-Control'] = 'public, no-cache'
+        response.set_etag(payload.etag(encoding))
+        return response.make_conditional(request)
         
     except Exception as e:
         print(f"Error in get_search_index: {e}")
@@ -1028,125 +393,42 @@ def calculate_crew():
     }
     """
     data = request.json
-    item_code = data.get('item_code')
-    quantity = float(data.get('quantity', 0))
-    hours_per_day = float(data.get('hours_per_day', 8))
-    number_of_crews = int(data.get('number_of_crews', 1))
-    
-    if not item_code or quantity <= 0:
-        return jsonify({'error': 'Invalid input'}), 400
-    
-    if number_of_crews < 1:
-        return jsonify({'error': 'Number of crews must be at least 1'}), 400
-    
-    # Get item from database
-    conn = get_db_connection()
-    item = conn.execute('SELECT * FROM csi_items WHERE full_code = ?', (item_code,)).fetchone()
-    conn.close()
-    
-    if not item:
-        return jsonify({'error': 'Item not found'}), 404
-    
-    # Extract data
-    daily_output = item['daily_output']
-    man_hours = item['man_hours']
-    equip_hours = item['equip_hours']
-    
-    if not daily_output or not man_hours:
-        return jsonify({'error': 'Item does not have productivity data'}), 400
-    
-    # Calculate adjusted daily output based on number of crews
-    adjusted_daily_output = daily_output * number_of_crews
-    
-    # Calculate total days (reduced by number of crews)
-    total_days = quantity / adjusted_daily_output
-    total_hours = total_days * hours_per_day
-    
-    # Calculate total man hours (remains the same - total work doesn't change)
-    total_man_hours = quantity * man_hours
-    total_equip_hours = quantity * (equip_hours or 0)
-    
-    # Parse crew structure
-    crew_members = []
-    for i in range(1, 13):  # Up to 12 crew members
-        crew_num = item[f'crew_num_{i}']
-        crew_desc = item[f'crew_desc_{i}']
-        
-        if crew_num and crew_desc:
-            try:
-                count_per_crew = float(crew_num)
-                total_count = count_per_crew * number_of_crews  # Multiply by number of crews
-                crew_members.append({
-                    'position': crew_desc,
-                    'count': total_count,  # Total across all crews
-                    'count_per_crew': count_per_crew,  # Count for single crew
-                    'total_hours': total_hours * count_per_crew,
-                    'type': 'equipment' if any(word in crew_desc.lower() for word in ['crane', 'truck', 'pump', 'vibrator', 'tool', 'dozer', 'loader', 'excavator', 'mixer', 'compressor']) else 'labor'
-                })
-            except ValueError:
-                continue
-    
-    # Separate labor and equipment
-    labor_crew = [c for c in crew_members if c['type'] == 'labor']
-    equipment_crew = [c for c in crew_members if c['type'] == 'equipment']
-    
-    # Build response
-    result = {
-        'item': {
-            'code': item['full_code'],
-            'description': item['description'],
-            'unit': item['unit']
-        },
-        'input': {
-            'quantity': quantity,
-            'hours_per_day': hours_per_day,
-            'number_of_crews': number_of_crews
-        },
-        'calculations': {
-            'total_days': round(total_days, 2),
-            'total_hours': round(total_hours, 2),
-            'total_man_hours': round(total_man_hours, 2),
-            'total_equip_hours': round(total_equip_hours, 2),
-            'daily_output': daily_output,  # Per single crew
-            'adjusted_daily_output': adjusted_daily_output,  # Total output with all crews
-            'man_hours_per_unit': man_hours,
-            'equip_hours_per_unit': equip_hours or 0
-        },
-        'crew': {
-            'labor': labor_crew,
-            'equipment': equipment_crew,
-            'total_labor_count': sum(c['count'] for c in labor_crew),
-            'total_equipment_count': len(equipment_crew)
-        },
-        'activities': [
-            {
-                'name': 'Site Preparation & Setup',
-                'duration_ratio': 0.1,
-                'duration_days': round(total_days * 0.1, 2)
-            },
-            {
-                'name': 'Main Work Execution',
-                'duration_ratio': 0.7,
-                'duration_days': round(total_days * 0.7, 2)
-            },
-            {
-                'name': 'Finishing & Cleanup',
-                'duration_ratio': 0.2,
-                'duration_days': round(total_days * 0.2, 2)
-            }
-        ]
-    }
+    try:
+        item_code, quantity, hours_per_day, number_of_crews = parse_crew_input(data)
+        # Get item from the in-memory catalog
+        item = get_catalog().get_item(item_code)
+        result = calculate_crew_requirements(item, quantity, hours_per_day, number_of_crews)
+    except CrewCalculationError as e:
+        return jsonify({'error': e.message}), e.status
     
     return jsonify(result)
 
+@app.route('/api/calculate-crew/batch', methods=['POST'])
+def calculate_crew_batch_route():
+    """
+    Calculate crew requirements for a whole bill of quantities
+    Input JSON: [
+        {"item_code": "033 172-2950", "quantity": 100, "hours_per_day": 8, "number_of_crews": 2},
+        ...
+    ]  (or {"items": [...]})
+    Returns per-line results (same shape as /api/calculate-crew) and
+    project totals; invalid lines are reported with ok=false.
+    """
+    data = request.get_json(silent=True)
+    lines = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(lines, list) or not lines:
+        return jsonify({'error': 'Expected a non-empty array of BOQ lines'}), 400
+    if len(lines) > MAX_BATCH_LINES:
+        return jsonify({'error': f'Too many lines (max {MAX_BATCH_LINES})'}), 400
+    
+    return jsonify(calculate_crew_batch(get_catalog(), lines))
+
 @app.route('/api/item/<csi_code>', methods=['GET'])
 def get_item(csi_code):
-    conn = get_db_connection()
-    item = conn.execute('SELECT * FROM csi_items WHERE full_code = ?', (csi_code,)).fetchone()
-    conn.close()
+    item = get_catalog().get_item(csi_code)
     if item is None:
         return jsonify({'error': 'Item not found'}), 404
-    return jsonify(dict(item))
+    return jsonify(item.as_dict())
 
 @app.route('/api/item-details', methods=['GET'])
 def get_item_details():
@@ -1161,33 +443,25 @@ def get_item_details():
     if not full_code and not item_code and not sub2_code:
         return jsonify({'error': 'full_code, item_code or sub2_code required'}), 400
     
-    conn = get_db_connection()
-    
+    catalog = get_catalog()
     if full_code:
-        item = conn.execute('SELECT * FROM csi_items WHERE full_code = ?', (full_code,)).fetchone()
+        item = catalog.by_full_code.get(full_code)
     elif item_code:
-        item = conn.execute('SELECT * FROM csi_items WHERE item_code = ?', (item_code,)).fetchone()
+        item = catalog.by_item_code.get(item_code)
     else:
-        item = conn.execute('SELECT * FROM csi_items WHERE sub_div2_code = ?', (sub2_code,)).fetchone()
-    
-    conn.close()
-
+        item = catalog.by_sub_div2_code.get(sub2_code)
     
     if item is None:
         return jsonify({'error': 'Item not found'}), 404
     
-    # Build crew details array
+    # Build crew details array (crew 1-13)
     crew_details = []
-    for i in range(1, 14):  # Crew 1-13
-        crew_num = item[f'crew_num_{i}']
-        crew_desc = item[f'crew_desc_{i}']
-        
-        if crew_num or crew_desc:
-            crew_details.append({
-                'crew_number': i,
-                'quantity': str(crew_num) if crew_num else '',
-                'description': str(crew_desc) if crew_desc else ''
-            })
+    for member in item.crew:
+        crew_details.append({
+            'crew_number': member.number,
+            'quantity': str(member.raw_count) if member.raw_count else '',
+            'description': str(member.position) if member.position else ''
+        })
     
     # Build response
     result = {
@@ -1224,64 +498,85 @@ def get_item_details():
 
 @app.route('/api/assemblies', methods=['GET'])
 def get_assemblies():
-    """List all available assemblies"""
-    conn = get_db_connection()
-    assemblies = conn.execute('SELECT * FROM assemblies').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in assemblies])
+    """List all available assemblies (from the catalog snapshot)"""
+    catalog = get_catalog()
+    return catalog_response(list(catalog.assemblies), catalog)
+
+def _component_links(data, assembly_id, component_ids):
+    """
+    Scheduling links for an assembly: the request's "dependencies", else the
+    assembly_dependencies rows, else a finish-to-start chain in component order.
+    """
+    requested = data.get('dependencies')
+    if requested is not None:
+        if not isinstance(requested, list):
+            raise ScheduleError("'dependencies' must be a list of {from, to, type, lag}")
+        links = []
+        for dep in requested:
+            if not isinstance(dep, dict) or 'from' not in dep or 'to' not in dep:
+                raise ScheduleError("Each dependency needs 'from' and 'to' component ids")
+            links.append(Link(dep['from'], dep['to'], dep.get('type', 'FS'), dep.get('lag', 0)))
+        return links
+    return assembly_links(get_catalog(), assembly_id, component_ids)
 
 @app.route('/api/calculate-assembly', methods=['POST'])
 def calculate_assembly():
     """
-    Calculate full Bill of Materials & Crew for an Assembly
-    Input: { "assembly_id": 1, "quantity": 100 }
+    Calculate full Bill of Materials & Crew for an Assembly, scheduled with CPM
+    Input: { "assembly_id": 1, "quantity": 100,
+             "crews": {"<component id>": 2},                          (optional, default crew_count or 1)
+             "dependencies": [{"from": 1, "to": 2, "type": "SS", "lag": 1}],   (optional)
+             "resource_limits": {"Carpenter": 4} }                    (optional, crew positions)
     """
     data = request.json
     assembly_id = data.get('assembly_id')
     user_qty = float(data.get('quantity', 0))
+    crews_by_component = data.get('crews') or {}
+    resource_limits = data.get('resource_limits') or {}
     
-    if not assembly_id or user_qty <= 0:
+    if not assembly_id or not math.isfinite(user_qty) or user_qty <= 0:
+        return jsonify({'error': 'Invalid input'}), 400
+    if not isinstance(crews_by_component, dict) or not isinstance(resource_limits, dict):
+        return jsonify({'error': "'crews' and 'resource_limits' must be objects"}), 400
+    try:
+        assembly_id = int(assembly_id)
+    except (TypeError, ValueError, OverflowError):
         return jsonify({'error': 'Invalid input'}), 400
         
-    conn = get_db_connection()
-    
-    # 1. Get Assembly Info
-    assembly = conn.execute('SELECT * FROM assemblies WHERE id = ?', (assembly_id,)).fetchone()
+    # 1. Get Assembly Info (catalog snapshot) and its components (cached expansion)
+    catalog = get_catalog()
+    assembly = catalog.assemblies_by_id.get(assembly_id)
     if not assembly:
-        conn.close()
         return jsonify({'error': 'Assembly not found'}), 404
-        
-    # 2. Get Components
-    components = conn.execute('''
-        SELECT ac.*, ci.* 
-        FROM assembly_components ac
-        JOIN csi_items ci ON ac.csi_full_code = ci.full_code
-        WHERE ac.assembly_id = ?
-    ''', (assembly_id,)).fetchall()
-    
-    conn.close()
     
     results = []
-    total_project_days = 0
+    activities = []
     
-    for comp in components:
-        # Calculate Component Quantity based on Ratio
+    for comp in expand_assemblies([(assembly_id, user_qty)])[0]:
+        component_id = comp['component_id']
+        if comp['full_code'] is None:
+            continue  # CSI item missing from csi_items
+        # Component Quantity based on Ratio
         # e.g. 100 m3 foundation * 12 m2/m3 = 1200 m2 forms
-        comp_qty = user_qty * comp['ratio_to_primary']
+        comp_qty = comp['calculated_qty']
         
-        # Calculate Productivity (Days)
-        # Days = Qty / (Daily Output * num_crews) -> defaulting to 1 crew for now
+        # Days = Qty / (Daily Output * num_crews)
+        crews = crews_by_component.get(str(component_id), comp['crew_count'])
+        try:
+            crews = 1.0 if crews is None else float(crews)
+        except (TypeError, ValueError):
+            crews = 0
+        if not crews > 0 or not math.isfinite(crews):
+            return jsonify({'error': f'Invalid crew count for component {component_id}'}), 400
         daily_output = comp['daily_output'] or 1 # Avoid div by zero
-        duration_days = comp_qty / daily_output
-        
-        # Keep track of max duration if parallel, or sum if sequential.
-        # For simplicity in this version, we list them. Real scheduling is complex.
-        total_project_days += duration_days 
+        duration_days = comp_qty / (daily_output * crews)
         
         # Parse Crew (Simplified for the summary view)
         crew_summary = comp['crew_structure'] or "Standard Crew"
+        item = catalog.get_item(comp['full_code'])
         
         results.append({
+            'component_id': component_id,
             'role_en': comp['component_role_en'],
             'role_ar': comp['component_role_ar'],
             'item_code': comp['full_code'],
@@ -1290,24 +585,62 @@ def calculate_assembly():
             'unit': comp['unit'],
             'impacting_ratio': comp['ratio_to_primary'],
             'daily_output': daily_output,
+            'crews': crews,
             'duration_days': round(duration_days, 2),
             'crew_summary': crew_summary
         })
+        try:
+            activities.append(Activity(
+                component_id, duration_days, name=comp['component_role_en'] or comp['description'] or '',
+                demands=crew_demands(item.crew if item else (), crews),
+                data={'item_code': comp['full_code'], 'crews': crews}
+            ))
+        except ScheduleError as e:
+            return jsonify({'error': f'Invalid schedule: {e}'}), 400
+    
+    try:
+        links = _component_links(data, assembly_id, [a.id for a in activities])
+        plan = schedule(activities, links, resource_limits)
+    except (ScheduleError, TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid schedule: {e}'}), 400
         
     return jsonify({
-        'assembly': dict(assembly),
+        'assembly': assembly,
         'input_qty': user_qty,
         'components': results,
-        'estimated_total_duration': round(total_project_days, 2) # Rough sum
+        'estimated_total_duration': round(plan.duration, 2),
+        'schedule': plan.summary()
     })
 
+@app.route('/api/project-plan', methods=['POST'])
+def project_plan():
+    """
+    Schedule many assemblies and BOQ items together, leveled across shared crew trades
+    Input JSON: {
+        "assemblies": [{"id": "F1", "assembly_id": 1, "quantity": 100}],
+        "items": [{"id": "T1", "item_code": "033 172-2950", "quantity": 300, "number_of_crews": 2}],
+        "dependencies": [{"from": "F1", "to": "T1", "type": "FS", "lag": 0}],   (optional)
+        "resource_limits": {"Carpenter": 6, "Crane-11ton": 1}                  (optional)
+    }
+    Returns the Gantt activities, critical path, per-entry dates and the
+    daily labor / equipment histogram (see project_plan.py).
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    try:
+        result = build_project_plan(get_catalog(), data)
+    except ProjectPlanError as e:
+        return jsonify({'error': e.message}), e.status
+    return jsonify(result)
+
 # --- Chat / AI Wizard Routes ---
 
 # Import keyword mapping for smart search
-from keyword_mapping import KEYWORD_MAPPING, find_matching_keywords
+from keyword_mapping import KEYWORD_MAPPING, find_matching_keywords, is_plastering_query
 
 # Import CSI reranker for advanced search
-from csi_reranker import rerank_candidates, search_and_rerank
+from csi_reranker import rerank_candidates, search_and_rerank, normalize_text, semantic_similarity
 
 @app.route('/api/rerank', methods=['POST'])
 def rerank_api():
@@ -1372,6 +705,135 @@ from intelligent_ai import (
     get_csi_context, search_database, calculate_productivity,
     process_ai_response, format_search_results
 )
+from response_cache import AI_RESPONSE_CACHE, CACHE_BYPASS_HEADER, make_cache_key
+from llm_streaming import (
+    wants_stream, sse_event, sse_response, relay_tokens,
+    groq_tokens, ollama_tokens, gemini_tokens
+)
+from llm_limits import LLM_RETRY_AFTER, ProviderBusy, llm_slot, limited_tokens, llm_limit_stats
+from circuit_breaker import CircuitOpen, circuit_open, provider_call, guarded_tokens, circuit_status
+
+
+def ai_reply(payload, stream=False, event='result', cache_state=None):
+    """
+    JSON response, or a single terminal SSE event when the client asked for
+    stream=true. cache_state sets the X-Cache header (HIT, MISS or BYPASS).
+    """
+    response = sse_response(iter([sse_event(event, payload)])) if stream else jsonify(payload)
+    if cache_state:
+        response.headers['X-Cache'] = cache_state
+    return response
+
+
+def ai_error_payload(error, lang):
+    if isinstance(error, ProviderBusy):
+        text = "⚠️ المساعد مشغول حالياً، حاول مرة أخرى بعد قليل." if lang == 'ar' else "⚠️ The AI assistant is busy, please try again in a moment."
+        return {"text": text, "status": "busy"}
+    text = f"⚠️ حدث خطأ: {str(error)}" if lang == 'ar' else f"⚠️ Error: {str(error)}"
+    return {"text": text, "status": "error"}
+
+
+def ai_busy_reply(error, lang, stream=False):
+    """503 + Retry-After when the provider has no free slot (llm_limits.py)."""
+    response = ai_reply(ai_error_payload(error, lang), stream, 'error')
+    response.status_code = 503
+    response.headers['Retry-After'] = str(LLM_RETRY_AFTER)
+    return response
+
+
+def rule_based_reply(provider, stream=False):
+    """
+    /api/intelligent-ai answer from the rule-based pipeline (smart_ai) while
+    the provider's circuit is open (circuit_breaker.py).
+    """
+    payload = app.make_response(smart_ai()).get_json()
+    payload["fallback"] = f"{provider}_circuit_open"
+    return ai_reply(payload, stream)
+
+def intelligent_ai_payload(ai_text, lang, csi_result):
+    """
+    Turn the model's answer into the endpoint's JSON payload.
+    Returns (payload, cacheable) - only search answers are cacheable.
+    """
+    # Process AI response
+    ai_data = process_ai_response(ai_text, lang)
+    
+    if ai_data.get("action") == "search":
+        # AI wants to search - do the search
+        search_terms = ai_data.get("search_terms", [])
+        element_type = ai_data.get("element_type")
+        work_stage = ai_data.get("work_stage")
+        quantity = ai_data.get("quantity")
+        unit = ai_data.get("unit")
+        
+        # Search database
+        results = search_database(search_terms, element_type, work_stage)
+        
+        if results and quantity:
+            # Calculate productivity for first result
+            calc = calculate_productivity(results[0], quantity)
+            
+            if lang == 'ar':
+                text = f"✅ **نتيجة الحساب:**\n\n"
+                text += f"📦 **البند:** {calc['item_description'][:60]}\n"
+                text += f"📏 **الكمية:** {calc['quantity']} {calc['unit']}\n"
+                text += f"⚡ **الإنتاجية:** {calc['daily_output']} {calc['unit']}/يوم\n"
+                text += f"⏱️ **المدة المتوقعة:** {calc['duration_days']} يوم\n"
+                text += f"👷 **ساعات العمل:** {calc['total_man_hours']} ساعة\n"
+                if calc['crew_structure']:
+                    text += f"👥 **تشكيل الفريق:** {calc['crew_structure'][:50]}\n"
+            else:
+                text = f"✅ **Calculation Result:**\n\n"
+                text += f"📦 **Item:** {calc['item_description'][:60]}\n"
+                text += f"📏 **Quantity:** {calc['quantity']} {calc['unit']}\n"
+                text += f"⚡ **Output:** {calc['daily_output']} {calc['unit']}/day\n"
+                text += f"⏱️ **Duration:** {calc['duration_days']} days\n"
+                text += f"👷 **Man-hours:** {calc['total_man_hours']} hours\n"
+            
+            payload = {
+                "text": text,
+                "status": "result",
+                "calculation": calc,
+                "items": results[:3],
+                "csi_info": csi_result if csi_result.get('has_matches') else None
+            }
+        else:
+            # Show search results
+            text = format_search_results(results, lang)
+            payload = {
+                "text": text,
+                "status": "results",
+                "items": results[:5],
+                "csi_info": csi_result if csi_result.get('has_matches') else None
+            }
+        
+        # Search answers are deterministic for a given query - cacheable
+        return payload, True
+    
+    elif ai_data.get("action") == "ask":
+        # AI needs more information
+        question = ai_data.get("question", "")
+        options = ai_data.get("options", [])
+        
+        text = question
+        if options:
+            text += "\n\n"
+            for i, opt in enumerate(options, 1):
+                text += f"{i}️⃣ {opt}\n"
+        
+        return {
+            "text": text,
+            "status": "question",
+            "options": options,
+            "csi_info": csi_result if csi_result.get('has_matches') else None
+        }, False
+    
+    else:
+        # Direct response
+        return {
+            "text": ai_data.get("message", ai_text),
+            "status": "response"
+        }, False
 
 @app.route('/api/intelligent-ai', methods=['POST'])
 def intelligent_ai():
@@ -1385,21 +847,26 @@ def intelligent_ai():
     4. Calculates productivity with context awareness
     
     Free tier: 14,400 requests/day!
+    
+    With stream=true the answer is sent as Server-Sent Events: token
+    events while Groq generates, then the final payload as the terminal
+    result event (see llm_streaming.py).
     """
     data = request.json
     query = (data.get("query") or "").strip()
     lang = data.get("lang", "ar")
     conversation_history = data.get("history", [])
+    stream = wants_stream(request)
     
     # Normalize language
     lang = 'ar' if 'ar' in lang.lower() else 'en'
     
     # Check if Groq is available
     if not GROQ_CLIENT:
-        return jsonify({
+        return ai_reply({
             "text": "⚠️ AI غير متاح حالياً. تأكد من إعداد GROQ_API_KEY." if lang == 'ar' else "⚠️ AI is not available. Please configure GROQ_API_KEY.",
             "status": "error"
-        })
+        }, stream, 'error')
     
     if not query:
         # Greeting
@@ -1421,10 +888,30 @@ def intelligent_ai():
                 "• 'What's the productivity for column reinforcement?'\n\n"
                 "💬 Type your question and I'll help!"
             )
-        return jsonify({
+        return ai_reply({
             "text": greeting,
             "status": "greeting"
-        })
+        }, stream)
+    
+    # Identical questions reuse the stored search answer instead of calling Groq
+    # (no catalog: answer without the cache, keys are per catalog version)
+    try:
+        cache_key = make_cache_key(query, lang, conversation_history, version=get_catalog().version)
+    except Exception as e:
+        print(f"[WARNING] AI cache skipped, catalog unavailable: {e}")
+        cache_key = None
+    if cache_key is None or request.headers.get(CACHE_BYPASS_HEADER, '').lower() in ('1', 'true', 'yes'):
+        AI_RESPONSE_CACHE.record_bypass()
+        cache_state = 'BYPASS'
+    else:
+        cached = AI_RESPONSE_CACHE.get(cache_key)
+        if cached is not None:
+            return ai_reply(cached, stream, cache_state='HIT')
+        cache_state = 'MISS'
+    
+    # Groq is failing or too slow: answer at once without it
+    if circuit_open('groq'):
+        return rule_based_reply('groq', stream)
     
     try:
         # **NEW: CSI Lookup preprocessing**
@@ -1450,105 +937,54 @@ def intelligent_ai():
 
 ## ردك (JSON فقط):"""
 
+        completion_args = dict(
+            model=AI_MODEL_NAME,
+            messages=[
+                {"role": "system", "content": system_prompt + "\n\n" + csi_context},
+                {"role": "user", "content": query}
+            ],
+            temperature=0.7,
+            max_tokens=1024
+        )
+        
+        if stream:
+            def finish(ai_text):
+                payload, cacheable = intelligent_ai_payload(ai_text, lang, csi_result)
+                if cacheable and cache_key:
+                    AI_RESPONSE_CACHE.put(cache_key, payload)
+                return payload
+            
+            response = sse_response(relay_tokens(
+                limited_tokens('groq', lambda: guarded_tokens('groq', lambda: groq_tokens(GROQ_CLIENT, **completion_args))),
+                finish,
+                lambda e: ai_error_payload(e, lang)
+            ))
+            response.headers['X-Cache'] = cache_state
+            return response
+        
         # Call Groq AI (much faster and more reliable than Gemini!)
         try:
-            response = GROQ_CLIENT.chat.completions.create(
-                model=AI_MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": system_prompt + "\n\n" + csi_context},
-                    {"role": "user", "content": query}
-                ],
-                temperature=0.7,
-                max_tokens=1024
-            )
+            with llm_slot('groq'), provider_call('groq'):
+                response = GROQ_CLIENT.chat.completions.create(**completion_args)
+            usage = getattr(response, 'usage', None)
+            record_llm_tokens('groq', getattr(usage, 'prompt_tokens', None), getattr(usage, 'completion_tokens', None))
             ai_text = response.choices[0].message.content
+        except ProviderBusy as busy:
+            return ai_busy_reply(busy, lang)
+        except CircuitOpen:
+            return rule_based_reply('groq')
         except Exception as api_error:
-            error_msg = f"⚠️ حدث خطأ: {str(api_error)}" if lang == 'ar' else f"⚠️ Error: {str(api_error)}"
-            return jsonify({"text": error_msg, "status": "error"})
-        
-        # Process AI response
-        ai_data = process_ai_response(ai_text, lang)
-        
-        if ai_data.get("action") == "search":
-            # AI wants to search - do the search
-            search_terms = ai_data.get("search_terms", [])
-            element_type = ai_data.get("element_type")
-            work_stage = ai_data.get("work_stage")
-            quantity = ai_data.get("quantity")
-            unit = ai_data.get("unit")
-            
-            # Search database
-            results = search_database(search_terms, element_type, work_stage)
-            
-            if results and quantity:
-                # Calculate productivity for first result
-                calc = calculate_productivity(results[0], quantity)
-                
-                if lang == 'ar':
-                    text = f"✅ **نتيجة الحساب:**\n\n"
-                    text += f"📦 **البند:** {calc['item_description'][:60]}\n"
-                    text += f"📏 **الكمية:** {calc['quantity']} {calc['unit']}\n"
-                    text += f"⚡ **الإنتاجية:** {calc['daily_output']} {calc['unit']}/يوم\n"
-                    text += f"⏱️ **المدة المتوقعة:** {calc['duration_days']} يوم\n"
-                    text += f"👷 **ساعات العمل:** {calc['total_man_hours']} ساعة\n"
-                    if calc['crew_structure']:
-                        text += f"👥 **تشكيل الفريق:** {calc['crew_structure'][:50]}\n"
-                else:
-                    text = f"✅ **Calculation Result:**\n\n"
-                    text += f"📦 **Item:** {calc['item_description'][:60]}\n"
-                    text += f"📏 **Quantity:** {calc['quantity']} {calc['unit']}\n"
-                    text += f"⚡ **Output:** {calc['daily_output']} {calc['unit']}/day\n"
-                    text += f"⏱️ **Duration:** {calc['duration_days']} days\n"
-                    text += f"👷 **Man-hours:** {calc['total_man_hours']} hours\n"
-                
-                return jsonify({
-                    "text": text,
-                    "status": "result",
-                    "calculation": calc,
-                    "items": results[:3],
-                    "csi_info": csi_result if csi_result.get('has_matches') else None
-                })
-            else:
-                # Show search results
-                text = format_search_results(results, lang)
-                return jsonify({
-                    "text": text,
-                    "status": "results",
-                    "items": results[:5],
-                    "csi_info": csi_result if csi_result.get('has_matches') else None
-                })
+            return jsonify(ai_error_payload(api_error, lang))
         
-        elif ai_data.get("action") == "ask":
-            # AI needs more information
-            question = ai_data.get("question", "")
-            options = ai_data.get("options", [])
-            
-            text = question
-            if options:
-                text += "\n\n"
-                for i, opt in enumerate(options, 1):
-                    text += f"{i}️⃣ {opt}\n"
-            
-            return jsonify({
-                "text": text,
-                "status": "question",
-                "options": options,
-                "csi_info": csi_result if csi_result.get('has_matches') else None
-            })
-        
-        else:
-            # Direct response
-            return jsonify({
-                "text": ai_data.get("message", ai_text),
-                "status": "response"
-            })
+        payload, cacheable = intelligent_ai_payload(ai_text, lang, csi_result)
+        if cacheable:
+            if cache_key:
+                AI_RESPONSE_CACHE.put(cache_key, payload)
+            return ai_reply(payload, cache_state=cache_state)
+        return jsonify(payload)
     
     except Exception as e:
-        error_msg = f"⚠️ حدث خطأ: {str(e)}" if lang == 'ar' else f"⚠️ Error: {str(e)}"
-        return jsonify({
-            "text": error_msg,
-            "status": "error"
-        })
+        return ai_reply(ai_error_payload(e, lang), stream, 'error')
 
 @app.route('/api/smart-ai', methods=['POST'])
 def smart_ai():
@@ -1608,20 +1044,14 @@ def smart_ai():
     matches = find_matching_keywords(query)
     
     # Check if this is a plastering query - offer structured options
-    plastering_keywords_ar = ["محارة", "لياسة", "بياض", "طرطشة", "ضهارة"]
-    plastering_keywords_en = ["plaster", "plastering", "render", "stucco"]
-    
-    is_plastering_query = any(kw in query.lower() for kw in plastering_keywords_ar + plastering_keywords_en)
-    
-    if is_plastering_query:
+    if is_plastering_query(query):
         # Get all plastering items from database
-        conn = get_db_connection()
-        plastering_items = conn.execute(
-            "SELECT full_code, description, unit, daily_output FROM csi_items "
-            "WHERE full_code LIKE '092 102%' OR full_code LIKE '092 304%' "
-            "ORDER BY full_code LIMIT 15"
-        ).fetchall()
-        conn.close()
+        with db_connection() as conn:
+            plastering_items = conn.execute(
+                "SELECT full_code, description, unit, daily_output FROM csi_items "
+                "WHERE full_code LIKE '092 102%' OR full_code LIKE '092 304%' "
+                "ORDER BY full_code LIMIT 15"
+            ).fetchall()
         
         if plastering_items:
             # Group items by type
@@ -1724,8 +1154,6 @@ def smart_ai():
             })
         
         # We have all info, search for items
-        conn = get_db_connection()
-        
         # Build search based on element and stage
         search_conditions = []
         params = []
@@ -1756,7 +1184,8 @@ def smart_ai():
             # Search for casting/concrete items
             search_conditions.append("full_code LIKE '033%'")
         else:
-            # All stages - search by element type
+            # All stages (Division 03) - search by element type
+            search_conditions.append("full_code LIKE '03%'")
             if element_key == "column":
                 search_conditions.append("description LIKE '%column%'")
             elif element_key == "beam":
@@ -1766,11 +1195,11 @@ def smart_ai():
             elif element_key == "slab":
                 search_conditions.append("description LIKE '%slab%'")
         
-        where_clause = " AND ".join(search_conditions) if search_conditions else "1=1"
+        where_clause = " AND ".join(search_conditions)
         sql = f"SELECT full_code, description, unit, daily_output FROM csi_items WHERE {where_clause} LIMIT 15"
         
-        items = conn.execute(sql).fetchall()
-        conn.close()
+        with db_connection() as conn:
+            items = conn.execute(sql).fetchall()
         
         if items:
             items_list = [{
@@ -1815,17 +1244,13 @@ def smart_ai():
     csi_search = best_match.get("csi_search", best_match.get("en", [""])[0])
     unit = best_match.get("unit", "m2")
     
-    # Search database for matching items
-    conn = get_db_connection()
-    
-    # Search by description
-    items = conn.execute(
-        "SELECT full_code, description, unit, daily_output, man_hours, equip_hours, crew_structure "
-        "FROM csi_items WHERE description LIKE ? OR description LIKE ? LIMIT 10",
-        (f'%{csi_search}%', f'%{best_match.get("en", [""])[0]}%')
-    ).fetchall()
-    
-    conn.close()
+    # Search database for matching items (by description)
+    with db_connection() as conn:
+        items = conn.execute(
+            "SELECT full_code, description, unit, daily_output, man_hours, equip_hours, crew_structure "
+            "FROM csi_items WHERE description LIKE ? OR description LIKE ? LIMIT 10",
+            (f'%{csi_search}%', f'%{best_match.get("en", [""])[0]}%')
+        ).fetchall()
     
     if not items:
         # Fallback to broader search
@@ -1871,16 +1296,21 @@ def smart_ai():
     })
 
 def search_csi_database(query, lang):
-    """Search CSI database directly"""
-    conn = get_db_connection()
-    
-    items = conn.execute(
-        "SELECT full_code, description, unit, daily_output, man_hours FROM csi_items "
-        "WHERE description LIKE ? OR full_code LIKE ? LIMIT 10",
-        (f'%{query}%', f'%{query}%')
-    ).fetchall()
-    
-    conn.close()
+    """Search CSI database directly (full-text index first, LIKE as fallback)"""
+    items = []
+    match_query = build_match_query(query)
+    with db_connection() as conn:
+        if match_query and fts_available(conn):
+            items = search_items(
+                conn, match_query, limit=10,
+                columns="ci.full_code, ci.description, ci.unit, ci.daily_output, ci.man_hours"
+            )
+        if not items:
+            items = conn.execute(
+                "SELECT full_code, description, unit, daily_output, man_hours FROM csi_items "
+                "WHERE description LIKE ? OR full_code LIKE ? LIMIT 10",
+                (f'%{query}%', f'%{query}%')
+            ).fetchall()
     
     if not items:
         return jsonify({
@@ -1898,9 +1328,7 @@ def search_csi_database(query, lang):
 
 def calculate_from_csi(item_code, quantity, lang):
     """Calculate productivity from CSI item code"""
-    conn = get_db_connection()
-    item = conn.execute("SELECT * FROM csi_items WHERE full_code = ?", (item_code,)).fetchone()
-    conn.close()
+    item = get_catalog().get_item(item_code)
     
     if not item:
         return jsonify({"text": "البند غير موجود", "status": "error"})
@@ -1970,37 +1398,30 @@ To search the database, you must output a JSON object in this EXACT format (no o
 """
 
 def query_ollama(messages):
+    """
+    Complete Ollama chat answer. Raises ProviderBusy when no Ollama slot is
+    free and CircuitOpen while the Ollama circuit is open.
+    """
     model = get_working_model()
-    try:
-        payload = {
-            "model": model,
-            "messages": messages,
-            "stream": False
-        }
-        res = requests.post(OLLAMA_API_URL, json=payload)
-        if res.status_code == 200:
-            return res.json()['message']['content']
-        else:
-            return f"Error from Ollama (Model: {model}): {res.text}"
-    except Exception as e:
-        return f"Connection Error: {str(e)}"
+    with llm_slot('ollama'), provider_call('ollama') as call:
+        try:
+            res = OLLAMA_CLIENT.chat(messages, model)
+            if res.status_code == 200:
+                body = res.json()
+                record_llm_tokens('ollama', body.get('prompt_eval_count'), body.get('eval_count'))
+                return body['message']['content']
+            else:
+                call.failed()
+                return f"Error from Ollama (Model: {model}): {res.text}"
+        except Exception as e:
+            call.failed()
+            return f"Connection Error: {str(e)}"
 
-@app.route('/api/chat', methods=['POST'])
-def chat_wizard():
-    data = request.json
-    user_msg = data.get('message')
-    history = data.get('history', [])
-    
-    # 1. Construct Context
-    # We append the system prompt at the start if not present
-    if not history:
-        history.append({"role": "system", "content": COURSE_CONTEXT})
-    
-    history.append({"role": "user", "content": user_msg})
-    
-    # 2. Get LLM Response
-    llm_response = query_ollama(history)
-    
+def chat_payload(llm_response, history):
+    """
+    Payload of /api/chat for a complete model answer: search results when
+    the model emitted a search command, otherwise the text itself.
+    """
     # 3. Check for Tool Use (JSON)
     # Simple heuristic: does it start with { and contain "search_query"?
     if llm_response.strip().startswith('{') and '"search_query"' in llm_response:
@@ -2009,20 +1430,24 @@ def chat_wizard():
             query = cmd['search_query']
             
             # Execute DB Search
-            conn = get_db_connection()
-            # Simple broad search
-            items = conn.execute("SELECT * FROM csi_items WHERE description LIKE ? LIMIT 5", ('%' + query + '%',)).fetchall()
-            conn.close()
+            with db_connection() as conn:
+                # Ranked full-text search, simple broad LIKE search as fallback
+                items = []
+                match_query = build_match_query(query, prefix_last=False)
+                if match_query and fts_available(conn):
+                    items = search_items(conn, match_query, limit=5)
+                if not items:
+                    items = conn.execute("SELECT * FROM csi_items WHERE description LIKE ? LIMIT 5", ('%' + query + '%',)).fetchall()
             
             results = [dict(r) for r in items]
             
             # Return structured result to frontend (handled specially by frontend)
-            return jsonify({
+            return {
                 "response": "Here are the matching items I found:",
                 "history": history + [{"role": "assistant", "content": llm_response}],
                 "results": results,
                 "is_final": True
-            })
+            }
             
         except Exception as e:
             # Fallback if invalid JSON
@@ -2031,16 +1456,73 @@ def chat_wizard():
 
     # Standard Text Response
     history.append({"role": "assistant", "content": llm_response})
-    return jsonify({
+    return {
         "response": llm_response,
         "history": history
-    })
+    }
+
+def chat_fallback_payload(user_msg, history):
+    """
+    /api/chat answer while the Ollama circuit is open: the best catalog
+    matches for the message from search_and_rerank.
+    """
+    catalog = get_catalog()
+    results = []
+    for match in search_and_rerank(user_msg or '', return_top_k=5).get('results', []):
+        item = catalog.get_item(match['CSI_Code'])
+        if item is not None:
+            results.append(item.as_dict())
+    return {
+        "response": "The assistant is offline right now. Here are the closest catalog items:",
+        "history": history,
+        "results": results,
+        "is_final": True,
+        "fallback": "ollama_circuit_open"
+    }
+
+@app.route('/api/chat', methods=['POST'])
+def chat_wizard():
+    data = request.json
+    user_msg = data.get('message')
+    history = data.get('history', [])
+    
+    # 1. Construct Context
+    # We append the system prompt at the start if not present
+    if not history:
+        history.append({"role": "system", "content": COURSE_CONTEXT})
+    
+    history.append({"role": "user", "content": user_msg})
+    
+    # Ollama is down or too slow: catalog matches instead of waiting for it
+    if circuit_open('ollama'):
+        return ai_reply(chat_fallback_payload(user_msg, history), wants_stream(request))
+    
+    # 2. Get LLM Response (token by token as SSE with stream=true)
+    if wants_stream(request):
+        model = get_working_model()
+        return sse_response(relay_tokens(
+            limited_tokens('ollama', lambda: guarded_tokens('ollama', lambda: ollama_tokens(
+                OLLAMA_CLIENT.chat_url, model, history, OLLAMA_CLIENT.timeout, OLLAMA_CLIENT.session
+            ))),
+            lambda llm_response: chat_payload(llm_response, history),
+            lambda e: dict(ai_error_payload(e, 'en') if isinstance(e, ProviderBusy)
+                           else {"text": f"Connection Error: {str(e)}", "status": "error"}, history=history)
+        ))
+    
+    try:
+        llm_response = query_ollama(history)
+    except ProviderBusy as busy:
+        return ai_busy_reply(busy, 'en')
+    except CircuitOpen:
+        return jsonify(chat_fallback_payload(user_msg, history))
+    return jsonify(chat_payload(llm_response, history))
 
 @app.route("/api/ai", methods=["POST"])
 def ai():
     data = request.json
     query = (data.get("query") or "").strip()
     lang = data.get("lang") or "ar"
+    stream = wants_stream(request)
     
     # Simple lang normalization
     if 'ar' in lang: lang = 'ar'
@@ -2048,25 +1530,14 @@ def ai():
     
     qty, unit, scope = parse_query(query)
 
-    # Route to appropriate planning function based on detected scope
+    # Plan from the detected scope's template
     if qty:
-        if scope == "isolated_foundations":
-            return jsonify(plan_isolated_foundations(qty, lang))
-        elif scope == "raft_foundation":
-            return jsonify(plan_raft_foundation(qty, lang))
-        elif scope == "strip_foundation":
-            return jsonify(plan_strip_foundation(qty, lang))
-        elif scope == "piles":
-            return jsonify(plan_pile_foundation(int(qty), lang))
-        elif scope == "columns":
-            return jsonify(plan_columns(qty, lang))
-        elif scope == "beams":
-            return jsonify(plan_beams(qty, lang))
-        elif scope == "slabs":
-            return jsonify(plan_slabs(qty, lang))
-
-    # Use Gemini AI for intelligent conversation if available
-    if GEMINI_MODEL:
+        plan = build_plan(scope, qty, lang)
+        if plan is not None:
+            return ai_reply(plan, stream)
+
+    # Use Gemini AI for intelligent conversation if available (and its circuit is closed)
+    if GEMINI_MODEL and not circuit_open('gemini'):
         try:
             system_prompt = """أنت مساعد ذكي متخصص في هندسة البناء والتخطيط للمشاريع الإنشائية.
             
@@ -2085,13 +1556,25 @@ def ai():
 """
             
             full_prompt = f"{system_prompt}\n\nسؤال المستخدم: {query}"
+            notes = "💡 للحصول على خطة مفصلة، اذكر الكمية مثل: أعمدة 50 م³" if lang == "ar" else "💡 For a detailed plan, include quantity like: columns 50 m3"
+            
+            if stream:
+                return sse_response(relay_tokens(
+                    limited_tokens('gemini', lambda: guarded_tokens('gemini', lambda: gemini_tokens(GEMINI_MODEL, full_prompt))),
+                    lambda ai_response: {"text": ai_response, "notes": notes},
+                    lambda e: ai_error_payload(e, lang)
+                ))
             
-            response = GEMINI_MODEL.generate_content(full_prompt)
+            with llm_slot('gemini'), provider_call('gemini'):
+                response = GEMINI_MODEL.generate_content(full_prompt)
+            usage = getattr(response, 'usage_metadata', None)
+            record_llm_tokens('gemini', getattr(usage, 'prompt_token_count', None),
+                              getattr(usage, 'candidates_token_count', None))
             ai_response = response.text
             
             return jsonify({
                 "text": ai_response,
-                "notes": "💡 للحصول على خطة مفصلة، اذكر الكمية مثل: أعمدة 50 م³" if lang == "ar" else "💡 For a detailed plan, include quantity like: columns 50 m3"
+                "notes": notes
             })
         except Exception as e:
             print(f"Gemini API Error: {e}")
@@ -2099,7 +1582,7 @@ def ai():
     
     # Fallback response if Gemini not available or failed
     if lang == "ar":
-        return jsonify({
+        return ai_reply({
             "text": "مرحباً! أنا مساعد التخطيط الإنشائي. للحصول على خطة تفصيلية، اكتب الكمية والنوع مثل:",
             "notes": (
                 "📦 أساسات منفصلة 100 م³\n"
@@ -2110,9 +1593,9 @@ def ai():
                 "📐 كمرات 40 م³\n"
                 "🏠 بلاطة 60 م³"
             )
-        })
+        }, stream)
     else:
-        return jsonify({
+        return ai_reply({
             "text": "Hello! I'm a construction planning assistant. For a detailed plan, include the quantity and type like:",
             "notes": (
                 "📦 Isolated foundations 100 m3\n"
@@ -2123,7 +1606,7 @@ def ai():
                 "📐 Beams 40 m3\n"
                 "🏠 Slab 60 m3"
             )
-        })
+        }, stream)
 
 # --- End Chat Routes ---
 
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Assembly Expansion
+==================
+The components of an assembly with the few csi_items columns the
+planners need (description, unit, daily_output, crew_structure), read from
+the assembly_expansion view (database/schema_v5.sql). Databases without
+the view run the same SELECT inline.
+
+Each component is joined to the first csi_items row of its full_code
+(lowest id, like the catalog's by_full_code), so a code imported twice
+no longer duplicates the component. Components whose item is missing
+come back with full_code None.
+
+Expansions are cached per assembly_id for the current catalog version;
+get_expansions() / expand_assemblies() fetch every uncached id of a list
+in one query.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from catalog import get_catalog
+from db_config import db_connection
+
+EXPANSION_COLUMNS = (
+    'assembly_id', 'component_id', 'csi_full_code', 'ratio_to_primary', 'ratio_type',
+    'component_role_en', 'component_role_ar', 'crew_count',
+    'full_code', 'description', 'unit', 'daily_output', 'crew_structure',
+)
+
+# Body of the assembly_expansion view (keep in sync with database/schema_v5.sql)
+EXPANSION_SELECT = '''
+    SELECT ac.assembly_id, ac.id AS component_id, ac.csi_full_code, ac.ratio_to_primary, ac.ratio_type,
+           ac.component_role_en, ac.component_role_ar, {crew_count} AS crew_count,
+           ci.full_code, ci.description, ci.unit, ci.daily_output, ci.crew_structure
+    FROM assembly_components ac
+    LEFT JOIN csi_items ci ON ci.id = (SELECT MIN(id) FROM csi_items WHERE full_code = ac.csi_full_code)
+'''
+
+# SQLite's default limit on ? parameters is 999 in older builds
+MAX_IDS_PER_QUERY = 900
+
+_lock = threading.Lock()
+_cache: Dict[int, Tuple[Dict, ...]] = {}
+_cache_version = None
+_source = None   # 'assembly_expansion' or the inline SELECT, per catalog version
+_stats = {'hits': 0, 'misses': 0, 'queries': 0}
+
+
+def _expansion_source(conn) -> str:
+    """The view, or the inline SELECT on databases without schema_v5."""
+    if conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = 'assembly_expansion'"
+    ).fetchone():
+        return 'assembly_expansion'
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(assembly_components)')}
+    crew_count = 'ac.crew_count' if 'crew_count' in columns else 'NULL'
+    return f"({EXPANSION_SELECT.format(crew_count=crew_count)})"
+
+
+def _fetch(assembly_ids: Sequence[int]) -> Dict[int, List[Dict]]:
+    global _source
+    found: Dict[int, List[Dict]] = {assembly_id: [] for assembly_id in assembly_ids}
+    with db_connection() as conn:
+        if _source is None:
+            _source = _expansion_source(conn)
+        for start in range(0, len(assembly_ids), MAX_IDS_PER_QUERY):
+            chunk = assembly_ids[start:start + MAX_IDS_PER_QUERY]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor = conn.execute(
+                f"SELECT {', '.join(EXPANSION_COLUMNS)} FROM {_source} "
+                f"WHERE assembly_id IN ({placeholders}) ORDER BY assembly_id, component_id",
+                tuple(chunk)
+            )
+            _stats['queries'] += 1
+            for row in cursor:
+                found[row['assembly_id']].append(dict(row))
+    return found
+
+
+def get_expansions(assembly_ids: Iterable[int]) -> Dict[int, Tuple[Dict, ...]]:
+    """
+    Expansion rows per assembly id (component order). Only assemblies of
+    the current catalog are cached; unknown ids map to an empty tuple.
+    Rows are shared: callers must not modify them.
+    """
+    global _cache_version, _source
+    catalog = get_catalog()
+    ids = list(dict.fromkeys(int(assembly_id) for assembly_id in assembly_ids))
+    with _lock:
+        if _cache_version != catalog.version:
+            _cache.clear()
+            _cache_version = catalog.version
+            _source = None
+        result = {assembly_id: _cache[assembly_id] for assembly_id in ids if assembly_id in _cache}
+        _stats['hits'] += len(result)
+    missing = [assembly_id for assembly_id in ids
+               if assembly_id not in result and assembly_id in catalog.assemblies_by_id]
+    if missing:
+        fetched = _fetch(missing)
+        with _lock:
+            _stats['misses'] += len(missing)
+            for assembly_id, rows in fetched.items():
+                rows = tuple(rows)
+                result[assembly_id] = rows
+                if _cache_version == catalog.version:
+                    _cache[assembly_id] = rows
+    for assembly_id in ids:
+        result.setdefault(assembly_id, ())
+    return result
+
+
+def get_expansion(assembly_id: int) -> Tuple[Dict, ...]:
+    """Expansion rows of one assembly."""
+    return get_expansions([assembly_id])[int(assembly_id)]
+
+
+def expand_assemblies(requests: Sequence[Tuple[int, float]]) -> List[List[Dict]]:
+    """
+    Fast path for many assemblies at once: for each (assembly_id, quantity)
+    its components with calculated_qty = quantity * ratio_to_primary.
+    At most one query for all uncached ids.
+    """
+    expansions = get_expansions(assembly_id for assembly_id, _ in requests)
+    return [
+        [dict(row, calculated_qty=quantity * row['ratio_to_primary']) for row in expansions[int(assembly_id)]]
+        for assembly_id, quantity in requests
+    ]
+
+
+def expansion_cache_stats() -> Dict:
+    with _lock:
+        return dict(_stats, entries=len(_cache))
@@ -0,0 +1,75 @@
+"""
+Benchmark: CSILookupService.search_item (inverted index) vs the linear scan
+Checks that both return identical results, then prints the timings.
+
+Usage: python benchmark_csi_lookup.py [repeat]
+"""
+import random
+import sys
+import time
+
+from csi_lookup_service import CSILookupService
+
+QUERIES = [
+    ("لبشة 100 متر مكعب", 'ar'),
+    ("raft foundation", 'en'),
+    ("قواعد منفصلة", 'ar'),
+    ("isolated footing 50 m3", 'en'),
+    ("محارة", 'ar'),
+    ("plaster", 'en'),
+    ("احسب لي كمية الخرسانة المسلحة للقواعد المنفصلة بمساحة 200 متر مربع مع الشدات", 'ar'),
+    ("I need the crew and duration for 300 m2 of ceramic floor tiles in the lobby", 'en'),
+    ("حفر", 'ar'),
+    ("ab", 'en'),
+]
+
+
+def build_queries(service):
+    """Fixed queries plus fragments and typos of names and synonyms."""
+    rng = random.Random(42)
+    queries = list(QUERIES)
+    for item in service.items_index:
+        for lang in ('ar', 'en'):
+            texts = [item.get(f'item_name_{lang}', '')] + list(item.get(f'synonyms_{lang}', []))
+            for text in texts:
+                if not text:
+                    continue
+                queries.append((text, lang))
+                cut = rng.randint(1, max(1, len(text) - 1))
+                queries.append((text[:cut], lang))
+                pos = rng.randrange(len(text))
+                queries.append((text[:pos] + text[pos + 1:], lang))
+                queries.append((text + ' ' + rng.choice(['concrete', 'خرسانة', 'work']), lang))
+    return queries
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    service = CSILookupService()
+    queries = build_queries(service)
+
+    mismatches = 0
+    for query, lang in queries:
+        for min_confidence in (30.0, 60.0, 85.0):
+            indexed = service.search_item(query, lang, min_confidence, top_k=10)
+            linear = service.search_item_linear(query, lang, min_confidence, top_k=10)
+            if indexed != linear:
+                mismatches += 1
+                print(f"MISMATCH: {query!r} ({lang}, min={min_confidence})")
+    print(f"{len(queries)} queries x 3 thresholds checked, {mismatches} mismatches")
+
+    timings = {}
+    for name, search in (('linear', service.search_item_linear), ('indexed', service.search_item)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for query, lang in queries:
+                search(query, lang, 60.0, 5)
+        timings[name] = (time.perf_counter() - start) / (repeat * len(queries))
+        print(f"{name:8s} {timings[name] * 1000:.3f} ms/query")
+    print(f"speedup  {timings['linear'] / timings['indexed']:.1f}x")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Benchmark: /api/project-plan scheduling (project_plan.py + scheduler.py)
+A synthetic building of BOQ items from the catalog: floors of trades in
+sequence, every floor after the one below, leveled against limits on the
+busiest crew positions. Checks that the leveled schedule keeps its links
+and limits, then prints the scheduling pass and end-to-end timings.
+
+Usage: python benchmark_project_plan.py [activities] [repeat]
+"""
+import random
+import sys
+import time
+
+import project_plan
+from catalog import get_catalog
+from project_plan import build_project_plan
+
+TRADES_PER_FLOOR = 25
+
+
+def build_request(catalog, activities, rng):
+    """BOQ lines grouped in floors; each floor runs its trades in a chain, FS after the floor below."""
+    candidates = [
+        item for item in catalog.items
+        if item.daily_output and any(m.kind for m in item.crew) and catalog.get_item(item.full_code) is item
+    ]
+    items = []
+    dependencies = []
+    for index in range(activities):
+        item = rng.choice(candidates)
+        items.append({
+            'id': f"L{index}",
+            'item_code': item.full_code,
+            'quantity': round(item.daily_output * rng.uniform(0.5, 6), 2),
+            'number_of_crews': rng.choice([1, 1, 2]),
+        })
+        floor, position = divmod(index, TRADES_PER_FLOOR)
+        if position:
+            dependencies.append({'from': f"L{index - 1}", 'to': f"L{index}",
+                                 'type': rng.choice(['FS', 'FS', 'SS']), 'lag': rng.choice([0, 0, 0.5])})
+        if floor:
+            dependencies.append({'from': f"L{index - TRADES_PER_FLOOR}", 'to': f"L{index}", 'type': 'FS'})
+
+    demand = {}
+    for line in items:
+        for member in catalog.get_item(line['item_code']).crew:
+            if member.kind and member.count:
+                demand[member.position] = demand.get(member.position, 0.0) + member.count
+    busiest = sorted(demand, key=demand.get, reverse=True)[:8]
+    limits = {position: 4 for position in busiest}
+    return {'items': items, 'dependencies': dependencies, 'resource_limits': limits}
+
+
+def check_plan(catalog, result, request):
+    """Links and limits hold in the leveled schedule; returns the number of violations."""
+    rows = {row['id']: row for row in result['activities']}
+    violations = 0
+    for dep in request['dependencies']:
+        pred, succ = rows[dep['from']], rows[dep['to']]
+        bound = (pred['finish'] if dep['type'] == 'FS' else pred['start']) + dep.get('lag', 0)
+        violations += succ['start'] < bound - 0.01
+
+    # Crew on site at every start; a crew larger than a limit works alone (capped at the limit)
+    limits = request['resource_limits']
+    events = []
+    for line in request['items']:
+        row = rows[line['id']]
+        for member in catalog.get_item(line['item_code']).crew:
+            if member.kind and member.count and member.position in limits:
+                units = min(member.count * line['number_of_crews'], limits[member.position])
+                events.append((row['start'], 1, member.position, units))
+                events.append((row['finish'], 0, member.position, -units))
+    in_use = dict.fromkeys(limits, 0.0)
+    for _, _, position, units in sorted(events):
+        in_use[position] += units
+        violations += in_use[position] > limits[position] + 0.01
+    return violations
+
+
+def timed(function, totals):
+    """Wrap `function` to add its run time to totals['seconds']."""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            totals['seconds'] += time.perf_counter() - start
+    return wrapper
+
+
+def main():
+    activities = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    catalog = get_catalog()
+    request = build_request(catalog, activities, random.Random(42))
+    unleveled = dict(request, resource_limits={})
+
+    result = build_project_plan(catalog, request)
+    violations = check_plan(catalog, result, request)
+    print(f"{activities} activities, {len(request['dependencies'])} links, limits on "
+          f"{len(request['resource_limits'])} positions: {violations} violations")
+    print(f"duration  CPM {result['cpm_duration']:.1f} days, leveled {result['project_duration']:.1f} days, "
+          f"{len(result['critical_path'])} critical")
+
+    scheduling = {'seconds': 0.0}
+    project_plan.schedule = timed(project_plan.schedule, scheduling)
+    for name, body in (('CPM only', unleveled), ('leveled', request)):
+        scheduling['seconds'] = 0.0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            build_project_plan(catalog, body)
+        total = (time.perf_counter() - start) / repeat
+        print(f"{name:9s} schedule() {scheduling['seconds'] / repeat * 1000:4.0f} ms, "
+              f"whole plan {total * 1000:4.0f} ms (expand + schedule + histogram + Gantt rows)")
+
+    return 1 if violations else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Benchmark: candidate retrieval for csi_reranker.search_and_rerank
+Compares the old LIKE scan (first 5 synonym terms, first top_n rows in
+rowid order) with retrieve_candidates() (bm25-ranked FTS5, and the
+parameterized LIKE fallback). Recall@k is measured against reranking
+the whole catalog.
+
+Usage: python benchmark_reranker.py [top_n] [k]
+"""
+import sys
+import time
+
+import csi_reranker
+from csi_reranker import (
+    CANDIDATE_COLUMNS, expand_synonyms, rerank_candidates, retrieve_candidates
+)
+from db_config import db_connection
+
+QUERIES = [
+    "isolated footing formwork",
+    "raft foundation concrete",
+    "column reinforcement",
+    "grade beam",
+    "cement plaster",
+    "gypsum plaster walls",
+    "flat slab casting",
+    "ceramic tiles",
+    "excavation",
+    "waterproofing membrane",
+    "قواعد منفصلة",
+    "لبشة",
+    "محارة",
+    "تسليح اعمدة",
+    "صب خرسانة سقف",
+    "033 172",
+]
+
+
+def legacy_candidates(conn, query, top_n):
+    """The previous retrieval: LIKE over 5 expansions, first top_n rows by rowid."""
+    terms = expand_synonyms(query)[:5]
+    columns = ", ".join(f"{column} AS {alias}" for column, alias in CANDIDATE_COLUMNS)
+    where = " OR ".join("description LIKE ?" for _ in terms) or "1=1"
+    rows = conn.execute(
+        f"SELECT {columns} FROM csi_items WHERE {where} LIMIT ?",
+        [f"%{term}%" for term in terms] + [top_n]
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def like_fallback(conn, query, top_n):
+    """retrieve_candidates() as it runs on a database without the FTS index."""
+    original = csi_reranker.fts_available
+    csi_reranker.fts_available = lambda conn: False
+    try:
+        return retrieve_candidates(conn, query, top_n)
+    finally:
+        csi_reranker.fts_available = original
+
+
+def top_ids(query, candidates, k):
+    return [r["id"] for r in rerank_candidates(query, candidates, top_k=k)["results"]]
+
+
+def main():
+    top_n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+
+    methods = [("legacy LIKE", legacy_candidates), ("FTS bm25", retrieve_candidates), ("LIKE fallback", like_fallback)]
+    totals = {name: [0.0, 0.0] for name, _ in methods}
+
+    with db_connection() as conn:
+        columns = ", ".join(f"{column} AS {alias}" for column, alias in CANDIDATE_COLUMNS)
+        everything = [dict(row) for row in conn.execute(f"SELECT {columns} FROM csi_items")]
+
+        print(f"{'query':32s}" + "".join(f"{name:>24s}" for name, _ in methods))
+        for query in QUERIES:
+            truth = set(top_ids(query, everything, k))
+            line = f"{query[:32]:32s}"
+            for name, retrieve in methods:
+                start = time.perf_counter()
+                candidates = retrieve(conn, query, top_n)
+                elapsed = time.perf_counter() - start
+                found = set(top_ids(query, candidates, k))
+                recall = len(found & truth) / len(truth) if truth else 1.0
+                totals[name][0] += recall
+                totals[name][1] += elapsed
+                line += f"{recall:>12.2f} {elapsed * 1000:>8.2f}ms "
+            print(line)
+
+    print(f"\nmean recall@{k} / retrieval latency (top_n={top_n}):")
+    for name, (recall, elapsed) in totals.items():
+        print(f"  {name:14s} recall {recall / len(QUERIES):.2f}   {elapsed / len(QUERIES) * 1000:.2f} ms/query")
+
+
+if __name__ == '__main__':
+    main()
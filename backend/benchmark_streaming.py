@@ -0,0 +1,137 @@
+"""
+Benchmark: time to first byte of the AI endpoints, buffered vs stream=true
+Runs /api/intelligent-ai against a fake Groq client and /api/chat against
+a local fake Ollama server. Both emit TOKENS tokens, TOKEN_DELAY seconds
+apart, so the numbers show the protocol overhead and not a real model.
+
+Usage: python benchmark_streaming.py [tokens] [token_delay_ms]
+"""
+import json
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import app as app_module
+from ollama_client import OllamaClient
+
+TOKENS = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+TOKEN_DELAY = (float(sys.argv[2]) if len(sys.argv) > 2 else 25) / 1000.0
+
+# A search action split into tokens, like a model would emit it
+ANSWER = '{"action": "search", "search_terms": ["plaster"], "quantity": 100, "unit": "m2"}'
+
+
+def answer_tokens():
+    size = max(1, len(ANSWER) // TOKENS + 1)
+    return [ANSWER[i:i + size] for i in range(0, len(ANSWER), size)]
+
+
+class FakeGroqCompletions:
+    def create(self, stream=False, **kwargs):
+        tokens = answer_tokens()
+        if not stream:
+            time.sleep(TOKEN_DELAY * len(tokens))
+            message = types.SimpleNamespace(content=ANSWER)
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+        return self._chunks(tokens)
+
+    def _chunks(self, tokens):
+        for token in tokens:
+            time.sleep(TOKEN_DELAY)
+            delta = types.SimpleNamespace(content=token)
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # chunked NDJSON like the real server
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._send_json({"models": [{"name": "llama3.2:latest"}]})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        answer = '{"search_query": "cement plaster", "search_type": "item"}'
+        size = max(1, len(answer) // TOKENS + 1)
+        tokens = [answer[i:i + size] for i in range(0, len(answer), size)]
+        if not payload.get('stream'):
+            time.sleep(TOKEN_DELAY * len(tokens))
+            self._send_json({"message": {"role": "assistant", "content": answer}, "done": True})
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for token in tokens:
+            time.sleep(TOKEN_DELAY)
+            self._write_chunk({"message": {"role": "assistant", "content": token}, "done": False})
+        self._write_chunk({"done": True})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data):
+        line = (json.dumps(data) + "\n").encode()
+        self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def measure(client, path, body, headers=None):
+    """(time to first body chunk, total time, last SSE event name or None)."""
+    start = time.perf_counter()
+    response = client.post(path, json=body, headers=headers or {}, buffered=False)
+    first = None
+    chunks = []
+    for chunk in response.response:
+        if first is None:
+            first = time.perf_counter() - start
+        chunks.append(chunk if isinstance(chunk, bytes) else chunk.encode())
+    total = time.perf_counter() - start
+    response.close()
+    text = b''.join(chunks).decode('utf-8')
+    events = [line[7:] for line in text.splitlines() if line.startswith('event: ')]
+    return first or total, total, (events[-1] if events else None), len(events)
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllamaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    app_module.OLLAMA_CLIENT = OllamaClient(base, app_module.DEFAULT_MODEL)
+    app_module.GROQ_CLIENT = types.SimpleNamespace(chat=types.SimpleNamespace(completions=FakeGroqCompletions()))
+    app_module.AI_MODEL_NAME = 'fake'
+
+    client = app_module.app.test_client()
+    no_cache = {'X-Cache-Bypass': '1'}
+    cases = [
+        ("/api/intelligent-ai", {"query": "محارة 100 م2", "lang": "ar"}, no_cache),
+        ("/api/chat", {"message": "cement plaster", "history": []}, None),
+    ]
+
+    print(f"{len(answer_tokens())} tokens, {TOKEN_DELAY * 1000:.0f} ms apart\n")
+    print(f"{'endpoint':22s}{'mode':10s}{'TTFB ms':>10s}{'total ms':>10s}  events")
+    for path, body, headers in cases:
+        for stream in (False, True):
+            request_body = dict(body, stream=stream)
+            if 'history' in request_body:
+                request_body['history'] = []
+            ttfb, total, last_event, count = measure(client, path, request_body, headers)
+            mode = 'stream' if stream else 'buffered'
+            events = f"{count} (last: {last_event})" if last_event else '-'
+            print(f"{path:22s}{mode:10s}{ttfb * 1000:10.1f}{total * 1000:10.1f}  {events}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
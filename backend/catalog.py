@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory CSI Catalog Snapshot
+==============================
+csi_items and the assembly tables are read-only at runtime, so each worker
+loads them once into an immutable snapshot instead of re-querying SQLite
+and rebuilding dicts with dict(row) on every request.
+
+- Items are compact __slots__ records (CatalogItem) with their crew as
+  CrewMember records, read from the pre-parsed csi_crew_members table
+  (see crew_members.py).
+- Hash indexes by full_code, item_code and sub_div2_code answer the lookups
+  that the routes used to send to SQLite. Like the original
+  `WHERE ... = ?` + fetchone() queries they return the first row (lowest id).
+- get_catalog() re-checks the database file's mtime (at most every
+  CATALOG_CHECK_INTERVAL seconds) and swaps in a freshly loaded snapshot
+  when the Excel import has rewritten the database. Readers keep using the
+  snapshot they already hold, so a reload never exposes a half-built state.
+- add_load_listener() lets other modules precompute derived data once per
+  loaded snapshot.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from crew_members import CREW_SLOTS, CREW_TABLE, crew_member_rows
+from db_config import DB_PATH, db_connection, reset_pool
+
+# How often (seconds) get_catalog() stats the database file for changes
+CATALOG_CHECK_INTERVAL = float(os.environ.get('CATALOG_CHECK_INTERVAL', '2'))
+
+ITEM_FIELDS = (
+    'id', 'full_code',
+    'main_div_code', 'main_div_name',
+    'sub_div1_code', 'sub_div1_name',
+    'sub_div2_code', 'sub_div2_name',
+    'item_code', 'description', 'unit',
+    'daily_output', 'man_hours', 'equip_hours', 'crew_structure',
+)
+
+ASSEMBLY_COMPONENT_FIELDS = (
+    'id', 'assembly_id', 'csi_full_code', 'ratio_to_primary', 'ratio_type',
+    'component_role_en', 'component_role_ar', 'crew_count',
+)
+
+ASSEMBLY_DEPENDENCY_FIELDS = ('assembly_id', 'component_id', 'predecessor_id', 'dep_type', 'lag_days')
+
+
+class CrewMember:
+    """One crew_num_N / crew_desc_N pair of an item (a csi_crew_members row)."""
+
+    __slots__ = ('number', 'raw_count', 'position', 'count', 'kind')
+
+    def __init__(self, number, raw_count, position, count, kind):
+        self.number = number          # crew slot 1..13
+        self.raw_count = raw_count    # crew_num_N as stored (text or None)
+        self.position = position      # crew_desc_N (text or None)
+        self.count = count            # parsed count per crew, None if not numeric
+        self.kind = kind              # 'labor' / 'equipment' when both parts present
+
+
+class CatalogItem:
+    """Read-only csi_items row. Supports item['column'] like sqlite3.Row."""
+
+    __slots__ = ITEM_FIELDS + ('crew_columns', 'crew')
+
+    def __init__(self, row, keys, crew_rows=None):
+        for field in ITEM_FIELDS:
+            setattr(self, field, row[field] if field in keys else None)
+
+        crew_columns = []
+        for i in range(1, CREW_SLOTS + 1):
+            num_key, desc_key = f'crew_num_{i}', f'crew_desc_{i}'
+            crew_columns.append((
+                row[num_key] if num_key in keys else None,
+                row[desc_key] if desc_key in keys else None,
+            ))
+        self.crew_columns = tuple(crew_columns)
+
+        if crew_rows is None:
+            # Database without csi_crew_members: parse the columns here
+            crew_rows = crew_member_rows(self.id, self.full_code, crew_columns)
+        self.crew = tuple(
+            CrewMember(number, raw_count, position, count, kind)
+            for _, _, number, position, count, raw_count, kind in crew_rows
+        )
+
+    def __getitem__(self, key):
+        if key in ITEM_FIELDS:
+            return getattr(self, key)
+        if key.startswith('crew_num_') or key.startswith('crew_desc_'):
+            prefix, _, number = key.rpartition('_')
+            index = int(number) - 1
+            if 0 <= index < CREW_SLOTS:
+                return self.crew_columns[index][0 if prefix == 'crew_num' else 1]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except (KeyError, ValueError):
+            return default
+
+    def as_dict(self) -> Dict:
+        """Same keys and order as dict(row) for SELECT * FROM csi_items."""
+        data = {field: getattr(self, field) for field in ITEM_FIELDS}
+        for i, (crew_num, crew_desc) in enumerate(self.crew_columns, 1):
+            data[f'crew_num_{i}'] = crew_num
+            data[f'crew_desc_{i}'] = crew_desc
+        return data
+
+
+class AssemblyComponent:
+    """Read-only assembly_components row."""
+
+    __slots__ = ASSEMBLY_COMPONENT_FIELDS
+
+    def __init__(self, row, keys):
+        for field in ASSEMBLY_COMPONENT_FIELDS:
+            setattr(self, field, row[field] if field in keys else None)
+
+
+def sql_int(value) -> Optional[int]:
+    """Python equivalent of SQLite's CAST(value AS INTEGER) (NULL -> None)."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).lstrip()
+    end = 1 if text[:1] in ('+', '-') else 0
+    while end < len(text) and text[end].isdigit():
+        end += 1
+    try:
+        return int(text[:end])
+    except ValueError:
+        return 0
+
+
+def _sql_order(value):
+    """Sort key placing NULLs first, like SQLite's ORDER BY."""
+    number = sql_int(value)
+    return (0, 0) if number is None else (1, number)
+
+
+def _group_min_codes(rows):
+    """
+    Emulate `SELECT MIN(code), name ... GROUP BY name ORDER BY CAST(MIN(code) AS INTEGER)`.
+    rows: iterable of (code, name) with non-empty codes.
+    """
+    groups: Dict = {}
+    for code, name in rows:
+        current = groups.get(name)
+        if current is None or code < current:
+            groups[name] = code
+    # GROUP BY yields groups in name order (NULL first); the sort is stable
+    ordered = sorted(groups.items(), key=lambda pair: (pair[0] is not None, pair[0] or ''))
+    ordered.sort(key=lambda pair: _sql_order(pair[1]))
+    return [{'code': code, 'name': name} for name, code in ordered]
+
+
+class CatalogHierarchy:
+    """
+    Division tree (main -> sub1 -> sub2) precomputed from the items.
+    Each level returns exactly what the old GROUP BY / DISTINCT queries
+    behind /api/divisions, /api/subdivisions1 and /api/subdivisions2 did.
+    """
+
+    def __init__(self, items):
+        divisions = {}
+        sub1_rows: Dict[str, list] = {}
+        sub2_rows: Dict[Tuple[str, str], list] = {}
+        sub2_rows_by_sub1: Dict[str, list] = {}
+
+        for item in items:
+            main_code = item.main_div_code
+            if main_code:
+                divisions.setdefault((main_code, item.main_div_name), None)
+            if item.sub_div1_code:
+                sub1_rows.setdefault(main_code, []).append((item.sub_div1_code, item.sub_div1_name))
+            if item.sub_div2_code:
+                row = (item.sub_div2_code, item.sub_div2_name)
+                sub2_rows.setdefault((main_code, item.sub_div1_code), []).append(row)
+                sub2_rows_by_sub1.setdefault(item.sub_div1_code, []).append(row)
+
+        self.divisions = [
+            {'code': code, 'name': name}
+            for code, name in sorted(divisions, key=lambda pair: _sql_order(pair[0]))
+        ]
+        self.subdivisions1 = {main: _group_min_codes(rows) for main, rows in sub1_rows.items()}
+        self.subdivisions2 = {key: _group_min_codes(rows) for key, rows in sub2_rows.items()}
+        self.subdivisions2_by_sub1 = {sub1: _group_min_codes(rows) for sub1, rows in sub2_rows_by_sub1.items()}
+
+    def get_subdivisions1(self, main_code: str) -> List[Dict]:
+        return self.subdivisions1.get(main_code, [])
+
+    def get_subdivisions2(self, sub1_code: str, main_code: Optional[str] = None) -> List[Dict]:
+        if main_code:
+            return self.subdivisions2.get((main_code, sub1_code), [])
+        return self.subdivisions2_by_sub1.get(sub1_code, [])
+
+    def tree(self) -> List[Dict]:
+        """Whole hierarchy as nested lists (for /api/hierarchy)."""
+        return [
+            {
+                'code': division['code'],
+                'name': division['name'],
+                'subdivisions1': [
+                    {
+                        'code': sub1['code'],
+                        'name': sub1['name'],
+                        'subdivisions2': self.get_subdivisions2(sub1['code'], division['code'])
+                    }
+                    for sub1 in self.get_subdivisions1(division['code'])
+                ]
+            }
+            for division in self.divisions
+        ]
+
+
+class CatalogSnapshot:
+    """Immutable view of the catalog tables at one database version."""
+
+    def __init__(self, items, assemblies, components, mtime, dependencies=()):
+        self.items: Tuple[CatalogItem, ...] = tuple(items)
+        self.assemblies: Tuple[Dict, ...] = tuple(assemblies)
+        self.mtime = mtime
+        self.loaded_at = time.time()
+
+        self.by_full_code: Dict[str, CatalogItem] = {}
+        self.by_item_code: Dict[str, CatalogItem] = {}
+        self.by_sub_div2_code: Dict[str, CatalogItem] = {}
+        for item in self.items:
+            # setdefault keeps the first (lowest id) row, like fetchone()
+            self.by_full_code.setdefault(item.full_code, item)
+            self.by_item_code.setdefault(item.item_code, item)
+            self.by_sub_div2_code.setdefault(item.sub_div2_code, item)
+
+        self.assemblies_by_id: Dict[int, Dict] = {a['id']: a for a in self.assemblies}
+        self.components_by_assembly: Dict[int, Tuple[AssemblyComponent, ...]] = {}
+        grouped: Dict[int, List[AssemblyComponent]] = {}
+        for component in components:
+            grouped.setdefault(component.assembly_id, []).append(component)
+        for assembly_id, group in grouped.items():
+            self.components_by_assembly[assembly_id] = tuple(group)
+        # assembly_dependencies rows (schema_v4.sql), used by the scheduler
+        self.dependencies_by_assembly: Dict[int, Tuple[Dict, ...]] = {}
+        grouped_dependencies: Dict[int, List[Dict]] = {}
+        for dependency in dependencies:
+            grouped_dependencies.setdefault(dependency['assembly_id'], []).append(dependency)
+        for assembly_id, group in grouped_dependencies.items():
+            self.dependencies_by_assembly[assembly_id] = tuple(group)
+
+        self.version = self._compute_version(components, dependencies)
+        self.hierarchy = CatalogHierarchy(self.items)
+
+    def _compute_version(self, components, dependencies) -> str:
+        digest = hashlib.sha1()
+        for item in self.items:
+            digest.update(repr(tuple(item.as_dict().values())).encode('utf-8'))
+        for assembly in self.assemblies:
+            digest.update(repr(tuple(assembly.values())).encode('utf-8'))
+        for component in components:
+            digest.update(repr(tuple(getattr(component, f) for f in ASSEMBLY_COMPONENT_FIELDS)).encode('utf-8'))
+        for dependency in dependencies:
+            digest.update(repr(tuple(dependency.values())).encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    def get_item(self, full_code: str) -> Optional[CatalogItem]:
+        return self.by_full_code.get(full_code)
+
+    def stats(self) -> Dict:
+        return {
+            'version': self.version,
+            'items': len(self.items),
+            'assemblies': len(self.assemblies),
+            'loaded_at': self.loaded_at,
+        }
+
+
+def _table_exists(conn, name: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def load_snapshot(db_path: str = DB_PATH) -> CatalogSnapshot:
+    """Read the catalog tables into a new snapshot."""
+    mtime = os.path.getmtime(db_path)
+
+    with db_connection() as conn:
+        crew_by_item = None
+        if _table_exists(conn, CREW_TABLE):
+            crew_by_item = {}
+            for row in conn.execute(
+                f'SELECT item_id, full_code, crew_number, position, count, count_text, kind '
+                f'FROM {CREW_TABLE} ORDER BY item_id, crew_number'
+            ):
+                crew_by_item.setdefault(row[0], []).append(tuple(row))
+
+        cursor = conn.execute('SELECT * FROM csi_items ORDER BY id')
+        keys = {column[0] for column in cursor.description}
+        if crew_by_item is None:
+            items = [CatalogItem(row, keys) for row in cursor]
+        else:
+            items = [CatalogItem(row, keys, crew_by_item.get(row['id'], ())) for row in cursor]
+
+        assemblies = []
+        components = []
+        if _table_exists(conn, 'assemblies'):
+            assemblies = [dict(row) for row in conn.execute('SELECT * FROM assemblies ORDER BY id')]
+        if _table_exists(conn, 'assembly_components'):
+            cursor = conn.execute('SELECT * FROM assembly_components ORDER BY id')
+            keys = {column[0] for column in cursor.description}
+            components = [AssemblyComponent(row, keys) for row in cursor]
+        dependencies = []
+        if _table_exists(conn, 'assembly_dependencies'):
+            dependencies = [dict(row) for row in conn.execute(
+                f"SELECT {', '.join(ASSEMBLY_DEPENDENCY_FIELDS)} FROM assembly_dependencies ORDER BY id"
+            )]
+
+    return CatalogSnapshot(items, assemblies, components, mtime, dependencies)
+
+
+_snapshot: Optional[CatalogSnapshot] = None
+_last_check = 0.0
+_load_lock = threading.Lock()
+_load_listeners = []
+
+
+def add_load_listener(callback) -> None:
+    """
+    Register callback(snapshot), called each time a new snapshot is loaded.
+    Used to precompute derived data (e.g. the search index payload) once
+    per catalog version instead of on every request.
+    """
+    if callback not in _load_listeners:
+        _load_listeners.append(callback)
+    if _snapshot is not None:
+        callback(_snapshot)
+
+
+def _notify_loaded(snapshot: CatalogSnapshot) -> None:
+    for callback in list(_load_listeners):
+        try:
+            callback(snapshot)
+        except Exception as e:
+            print(f"[WARNING] Catalog load listener {getattr(callback, '__name__', callback)} failed: {e}")
+
+
+def get_catalog() -> CatalogSnapshot:
+    """
+    Current catalog snapshot for this worker.
+    Loads it on first use and reloads it when the database file changes.
+    """
+    global _snapshot, _last_check
+
+    snapshot = _snapshot
+    now = time.monotonic()
+    if snapshot is not None and now - _last_check < CATALOG_CHECK_INTERVAL:
+        return snapshot
+
+    with _load_lock:
+        snapshot = _snapshot
+        if snapshot is not None and time.monotonic() - _last_check < CATALOG_CHECK_INTERVAL:
+            return snapshot
+        try:
+            mtime = os.path.getmtime(DB_PATH)
+        except OSError:
+            mtime = None
+        if snapshot is None or (mtime is not None and mtime != snapshot.mtime):
+            if snapshot is not None:
+                # The file was rewritten - pooled connections may point at the old one
+                reset_pool()
+            try:
+                new_snapshot = load_snapshot(DB_PATH)
+            except Exception as e:
+                if snapshot is None:
+                    raise
+                # e.g. "database is locked" while the importer rewrites the file:
+                # keep serving the old snapshot, retry after CATALOG_CHECK_INTERVAL
+                print(f"[WARNING] CSI catalog reload failed, keeping version {snapshot.version}: {e}")
+                _last_check = time.monotonic()
+                return snapshot
+            print(f"[INFO] CSI catalog loaded: {len(new_snapshot.items)} items (version {new_snapshot.version})")
+            _notify_loaded(new_snapshot)
+            _snapshot = new_snapshot
+        _last_check = time.monotonic()
+        return _snapshot
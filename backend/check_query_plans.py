@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Query Plan Check
+================
+Runs EXPLAIN QUERY PLAN on every SQL statement app.py executes and fails
+when one of them scans a table instead of searching an index.
+
+Statements are read from app.py itself (conn.execute() and search_items()
+calls, found with ast). Literal SQL is explained as written; SQL built at
+run time is explained in the variants listed in DYNAMIC_QUERIES. Every
+parameter is bound as a '%x%' pattern, the worst case for LIKE.
+
+A few statements cannot use a B-tree index (substring LIKE '%term%',
+mostly fallbacks for databases without the FTS index); they are listed in
+ALLOWED_SCANS with the reason and reported, not failed.
+
+Usage: python check_query_plans.py [database]
+"""
+import ast
+import os
+import sqlite3
+import sys
+from typing import Dict, List, Optional, Tuple
+from urllib.request import pathname2url
+
+from fts_search import search_items
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+SAMPLE_PARAM = '%x%'
+
+# SQL assembled at run time, per app.py function: the statements it can build
+DYNAMIC_QUERIES = {
+    # /api/items LIKE mode: optional hierarchy filters, optional description LIKE
+    'get_items': [
+        'SELECT * FROM csi_items WHERE 1=1 AND main_div_code = ? LIMIT ?',
+        'SELECT * FROM csi_items WHERE 1=1 AND main_div_code = ? AND sub_div1_code = ? LIMIT ?',
+        'SELECT * FROM csi_items WHERE 1=1 AND main_div_code = ? AND sub_div1_code = ? AND sub_div2_code = ? '
+        'AND description LIKE ? LIMIT ?',
+        'SELECT * FROM csi_items WHERE 1=1 AND sub_div1_code = ? LIMIT ?',
+        'SELECT * FROM csi_items WHERE 1=1 AND sub_div2_code = ? AND description LIKE ? LIMIT ?',
+        'SELECT * FROM csi_items WHERE 1=1 AND description LIKE ? LIMIT ?',
+        'SELECT * FROM csi_items WHERE 1=1 LIMIT ?',
+    ],
+    # /api/smart-ai concrete elements: work stage prefix (all stages: Division 03) + element
+    'smart_ai': [
+        "SELECT full_code, description, unit, daily_output FROM csi_items "
+        "WHERE full_code LIKE '031%' AND description LIKE '%column%' LIMIT 15",
+        "SELECT full_code, description, unit, daily_output FROM csi_items "
+        "WHERE full_code LIKE '032%' AND (description LIKE '%beam%' OR description LIKE '%girder%') LIMIT 15",
+        "SELECT full_code, description, unit, daily_output FROM csi_items "
+        "WHERE full_code LIKE '033%' LIMIT 15",
+        "SELECT full_code, description, unit, daily_output FROM csi_items "
+        "WHERE full_code LIKE '03%' AND (description LIKE '%footing%' OR description LIKE '%foundation%') LIMIT 15",
+    ],
+}
+
+# Statements allowed to scan, with the reason
+ALLOWED_SCANS = {
+    'SELECT COUNT(*) FROM csi_items':
+        '/health row count, read from the smallest index',
+    'SELECT * FROM csi_items WHERE 1=1 LIMIT ?':
+        'first rows of the catalog, stops at LIMIT',
+    'SELECT * FROM csi_items WHERE 1=1 AND description LIKE ? LIMIT ?':
+        'substring LIKE, fallback when the FTS index is missing',
+    'SELECT full_code, description, unit, daily_output, man_hours, equip_hours, crew_structure '
+    'FROM csi_items WHERE description LIKE ? OR description LIKE ? LIMIT 10':
+        'substring LIKE on keyword-mapped descriptions, stops at LIMIT',
+    'SELECT full_code, description, unit, daily_output, man_hours FROM csi_items '
+    'WHERE description LIKE ? OR full_code LIKE ? LIMIT 10':
+        'substring LIKE, fallback when the FTS index is missing or finds nothing',
+    'SELECT * FROM csi_items WHERE description LIKE ? LIMIT 5':
+        'substring LIKE, fallback when the FTS index is missing or finds nothing',
+}
+
+
+def is_scan(detail: str) -> bool:
+    """A plan line reading a whole table or index (FTS MATCH lookups are not scans)."""
+    return detail.startswith('SCAN ') and 'VIRTUAL TABLE' not in detail and detail != 'SCAN CONSTANT ROW'
+
+
+class _Recorder:
+    """Stands in for a connection and keeps the statement search_items() builds."""
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, sql, parameters=()):
+        self.statements.append(sql)
+        return self
+
+    def fetchall(self):
+        return []
+
+
+def _fts_statements() -> List[str]:
+    recorder = _Recorder()
+    search_items(recorder, 'x')
+    search_items(recorder, 'x', filters={'main_div_code': 'x', 'sub_div1_code': 'x', 'sub_div2_code': 'x'},
+                 with_snippet=True)
+    return recorder.statements
+
+
+def app_statements(app_path: str = APP_PATH) -> Tuple[List[Tuple[str, int, str]], List[str]]:
+    """
+    ([(function, line, sql)], problems) for every query app.py runs.
+    Dynamic SQL expands to its DYNAMIC_QUERIES variants.
+    """
+    with open(app_path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), app_path)
+    statements = []
+    problems = []
+
+    def visit(node, function):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                visit(child, child.name)
+                continue
+            if isinstance(child, ast.Call) and child.args:
+                name = getattr(child.func, 'attr', getattr(child.func, 'id', None))
+                sql = child.args[0]
+                if name == 'search_items':
+                    statements.extend((function, child.lineno, s) for s in _fts_statements())
+                elif name == 'execute':
+                    if isinstance(sql, ast.Constant) and isinstance(sql.value, str):
+                        statements.append((function, child.lineno, sql.value))
+                    elif function in DYNAMIC_QUERIES:
+                        statements.extend((function, child.lineno, s) for s in DYNAMIC_QUERIES[function])
+                    else:
+                        problems.append(f"app.py:{child.lineno} ({function}): SQL built at run time, "
+                                        f"list its statements in DYNAMIC_QUERIES")
+            visit(child, function)
+
+    visit(tree, None)
+    return statements, problems
+
+
+def explain(conn, sql: str) -> List[str]:
+    """EXPLAIN QUERY PLAN detail lines, every parameter bound as SAMPLE_PARAM."""
+    params = (SAMPLE_PARAM,) * sql.count('?')
+    return [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+
+def plan_report(db_path: str, app_path: str = APP_PATH) -> Tuple[List[Dict], List[str]]:
+    """
+    ([{function, line, sql, plan, scans, allowed}], problems). A statement
+    on a table this database does not have (e.g. no FTS index) has plan None.
+    """
+    statements, problems = app_statements(app_path)
+    conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro", uri=True)
+    report = []
+    try:
+        seen = set()
+        for function, line, sql in statements:
+            if sql in seen:
+                continue
+            seen.add(sql)
+            entry = {'function': function, 'line': line, 'sql': sql, 'plan': None, 'scans': [],
+                     'allowed': ALLOWED_SCANS.get(sql)}
+            report.append(entry)
+            try:
+                entry['plan'] = explain(conn, sql)
+            except sqlite3.OperationalError as e:
+                if 'no such table' not in str(e):
+                    problems.append(f"app.py:{line} ({function}): {e}")
+                continue
+            entry['scans'] = [detail for detail in entry['plan'] if is_scan(detail)]
+            if entry['scans'] and not entry['allowed']:
+                problems.append(f"app.py:{line} ({function}): {'; '.join(entry['scans'])} in {sql}")
+    finally:
+        conn.close()
+    return report, problems
+
+
+def check_query_plans(db_path: str, app_path: str = APP_PATH) -> List[str]:
+    """Problems found (unlisted full scans, unknown dynamic SQL); empty when all is well."""
+    return plan_report(db_path, app_path)[1]
+
+
+def main(db_path: Optional[str] = None) -> int:
+    if db_path is None:
+        from db_config import DB_PATH
+        db_path = DB_PATH
+    report, problems = plan_report(db_path)
+    for entry in report:
+        where = f"app.py:{entry['line']} {entry['function']}"
+        if entry['plan'] is None:
+            print(f"⏭️  {where} - table missing in this database")
+        elif not entry['scans']:
+            print(f"✅ {where} - {'; '.join(entry['plan'])}")
+        elif entry['allowed']:
+            print(f"⚠️  {where} - {'; '.join(entry['scans'])} (allowed: {entry['allowed']})")
+        else:
+            print(f"❌ {where} - {'; '.join(entry['scans'])}")
+            print(f"     {entry['sql']}")
+
+    print()
+    if problems:
+        for problem in problems:
+            print(f"❌ {problem}")
+        print(f"❌ {len(problems)} query plan problem(s)")
+        return 1
+    print(f"✅ {len(report)} statements checked, no unexpected table scans")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Provider Circuit Breakers
+=========================
+One breaker per LLM provider (Groq, Ollama, Gemini) over a sliding window
+of the last CIRCUIT_WINDOW calls:
+
+- closed:    calls go through; the circuit opens when at least
+             CIRCUIT_MIN_CALLS calls are in the window and the failure
+             rate reaches CIRCUIT_FAILURE_RATE or the share of calls slower
+             than the provider's latency threshold reaches CIRCUIT_SLOW_RATE
+- open:      calls are refused at once (CircuitOpen) for
+             CIRCUIT_OPEN_SECONDS; the routes answer from the rule-based
+             pipeline instead of waiting for the provider to fail
+- half-open: after the cool-down one probe call is let through; success
+             closes the circuit, failure opens it again
+
+Routes wrap provider calls in provider_call(), which also reports the
+call latency to metrics.py; /health reports circuit_status().
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator
+
+from llm_limits import ProviderBusy
+from metrics import observe_llm_call, record_llm_tokens
+
+CIRCUIT_WINDOW = int(os.environ.get('CIRCUIT_WINDOW', '20'))
+CIRCUIT_MIN_CALLS = int(os.environ.get('CIRCUIT_MIN_CALLS', '5'))
+CIRCUIT_FAILURE_RATE = float(os.environ.get('CIRCUIT_FAILURE_RATE', '0.5'))
+CIRCUIT_SLOW_RATE = float(os.environ.get('CIRCUIT_SLOW_RATE', '0.8'))
+CIRCUIT_OPEN_SECONDS = float(os.environ.get('CIRCUIT_OPEN_SECONDS', '30'))
+
+# A call slower than this (seconds) counts as slow
+SLOW_CALL_SECONDS = {
+    'groq': float(os.environ.get('CIRCUIT_SLOW_SECONDS_GROQ', '15')),
+    'ollama': float(os.environ.get('CIRCUIT_SLOW_SECONDS_OLLAMA', '60')),
+    'gemini': float(os.environ.get('CIRCUIT_SLOW_SECONDS_GEMINI', '20')),
+}
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpen(Exception):
+    """The provider's circuit is open - use the fallback."""
+
+    def __init__(self, provider: str):
+        super().__init__(f"{provider} circuit is open")
+        self.provider = provider
+
+
+class CircuitBreaker:
+    """Failure-rate / slow-call-rate breaker with half-open probing."""
+
+    def __init__(self, name: str, slow_call_seconds: float):
+        self.name = name
+        self.slow_call_seconds = slow_call_seconds
+        self.state = CLOSED
+        self._window = deque(maxlen=CIRCUIT_WINDOW)  # (ok, slow) per call
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    def is_open(self) -> bool:
+        """True while calls would be refused (does not take a probe slot)."""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self._opened_at < CIRCUIT_OPEN_SECONDS
+            return self.state == HALF_OPEN and self._probe_in_flight
+
+    def allow(self) -> bool:
+        """Permission for one call; the caller must then record() or cancel()."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= CIRCUIT_OPEN_SECONDS:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._stats['rejected'] += 1
+            return False
+
+    def record(self, ok: bool, latency: float) -> None:
+        slow = latency > self.slow_call_seconds
+        with self._lock:
+            self._stats['calls'] += 1
+            if not ok:
+                self._stats['failures'] += 1
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                if ok and not slow:
+                    self.state = CLOSED
+                    self._window.clear()
+                else:
+                    self._open()
+                return
+            self._window.append((ok, slow))
+            if self.state == CLOSED and len(self._window) >= CIRCUIT_MIN_CALLS:
+                failure_rate, slow_rate = self._rates()
+                if failure_rate >= CIRCUIT_FAILURE_RATE or slow_rate >= CIRCUIT_SLOW_RATE:
+                    self._open()
+
+    def cancel(self) -> None:
+        """The allowed call never reached the provider (e.g. no free slot)."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def status(self) -> Dict:
+        with self._lock:
+            failure_rate, slow_rate = self._rates()
+            status = dict(self._stats)
+            status.update({
+                'state': self.state,
+                'window_calls': len(self._window),
+                'failure_rate': round(failure_rate, 3),
+                'slow_rate': round(slow_rate, 3),
+                'slow_call_seconds': self.slow_call_seconds,
+            })
+            if self.state == OPEN:
+                status['retry_in'] = round(max(0.0, CIRCUIT_OPEN_SECONDS - (time.monotonic() - self._opened_at)), 1)
+        return status
+
+    # Callers hold self._lock
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._stats['opened'] += 1
+        print(f"[WARNING] Circuit for {self.name} opened - using the rule-based fallback")
+
+    def _rates(self):
+        if not self._window:
+            return 0.0, 0.0
+        calls = len(self._window)
+        failures = sum(1 for ok, _ in self._window if not ok)
+        slow = sum(1 for _, is_slow in self._window if is_slow)
+        return failures / calls, slow / calls
+
+
+_breakers: Dict[str, CircuitBreaker] = {
+    name: CircuitBreaker(name, seconds) for name, seconds in SLOW_CALL_SECONDS.items()
+}
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    return _breakers[provider]
+
+
+def circuit_open(provider: str) -> bool:
+    return _breakers[provider].is_open()
+
+
+class ProviderCall:
+    """Handle yielded by provider_call(); failed() marks a handled failure."""
+
+    def __init__(self):
+        self.ok = True
+
+    def failed(self) -> None:
+        self.ok = False
+
+
+@contextmanager
+def provider_call(provider: str):
+    """
+    Guard one provider call: raises CircuitOpen when the circuit refuses it,
+    records success / failure and latency otherwise. Errors the caller turns
+    into a reply itself are reported with call.failed().
+    """
+    breaker = _breakers[provider]
+    if not breaker.allow():
+        observe_llm_call(provider, 0.0, 'circuit_open')
+        raise CircuitOpen(provider)
+    call = ProviderCall()
+    start = time.monotonic()
+    try:
+        yield call
+    except ProviderBusy:
+        breaker.cancel()
+        raise
+    except Exception:
+        latency = time.monotonic() - start
+        breaker.record(False, latency)
+        observe_llm_call(provider, latency, 'error')
+        raise
+    except BaseException:
+        # Client went away mid-stream (GeneratorExit): not the provider's fault
+        breaker.cancel()
+        observe_llm_call(provider, time.monotonic() - start, 'cancelled')
+        raise
+    else:
+        latency = time.monotonic() - start
+        breaker.record(call.ok, latency)
+        observe_llm_call(provider, latency, 'ok' if call.ok else 'error')
+
+
+def guarded_tokens(provider: str, tokens: Callable[[], Iterator[str]]) -> Iterator[str]:
+    """Streamed tokens counted as one provider call (latency = whole stream)."""
+    chunks = 0
+    try:
+        with provider_call(provider):
+            for token in tokens():
+                chunks += 1
+                yield token
+    finally:
+        record_llm_tokens(provider, completion=chunks)
+
+
+def circuit_status() -> Dict[str, Dict]:
+    return {name: breaker.status() for name, breaker in _breakers.items()}
@@ -171,32 +171,48 @@ WORK_STAGES = {
 }
 
 
+def _group_hits(query_lower, group):
+    """Keys of `group` with a keyword in the query -> set of languages hit."""
+    # Single Aho-Corasick pass shared by all detections (keyword_matcher.py)
+    from keyword_matcher import scan_keywords
+    found = {}
+    for hit in scan_keywords(query_lower):
+        if hit.group == group:
+            found.setdefault(hit.key, set()).add(hit.language)
+    return found
+
+
 def detect_concrete_element(query):
     """
     Detect which concrete element the user is asking about.
     Returns: (element_key, subtype_key or None, detected_language)
     """
     query_lower = query.lower()
+    found = _group_hits(query_lower, "element")
     
     for element_key, element_data in CONCRETE_ELEMENTS.items():
-        # Check Arabic keywords
-        for kw in element_data["ar"]:
-            if kw in query_lower:
-                # Check for subtype
-                subtype = detect_subtype(query_lower, element_data.get("subtypes", {}))
-                return (element_key, subtype, "ar")
-        
-        # Check English keywords
-        for kw in element_data["en"]:
-            if kw in query_lower:
-                subtype = detect_subtype(query_lower, element_data.get("subtypes", {}))
-                return (element_key, subtype, "en")
+        languages = found.get(element_key)
+        if languages:
+            # Arabic keywords are checked before English ones
+            subtype = detect_subtype(query_lower, element_data.get("subtypes", {}), element_key)
+            return (element_key, subtype, "ar" if "ar" in languages else "en")
     
     return (None, None, None)
 
 
-def detect_subtype(query, subtypes):
-    """Detect specific subtype from query."""
+def detect_subtype(query, subtypes, element_key=None):
+    """
+    Detect specific subtype from query. With the CONCRETE_ELEMENTS key of
+    the subtypes, the keyword automaton answers the lookup.
+    """
+    if element_key in CONCRETE_ELEMENTS:
+        found = _group_hits(query, "subtype")
+        for subtype_key in subtypes:
+            if (element_key, subtype_key) in found:
+                return subtype_key
+        return None
+    
+    # Subtypes that are not part of CONCRETE_ELEMENTS
     for subtype_key, subtype_data in subtypes.items():
         for kw in subtype_data.get("keywords_ar", []):
             if kw in query:
@@ -209,15 +225,11 @@ def detect_subtype(query, subtypes):
 
 def detect_work_stage(query):
     """Detect which work stage the user is asking about."""
-    query_lower = query.lower()
+    found = _group_hits(query.lower(), "stage")
     
-    for stage_key, stage_data in WORK_STAGES.items():
-        for kw in stage_data.get("keywords_ar", []):
-            if kw in query_lower:
-                return stage_key
-        for kw in stage_data.get("keywords_en", []):
-            if kw in query_lower:
-                return stage_key
+    for stage_key in WORK_STAGES:
+        if stage_key in found:
+            return stage_key
     
     return None
 
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Crew Requirement Calculations
+=============================
+The math behind /api/calculate-crew, shared with the BOQ batch endpoint
+/api/calculate-crew/batch so both always return identical numbers for the
+same line.
+"""
+
+import math
+import os
+from typing import Dict, List, Tuple
+
+# Largest BOQ accepted by /api/calculate-crew/batch in one request
+MAX_BATCH_LINES = int(os.environ.get('CREW_BATCH_MAX_LINES', '5000'))
+
+# Activity split of the total duration
+ACTIVITY_SPLIT = (
+    ('Site Preparation & Setup', 0.1),
+    ('Main Work Execution', 0.7),
+    ('Finishing & Cleanup', 0.2),
+)
+
+
+class CrewCalculationError(Exception):
+    """A line that cannot be calculated; `status` is the HTTP status to report."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def parse_crew_input(data: Dict) -> Tuple[str, float, float, int]:
+    """
+    Read item_code, quantity, hours_per_day and number_of_crews from a
+    request line. Non-numeric values raise ValueError/TypeError; NaN and
+    Infinity are rejected like any other invalid number.
+    """
+    item_code = data.get('item_code')
+    quantity = float(data.get('quantity', 0))
+    hours_per_day = float(data.get('hours_per_day', 8))
+    number_of_crews = int(data.get('number_of_crews', 1))
+
+    if not isinstance(item_code, str) or not item_code or not math.isfinite(quantity) or quantity <= 0:
+        raise CrewCalculationError('Invalid input')
+
+    if not math.isfinite(hours_per_day):
+        raise CrewCalculationError('Invalid input')
+
+    if number_of_crews < 1:
+        raise CrewCalculationError('Number of crews must be at least 1')
+
+    return item_code, quantity, hours_per_day, number_of_crews
+
+
+def calculate_crew_requirements(item, quantity: float, hours_per_day: float, number_of_crews: int) -> Dict:
+    """Crew, duration and man-hour figures for `quantity` of a catalog item."""
+    return _crew_requirements(item, quantity, hours_per_day, number_of_crews)[0]
+
+
+def _crew_requirements(item, quantity: float, hours_per_day: float,
+                       number_of_crews: int) -> Tuple[Dict, Tuple[float, float, float]]:
+    """
+    (result, (total_days, total_man_hours, total_equip_hours)): the
+    response and its unrounded totals, summed by the batch endpoint.
+    """
+    if item is None:
+        raise CrewCalculationError('Item not found', 404)
+
+    # Extract data
+    daily_output = item.daily_output
+    man_hours = item.man_hours
+    equip_hours = item.equip_hours
+
+    if not daily_output or not man_hours:
+        raise CrewCalculationError('Item does not have productivity data')
+
+    # Calculate adjusted daily output based on number of crews
+    adjusted_daily_output = daily_output * number_of_crews
+
+    # Calculate total days (reduced by number of crews)
+    total_days = quantity / adjusted_daily_output
+    total_hours = total_days * hours_per_day
+
+    # Calculate total man hours (remains the same - total work doesn't change)
+    total_man_hours = quantity * man_hours
+    total_equip_hours = quantity * (equip_hours or 0)
+
+    # Crew structure (csi_crew_members rows, parsed once at import)
+    crew_members = []
+    for member in item.crew:
+        if member.count is None:  # Crew 1-13 with a numeric count and a description
+            continue
+        count_per_crew = member.count
+        total_count = count_per_crew * number_of_crews  # Multiply by number of crews
+        crew_members.append({
+            'position': member.position,
+            'count': total_count,  # Total across all crews
+            'count_per_crew': count_per_crew,  # Count for single crew
+            'total_hours': total_hours * count_per_crew,
+            'type': member.kind
+        })
+
+    # Separate labor and equipment
+    labor_crew = [c for c in crew_members if c['type'] == 'labor']
+    equipment_crew = [c for c in crew_members if c['type'] == 'equipment']
+
+    result = {
+        'item': {
+            'code': item.full_code,
+            'description': item.description,
+            'unit': item.unit
+        },
+        'input': {
+            'quantity': quantity,
+            'hours_per_day': hours_per_day,
+            'number_of_crews': number_of_crews
+        },
+        'calculations': {
+            'total_days': round(total_days, 2),
+            'total_hours': round(total_hours, 2),
+            'total_man_hours': round(total_man_hours, 2),
+            'total_equip_hours': round(total_equip_hours, 2),
+            'daily_output': daily_output,  # Per single crew
+            'adjusted_daily_output': adjusted_daily_output,  # Total output with all crews
+            'man_hours_per_unit': man_hours,
+            'equip_hours_per_unit': equip_hours or 0
+        },
+        'crew': {
+            'labor': labor_crew,
+            'equipment': equipment_crew,
+            'total_labor_count': sum(c['count'] for c in labor_crew),
+            'total_equipment_count': len(equipment_crew)
+        },
+        'activities': [
+            {
+                'name': name,
+                'duration_ratio': ratio,
+                'duration_days': round(total_days * ratio, 2)
+            }
+            for name, ratio in ACTIVITY_SPLIT
+        ]
+    }
+    return result, (total_days, total_man_hours, total_equip_hours)
+
+
+def calculate_crew_batch(catalog, lines: List) -> Dict:
+    """
+    Calculate a whole BOQ in one pass.
+
+    Every line is {item_code, quantity, hours_per_day, number_of_crews}.
+    Codes are resolved against the catalog's full_code index once; a bad
+    line is reported in its own result and does not fail the batch.
+    """
+    items = {}
+    for line in lines:
+        if isinstance(line, dict) and isinstance(line.get('item_code'), str):
+            code = line['item_code']
+            if code not in items:
+                items[code] = catalog.by_full_code.get(code)
+
+    results = []
+    total_man_hours = 0.0
+    total_equip_hours = 0.0
+    total_days = 0.0
+    max_days = 0.0
+    crew_hours: Dict[str, Dict] = {}
+
+    for index, line in enumerate(lines):
+        item_code = line.get('item_code') if isinstance(line, dict) else None
+        try:
+            if not isinstance(line, dict):
+                raise CrewCalculationError('Invalid input')
+            try:
+                item_code, quantity, hours_per_day, number_of_crews = parse_crew_input(line)
+            except (TypeError, ValueError):
+                raise CrewCalculationError('Invalid input')
+            result, (line_days, line_man_hours, line_equip_hours) = _crew_requirements(
+                items.get(item_code), quantity, hours_per_day, number_of_crews
+            )
+        except CrewCalculationError as e:
+            results.append({'line': index, 'item_code': item_code, 'ok': False, 'error': e.message, 'status': e.status})
+            continue
+
+        total_days += line_days
+        max_days = max(max_days, line_days)
+        total_man_hours += line_man_hours
+        total_equip_hours += line_equip_hours
+        for member in result['crew']['labor'] + result['crew']['equipment']:
+            entry = crew_hours.setdefault(member['position'], {'type': member['type'], 'total_hours': 0.0})
+            entry['total_hours'] += member['total_hours']
+
+        results.append({'line': index, 'item_code': item_code, 'ok': True, 'result': result})
+
+    succeeded = sum(1 for r in results if r['ok'])
+    return {
+        'results': results,
+        'totals': {
+            'lines': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'total_man_hours': round(total_man_hours, 2),
+            'total_equip_hours': round(total_equip_hours, 2),
+            'total_days_sequential': round(total_days, 2),  # lines done one after another
+            'max_days': round(max_days, 2),  # lines done in parallel
+            'crew_hours_by_position': {
+                position: {'type': entry['type'], 'total_hours': round(entry['total_hours'], 2)}
+                for position, entry in crew_hours.items()
+            }
+        }
+    }
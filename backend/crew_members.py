@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Normalized Crew Members
+=======================
+csi_items stores each item's crew as 13 crew_num_N / crew_desc_N text
+column pairs. update_database_from_excel.py parses them once into the
+csi_crew_members table (one row per filled slot, count already numeric,
+labor/equipment already classified) so the API never re-parses them and
+crew questions can be answered with plain SQL, e.g. carpenters across a BOQ:
+
+    SELECT SUM(count) FROM csi_crew_members
+    WHERE full_code IN (...) AND position LIKE '%Carpenter%'
+
+The parsing rules live here so the importer and the catalog (which falls
+back to the columns for databases built before the table existed) agree.
+"""
+
+from typing import List, Optional, Tuple
+
+CREW_TABLE = 'csi_crew_members'
+
+# Number of crew_num_N / crew_desc_N column pairs in csi_items
+CREW_SLOTS = 13
+
+# Crew descriptions containing one of these words are equipment, not labor
+EQUIPMENT_KEYWORDS = ['crane', 'truck', 'pump', 'vibrator', 'tool', 'dozer', 'loader', 'excavator', 'mixer', 'compressor']
+
+
+def classify_crew_member(description: str) -> str:
+    """Return 'equipment' or 'labor' for a crew member description."""
+    desc_lower = description.lower()
+    return 'equipment' if any(word in desc_lower for word in EQUIPMENT_KEYWORDS) else 'labor'
+
+
+def parse_crew_member(raw_count, position) -> Tuple[Optional[float], Optional[str]]:
+    """
+    (count, kind) for one crew slot. Both are None unless the slot has a
+    count and a description; count is also None when it is not numeric.
+    """
+    if not (raw_count and position):
+        return None, None
+    try:
+        count = float(raw_count)
+    except ValueError:
+        count = None
+    return count, classify_crew_member(position)
+
+
+def crew_member_rows(item_id, full_code, crew_columns) -> List[Tuple]:
+    """
+    csi_crew_members rows for one item.
+    crew_columns: [(crew_num_1, crew_desc_1), ... (crew_num_13, crew_desc_13)]
+    """
+    rows = []
+    for number, (raw_count, position) in enumerate(crew_columns, 1):
+        if raw_count or position:
+            count, kind = parse_crew_member(raw_count, position)
+            rows.append((item_id, full_code, number, position, count, raw_count, kind))
+    return rows
+
+
+def create_crew_members_table(cursor):
+    """(Re)build csi_crew_members from the crew columns of csi_items."""
+    cursor.execute(f'DROP TABLE IF EXISTS {CREW_TABLE}')
+    cursor.execute(f'''
+    CREATE TABLE {CREW_TABLE} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_id INTEGER NOT NULL,
+        full_code TEXT,
+        crew_number INTEGER NOT NULL,
+        position TEXT,
+        count REAL,
+        count_text TEXT,
+        kind TEXT
+    )
+    ''')
+
+    columns = ', '.join(f'crew_num_{i}, crew_desc_{i}' for i in range(1, CREW_SLOTS + 1))
+    items = cursor.execute(f'SELECT id, full_code, {columns} FROM csi_items ORDER BY id').fetchall()
+    rows = []
+    for item in items:
+        crew_columns = [(item[i], item[i + 1]) for i in range(2, 2 + 2 * CREW_SLOTS, 2)]
+        rows.extend(crew_member_rows(item[0], item[1], crew_columns))
+
+    cursor.executemany(f'''
+    INSERT INTO {CREW_TABLE} (item_id, full_code, crew_number, position, count, count_text, kind)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+    cursor.execute(f'CREATE INDEX idx_crew_members_full_code ON {CREW_TABLE}(full_code)')
+    cursor.execute(f'CREATE INDEX idx_crew_members_item ON {CREW_TABLE}(item_id, crew_number)')
+    return len(rows)
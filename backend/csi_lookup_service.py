@@ -5,12 +5,118 @@ Maps user queries (Arabic/English) to CSI construction items using:
 - Fuzzy matching (difflib/fuzzywuzzy)
 - Synonym matching
 - Confidence scoring
+
+search_item() narrows the items down with a word/trigram inverted index
+built at load time and only runs the similarity scoring on those
+candidates; search_item_linear() is the full scan it must agree with.
 """
 
 import json
 import os
+from collections import Counter
 from difflib import SequenceMatcher
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Set, Tuple
+
+# Query words longer than this are matched against the vocabulary by a scan
+# instead of enumerating their substrings
+MAX_SUBSTRING_WORD_LEN = 40
+
+
+def _trigrams(word: str) -> Set[str]:
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class _LanguageIndex:
+    """
+    Inverted index over the item names and synonyms of one language.
+
+    _calculate_similarity() only scores a text with 100/95/92 or the
+    word-ratio when some query word and some text word contain one another,
+    so those texts are found through the word postings. Every other text can
+    only get the SequenceMatcher ratio, which is bounded from above by the
+    length ratio and the shared-character count (as in quick_ratio()).
+    Texts whose bound is below min_confidence cannot change an item's
+    result, so only the remaining texts are scored.
+    """
+
+    def __init__(self, texts: List[Tuple[int, str]]):
+        # text id -> (item index, original text, normalized length)
+        self.texts: List[Tuple[int, str, int]] = []
+        self.char_texts: Dict[str, List[Tuple[int, int]]] = {}   # char -> [(text id, count)]
+        self.word_texts: Dict[str, Set[int]] = {}
+        self.word_trigrams: Dict[str, Set[str]] = {}
+        self.always: Set[int] = set()   # empty texts are a substring of any query
+
+        for item_idx, text in texts:
+            text_id = len(self.texts)
+            t = text.lower().strip()
+            self.texts.append((item_idx, text, len(t)))
+            for char, count in Counter(t).items():
+                self.char_texts.setdefault(char, []).append((text_id, count))
+            if not t:
+                self.always.add(text_id)
+            for word in t.split():
+                self.word_texts.setdefault(word, set()).add(text_id)
+
+        for word in self.word_texts:
+            for gram in _trigrams(word):
+                self.word_trigrams.setdefault(gram, set()).add(word)
+
+        self._related_cache: Dict[str, Set[str]] = {}
+
+    def related_words(self, qw: str) -> Set[str]:
+        """Vocabulary words w with `qw in w or w in qw`."""
+        related = self._related_cache.get(qw)
+        if related is not None:
+            return related
+
+        if len(qw) >= 3:
+            # qw in w: w has every trigram of qw
+            postings = [self.word_trigrams.get(gram, set()) for gram in _trigrams(qw)]
+            postings.sort(key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            related = {w for w in candidates if qw in w}
+        else:
+            related = {w for w in self.word_texts if qw in w}
+
+        # w in qw: w is one of qw's substrings
+        if len(qw) <= MAX_SUBSTRING_WORD_LEN:
+            for i in range(len(qw)):
+                for j in range(i + 1, len(qw) + 1):
+                    if qw[i:j] in self.word_texts:
+                        related.add(qw[i:j])
+        else:
+            related.update(w for w in self.word_texts if w in qw)
+
+        if len(self._related_cache) > 4096:
+            self._related_cache.clear()
+        self._related_cache[qw] = related
+        return related
+
+    def candidates(self, q: str, min_confidence: float) -> Dict[int, List[str]]:
+        """item index -> texts that may score >= min_confidence for normalized query q."""
+        text_ids = set(self.always)
+        for qw in q.split():
+            for word in self.related_words(qw):
+                text_ids |= self.word_texts[word]
+
+        # Remaining texts can only reach the SequenceMatcher ratio, at most
+        # 2 * shared_chars / (len(q) + len(t)) like quick_ratio()
+        shared = [0] * len(self.texts)
+        for char, q_count in Counter(q).items():
+            for text_id, count in self.char_texts.get(char, ()):
+                shared[text_id] += min(q_count, count)
+        lq = len(q)
+        for text_id, (_, _, lt) in enumerate(self.texts):
+            if shared[text_id] and text_id not in text_ids:
+                if 2.0 * shared[text_id] / (lq + lt) * 100 >= min_confidence:
+                    text_ids.add(text_id)
+
+        items: Dict[int, List[str]] = {}
+        for text_id in sorted(text_ids):
+            item_idx, text = self.texts[text_id][:2]
+            items.setdefault(item_idx, []).append(text)
+        return items
 
 
 class CSILookupService:
@@ -31,6 +137,7 @@ class CSILookupService:
         self.db_path = db_path
         self.database = self._load_database()
         self.items_index = self._build_index()
+        self.search_indexes = self._build_search_indexes()
     
     def _load_database(self) -> Dict:
         """Load CSI database from JSON file"""
@@ -55,6 +162,18 @@ class CSILookupService:
                 index.append(item_copy)
         return index
     
+    def _build_search_indexes(self) -> Dict[str, _LanguageIndex]:
+        """Word/trigram indexes over names and synonyms, per language"""
+        texts: Dict[str, List[Tuple[int, str]]] = {}
+        for item_idx, item in enumerate(self.items_index):
+            for key, value in item.items():
+                if key.startswith('item_name_'):
+                    texts.setdefault(key[len('item_name_'):], []).append((item_idx, value))
+                elif key.startswith('synonyms_'):
+                    lang_texts = texts.setdefault(key[len('synonyms_'):], [])
+                    lang_texts.extend((item_idx, synonym) for synonym in value)
+        return {lang: _LanguageIndex(lang_texts) for lang, lang_texts in texts.items()}
+    
     def _calculate_similarity(self, query: str, text: str) -> float:
         """
         Calculate similarity score between query and text
@@ -148,6 +267,33 @@ class CSILookupService:
         Returns:
             List of matched items with confidence scores
         """
+        index = self.search_indexes.get(lang)
+        q = query.lower().strip()
+        if index is None or not q or min_confidence <= 0:
+            return self.search_item_linear(query, lang, min_confidence, top_k)
+        
+        # Score only the candidate texts from the index, in item order so
+        # ties keep the same order as the full scan
+        candidates = index.candidates(q, min_confidence)
+        results = []
+        for item_idx in sorted(candidates):
+            confidence = max(self._calculate_similarity(query, text) for text in candidates[item_idx])
+            if confidence >= min_confidence:
+                result = self.items_index[item_idx].copy()
+                result['match_confidence'] = round(confidence, 2)
+                results.append(result)
+        
+        results.sort(key=lambda x: x['match_confidence'], reverse=True)
+        return results[:top_k]
+    
+    def search_item_linear(
+        self,
+        query: str,
+        lang: str = 'ar',
+        min_confidence: float = 60.0,
+        top_k: int = 5
+    ) -> List[Dict]:
+        """Reference implementation of search_item() scoring every item"""
         results = []
         
         for item in self.items_index:
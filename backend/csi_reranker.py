@@ -7,14 +7,16 @@ Scoring Formula:
 Score = 0.35*CodeMatch + 0.30*SemanticSim + 0.15*TitleMatch + 0.10*FieldMatch + 0.10*UnitMatch
 """
 
-import os
 import re
 import json
-from typing import List, Dict, Any, Optional, Tuple
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple, FrozenSet
 from difflib import SequenceMatcher
 
-# Path to CSI Excel file
-CSI_EXCEL_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "CSI.xlsm")
+from catalog import add_load_listener, get_catalog
+from data_sources import source_available
+from db_config import db_connection
+from fts_search import fts_available, build_any_match_query, search_items
 
 # Synonym mappings for normalization
 SYNONYMS = {
@@ -46,6 +48,9 @@ SYNONYMS = {
     "gypsum plaster": ["محارة جبسية"],
 }
 
+# Candidate lists at least this long go through the NumPy pre-pass
+VECTORIZE_MIN_CANDIDATES = 100
+
 # Unit compatibility mapping
 UNIT_COMPATIBILITY = {
     "SQM": ["M2", "SF", "SQ.M", "م²", "متر مربع"],
@@ -56,6 +61,34 @@ UNIT_COMPATIBILITY = {
 }
 
 
+# Regexes used on every query/candidate, compiled once
+ARABIC_DIACRITICS_RE = re.compile(r'[\u064B-\u065F\u0670]')
+PUNCTUATION_RE = re.compile(r'[^\w\s\u0600-\u06FF]')
+WHITESPACE_RE = re.compile(r'\s+')
+ARABIC_RE = re.compile(r'[\u0600-\u06FF]')
+QUERY_DIVISION_RE = re.compile(r'\b(\d{2})\b')
+CODE_DIVISION_RE = re.compile(r'^(\d{2,3})')
+
+
+def _build_synonym_index() -> Dict[str, FrozenSet[str]]:
+    """
+    Reverse synonym index: word -> every word of every SYNONYMS group
+    (main term + synonyms) that the word appears in.
+    """
+    index: Dict[str, set] = {}
+    for main_term, synonyms in SYNONYMS.items():
+        group_words = set(main_term.split())
+        for syn in synonyms:
+            group_words.update(syn.split())
+        for word in group_words:
+            index.setdefault(word, set()).update(group_words)
+    return {word: frozenset(words) for word, words in index.items()}
+
+
+SYNONYM_INDEX = _build_synonym_index()
+
+
+@lru_cache(maxsize=4096)
 def normalize_text(text: str) -> str:
     """Normalize text: lowercase, remove diacritics, trim punctuation."""
     if not text:
@@ -65,16 +98,58 @@ def normalize_text(text: str) -> str:
     text = text.lower()
     
     # Remove Arabic diacritics
-    arabic_diacritics = re.compile(r'[\u064B-\u065F\u0670]')
-    text = arabic_diacritics.sub('', text)
+    text = ARABIC_DIACRITICS_RE.sub('', text)
     
     # Remove extra punctuation and whitespace
-    text = re.sub(r'[^\w\s\u0600-\u06FF]', ' ', text)
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = PUNCTUATION_RE.sub(' ', text)
+    text = WHITESPACE_RE.sub(' ', text).strip()
     
     return text
 
 
+@lru_cache(maxsize=1024)
+def query_token_sets(query: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """(query tokens, tokens expanded with every synonym group they belong to)."""
+    query_tokens = frozenset(normalize_text(query).split())
+    expanded_query = set(query_tokens)
+    for token in query_tokens:
+        expanded_query.update(SYNONYM_INDEX.get(token, ()))
+    return query_tokens, frozenset(expanded_query)
+
+
+@lru_cache(maxsize=8192)
+def semantic_similarity(query_norm: str, title_norm: str) -> float:
+    """SequenceMatcher ratio of a normalized query and title (shared with the NumPy pre-pass)."""
+    return SequenceMatcher(None, query_norm, title_norm).ratio()
+
+
+# description -> (normalized title, title tokens) for the current catalog
+_title_cache: Dict[str, Tuple[str, FrozenSet[str]]] = {}
+
+
+def _index_catalog_titles(snapshot) -> None:
+    """Catalog load hook: normalize and tokenize every item title once."""
+    global _title_cache
+    cache = {}
+    for item in snapshot.items:
+        if item.description and item.description not in cache:
+            normalized = normalize_text(item.description)
+            cache[item.description] = (normalized, frozenset(normalized.split()))
+    _title_cache = cache
+
+
+def title_features(title: str) -> Tuple[str, FrozenSet[str]]:
+    """Normalized title and its token set (precomputed for catalog titles)."""
+    features = _title_cache.get(title)
+    if features is None:
+        normalized = normalize_text(title)
+        features = (normalized, frozenset(normalized.split()))
+    return features
+
+
+add_load_listener(_index_catalog_titles)
+
+
 def expand_synonyms(query: str) -> List[str]:
     """Expand query with synonyms."""
     query_lower = query.lower()
@@ -110,8 +185,8 @@ def calculate_code_match(query: str, csi_code: str, division: str) -> Tuple[floa
         return 1.0, "exact"
     
     # Check for division match (first 2 digits)
-    query_div = re.search(r'\b(\d{2})\b', query_normalized)
-    code_div = re.search(r'^(\d{2,3})', code_normalized)
+    query_div = QUERY_DIVISION_RE.search(query_normalized)
+    code_div = CODE_DIVISION_RE.search(code_normalized)
     
     if query_div and code_div:
         if query_div.group(1) == code_div.group(1)[:2]:
@@ -128,18 +203,9 @@ def calculate_title_match(query: str, title: str) -> Tuple[float, List[str]]:
     if not title:
         return 0.0, []
     
-    query_tokens = set(normalize_text(query).split())
-    title_tokens = set(normalize_text(title).split())
-    
-    # Expand with synonyms
-    expanded_query = set()
-    for token in query_tokens:
-        expanded_query.add(token)
-        for main_term, synonyms in SYNONYMS.items():
-            if token in main_term.split() or any(token in s.split() for s in synonyms):
-                expanded_query.update(main_term.split())
-                for syn in synonyms:
-                    expanded_query.update(syn.split())
+    # Query tokens expanded through the reverse synonym index (cached per query)
+    query_tokens, expanded_query = query_token_sets(query)
+    title_tokens = title_features(title)[1]
     
     matched = expanded_query.intersection(title_tokens)
     
@@ -236,7 +302,7 @@ def calculate_score(
     if semantic_score == 0:
         # Fallback: basic string similarity
         title = item.get('Title', item.get('description', ''))
-        semantic_score = SequenceMatcher(None, normalize_text(query), normalize_text(title)).ratio()
+        semantic_score = semantic_similarity(normalize_text(query), title_features(title)[0])
     
     # TitleMatch (15%)
     title = item.get('Title', item.get('description', ''))
@@ -281,7 +347,8 @@ def rerank_candidates(
     candidates: List[Dict[str, Any]],
     top_k: int = 7,
     query_unit: Optional[str] = None,
-    filters: Optional[Dict[str, Any]] = None
+    filters: Optional[Dict[str, Any]] = None,
+    vectorized: Optional[bool] = None
 ) -> Dict[str, Any]:
     """
     Rerank candidates based on CSI relevance scoring.
@@ -292,29 +359,20 @@ def rerank_candidates(
         top_k: Number of top results to return
         query_unit: Optional unit filter
         filters: Optional hard filters (e.g., {"man_hours_lt": 5, "division": "03"})
+        vectorized: Use the NumPy pre-pass (csi_reranker_numpy.py) to skip
+                    candidates that cannot make the top_k. None = only for
+                    lists of VECTORIZE_MIN_CANDIDATES or more; False = score
+                    every candidate (reference path). Rankings are identical.
     
     Returns:
         JSON-compatible dict with results, warnings, suggestions
     """
     # Detect language
-    arabic_pattern = re.compile(r'[\u0600-\u06FF]')
-    language = "ar" if arabic_pattern.search(query) else "en"
+    language = "ar" if ARABIC_RE.search(query) else "en"
     
     warnings = []
     suggestions = []
     
-    # Check if data source is accessible
-    if not os.path.exists(CSI_EXCEL_PATH):
-        return {
-            "query": query,
-            "language": language,
-            "top_k": 0,
-            "results": [],
-            "warnings": [f"Data source CSI.xlsm not accessible at {CSI_EXCEL_PATH}. Ensure file exists."],
-            "suggestions": [],
-            "data_source_missing": True
-        }
-    
     # Apply hard filters
     filtered_candidates = candidates
     if filters:
@@ -348,6 +406,13 @@ def rerank_candidates(
         if len(filtered_candidates) < original_count:
             warnings.append(f"Filtered from {original_count} to {len(filtered_candidates)} candidates")
     
+    # Wide candidate lists: drop the ones that cannot reach the top_k
+    if vectorized or (vectorized is None and len(filtered_candidates) >= VECTORIZE_MIN_CANDIDATES):
+        from csi_reranker_numpy import preselect_top_candidates
+        preselected = preselect_top_candidates(query, filtered_candidates, top_k, query_unit)
+        if preselected is not None:
+            filtered_candidates = preselected
+    
     # Score each candidate
     scored_candidates = []
     for item in filtered_candidates:
@@ -411,6 +476,60 @@ def rerank_candidates(
     }
 
 
+# csi_items columns under the names rerank_candidates() expects
+CANDIDATE_COLUMNS = (
+    ("id", "id"),
+    ("full_code", "CSI_Code"),
+    ("main_div_name", "Division"),
+    ("description", "Title"),
+    ("unit", "Unit"),
+    ("daily_output", "DailyOutput"),
+    ("man_hours", "ManHours_file"),
+    ("equip_hours", "EquipHours_file"),
+    ("crew_structure", "Crew_Structure"),
+)
+
+
+def candidate_terms(query: str) -> List[str]:
+    """Synonym expansions of the query plus its individual words."""
+    terms = sorted(expand_synonyms(query))
+    for token in normalize_text(query).split():
+        if len(token) > 1 and token not in terms:
+            terms.append(token)
+    return terms
+
+
+def retrieve_candidates(conn, query: str, top_n: int = 50) -> List[Dict[str, Any]]:
+    """
+    Candidate generation for the reranker: the top_n items that best match
+    any of the query terms. Uses the bm25-ranked FTS5 index when the
+    database has one, otherwise a parameterized LIKE query ordered by the
+    number of matching terms.
+    """
+    terms = candidate_terms(query)
+    if not terms:
+        return []
+    
+    if fts_available(conn):
+        match_query = build_any_match_query(terms, prefix=True)
+        if not match_query:
+            return []
+        columns = ", ".join(f"ci.{column} AS {alias}" for column, alias in CANDIDATE_COLUMNS)
+        rows = search_items(conn, match_query, limit=top_n, columns=columns)
+        return [{alias: row[alias] for _, alias in CANDIDATE_COLUMNS} for row in rows]
+    
+    columns = ", ".join(f"{column} AS {alias}" for column, alias in CANDIDATE_COLUMNS)
+    hits = " + ".join("(description LIKE ?)" for _ in terms)
+    sql = (
+        f"SELECT {columns} FROM csi_items "
+        f"WHERE {' OR '.join('description LIKE ?' for _ in terms)} "
+        f"ORDER BY {hits} DESC, id LIMIT ?"
+    )
+    patterns = [f"%{term}%" for term in terms]
+    rows = conn.execute(sql, patterns + patterns + [int(top_n)]).fetchall()
+    return [dict(row) for row in rows]
+
+
 def search_and_rerank(query: str, top_n: int = 50, return_top_k: int = 7) -> Dict[str, Any]:
     """
     Complete search and rerank pipeline.
@@ -418,11 +537,13 @@ def search_and_rerank(query: str, top_n: int = 50, return_top_k: int = 7) -> Dic
     2. Rerank using CSI scoring formula
     3. Return JSON results
     """
-    import sqlite3
-    
-    db_path = os.path.join(os.path.dirname(__file__), "csi_data.db")
-    
-    if not os.path.exists(db_path):
+    # Catalog status is validated at startup / reload (data_sources.py);
+    # get_catalog() picks up a database that appeared or changed since
+    try:
+        get_catalog()
+    except Exception as e:
+        print(f"[WARNING] CSI catalog not loaded: {e}")
+    if not source_available('catalog'):
         return {
             "query": query,
             "language": "en",
@@ -433,42 +554,12 @@ def search_and_rerank(query: str, top_n: int = 50, return_top_k: int = 7) -> Dic
             "data_source_missing": True
         }
     
-    # Expand query with synonyms
-    search_terms = expand_synonyms(query)
-    
-    # Build search conditions
-    conditions = []
-    for term in search_terms[:5]:  # Limit to avoid too complex query
-        conditions.append(f"description LIKE '%{term}%'")
-    
-    where_clause = " OR ".join(conditions) if conditions else "1=1"
-    
-    # Search database
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    
-    sql = f"""
-        SELECT 
-            rowid as id,
-            full_code as CSI_Code,
-            main_div_name as Division,
-            description as Title,
-            unit as Unit,
-            daily_output as DailyOutput,
-            man_hours as ManHours_file,
-            equip_hours as EquipHours_file,
-            crew_structure as Crew_Structure
-        FROM csi_items 
-        WHERE {where_clause}
-        LIMIT {top_n}
-    """
-    
     try:
-        candidates = [dict(row) for row in conn.execute(sql).fetchall()]
+        with db_connection() as conn:
+            candidates = retrieve_candidates(conn, query, top_n)
     except Exception as e:
+        print(f"[WARNING] Candidate retrieval failed: {e}")
         candidates = []
-    finally:
-        conn.close()
     
     # Rerank
     return rerank_candidates(query, candidates, top_k=return_top_k)
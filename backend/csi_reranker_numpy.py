@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized (NumPy) pre-pass for csi_reranker.rerank_candidates
+==============================================================
+For wide candidate lists (top_n in the hundreds, whole-division scans)
+scoring every candidate with calculate_score() is dominated by per-item
+Python work. This module keeps per-catalog-item feature arrays (code
+division, unit class, crew keyword bits, title token postings, title
+length) and computes for all candidates at once:
+
+    partial = 0.35*CodeMatch + 0.15*TitleMatch + 0.10*FieldMatch + 0.10*UnitMatch
+
+SemanticSim (SequenceMatcher) is not vectorizable, but it lies between 0
+and quick_ratio() = 2*shared_chars / (len(q) + len(t)), which is computed
+for all candidates from per-title character count vectors. With
+argpartition we take the top_k-th best lower bound (partial) as a
+threshold and drop every candidate whose upper bound (partial + 0.30 *
+bound) cannot reach it. The survivors get their exact SemanticSim in
+descending upper-bound order until the top_k-th exact score is out of
+reach of everything left (threshold algorithm). Only the candidates seen
+so far are scored with calculate_score(), so the final ranking is exactly
+the dict path's.
+
+preselect_top_candidates() returns None whenever the shortcut does not
+apply (NumPy missing, candidates that are not unchanged catalog rows,
+precomputed embedding similarities) and the caller scores everything.
+"""
+
+import heapq
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from catalog import add_load_listener
+from csi_reranker import (
+    CODE_DIVISION_RE, QUERY_DIVISION_RE, UNIT_COMPATIBILITY,
+    calculate_unit_match, normalize_text, query_token_sets, semantic_similarity,
+    title_features,
+)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+# Same keyword list as calculate_field_match()
+CREW_KEYWORDS = ['carpenter', 'laborer', 'foreman', 'rodman', 'نجار', 'حداد', 'عامل']
+
+# Margin for the 4-decimal rounding of Score
+SCORE_EPSILON = 2e-4
+
+
+class CatalogFeatures:
+    """Feature arrays for every catalog item (one row per item, catalog order)."""
+
+    def __init__(self, snapshot):
+        items = snapshot.items
+        self.version = snapshot.version
+        self.position = {item.id: pos for pos, item in enumerate(items)}
+        self.codes = [item.full_code for item in items]
+        self.titles = [item.description for item in items]
+        self.units = [item.unit for item in items]
+        self.crews = [item.crew_structure for item in items]
+
+        self.code_norm = [normalize_text(code) if code else '' for code in self.codes]
+        self.code_present = np.array([bool(code) for code in self.codes])
+
+        # Code division (first 2 digits) as an id into division_ids
+        self.division_ids: Dict[str, int] = {}
+        code_division = []
+        for code in self.code_norm:
+            match = CODE_DIVISION_RE.search(code)
+            if match:
+                code_division.append(self.division_ids.setdefault(match.group(1)[:2], len(self.division_ids)))
+            else:
+                code_division.append(-1)
+        self.code_division = np.array(code_division, dtype=np.int32)
+
+        # Unit class: index into unit_values (distinct unit strings, None included)
+        self.unit_values: List[Optional[str]] = []
+        unit_ids: Dict[Optional[str], int] = {}
+        self.unit_class = np.array(
+            [unit_ids.setdefault(unit, len(unit_ids)) for unit in self.units], dtype=np.int32
+        )
+        self.unit_values = list(unit_ids)
+
+        # Crew keyword bitset per item
+        crew_bits = []
+        for crew in self.crews:
+            bits = 0
+            if crew:
+                crew_lower = crew.lower()
+                for bit, keyword in enumerate(CREW_KEYWORDS):
+                    if keyword in crew_lower:
+                        bits |= 1 << bit
+            crew_bits.append(bits)
+        self.crew_bits = np.array(crew_bits, dtype=np.int32)
+        self.has_crew = np.array([bool(crew) for crew in self.crews])
+        self.has_unit = np.array([bool(unit) for unit in self.units])
+
+        # Title token -> item positions, normalized title lengths and
+        # character counts (for the quick_ratio bound of SemanticSim)
+        postings: Dict[str, List[int]] = {}
+        self.title_norm: List[str] = []
+        title_chars = []
+        self.char_index: Dict[str, int] = {}
+        for pos, title in enumerate(self.titles):
+            normalized, tokens = title_features(title)
+            self.title_norm.append(normalized)
+            title_chars.append(Counter(normalized))
+            for char in normalized:
+                self.char_index.setdefault(char, len(self.char_index))
+            for token in tokens:
+                postings.setdefault(token, []).append(pos)
+        self.token_postings = {token: np.array(p, dtype=np.int32) for token, p in postings.items()}
+        self.title_len = np.array([len(title) for title in self.title_norm], dtype=np.float64)
+        self.char_counts = np.zeros((len(self.titles), max(len(self.char_index), 1)), dtype=np.int32)
+        for pos, chars in enumerate(title_chars):
+            for char, count in chars.items():
+                self.char_counts[pos, self.char_index[char]] = count
+        self.title_present = np.array([bool(title) for title in self.titles])
+
+    def positions_for(self, candidates: List[Dict[str, Any]]):
+        """Catalog positions of the candidates, or None if any is not an unchanged catalog row."""
+        positions = []
+        for candidate in candidates:
+            if 'embedding_similarity' in candidate:
+                return None
+            pos = self.position.get(candidate.get('id'))
+            if pos is None:
+                return None
+            if (candidate.get('CSI_Code', candidate.get('full_code', '')) != self.codes[pos]
+                    or candidate.get('Title', candidate.get('description', '')) != self.titles[pos]
+                    or candidate.get('Unit') != self.units[pos]
+                    or candidate.get('Crew_Structure') != self.crews[pos]):
+                return None
+            positions.append(pos)
+        return np.array(positions, dtype=np.int64)
+
+    def score_bounds(self, query: str, positions, query_unit: Optional[str]):
+        """(lower, upper) bounds of the weighted score for the given positions."""
+        query_norm = normalize_text(query)
+        query_lower = query.lower()
+
+        # CodeMatch: exact substring either way, else same 2-digit division
+        exact = np.array(
+            [self.code_norm[pos] in query_norm or query_norm in self.code_norm[pos] for pos in positions.tolist()],
+            dtype=bool
+        )
+        query_div = QUERY_DIVISION_RE.search(query_norm)
+        division_id = self.division_ids.get(query_div.group(1), -2) if query_div else -2
+        same_division = self.code_division[positions] == division_id
+        code = np.where(exact, 1.0, np.where(same_division, 0.7, 0.0))
+        code = np.where(self.code_present[positions], code, 0.0)
+
+        # TitleMatch: |expanded query tokens & title tokens| / |query tokens|
+        query_tokens, expanded = query_token_sets(query)
+        if query_tokens:
+            counts = np.zeros(len(self.titles), dtype=np.float64)
+            for token in expanded:
+                postings = self.token_postings.get(token)
+                if postings is not None:
+                    counts[postings] += 1
+            title = np.minimum(counts[positions] / len(query_tokens), 1.0)
+            title = np.where(self.title_present[positions], title, 0.0)
+        else:
+            title = np.zeros(len(positions))
+
+        # FieldMatch: unit mentioned in the query, crew keyword in query and crew
+        unit_hit_by_class = np.array([
+            bool(unit) and (
+                unit.upper().lower() in query_lower
+                or any(u.lower() in query_lower for u in UNIT_COMPATIBILITY.get(unit.upper(), []))
+            )
+            for unit in self.unit_values
+        ], dtype=bool)
+        query_bits = 0
+        for bit, keyword in enumerate(CREW_KEYWORDS):
+            if keyword in query_lower:
+                query_bits |= 1 << bit
+        has_unit = self.has_unit[positions]
+        has_crew = self.has_crew[positions]
+        unit_hit = has_unit & unit_hit_by_class[self.unit_class[positions]]
+        crew_hit = has_crew & ((self.crew_bits[positions] & query_bits) != 0)
+        checks = has_unit.astype(np.float64) + has_crew
+        matches = unit_hit.astype(np.float64) + crew_hit
+        field = np.where(checks == 0, 0.5, matches / np.maximum(checks, 1))
+
+        # UnitMatch per unit class
+        unit_score_by_class = np.array(
+            [calculate_unit_match(query_unit, unit or '') for unit in self.unit_values], dtype=np.float64
+        )
+        unit = unit_score_by_class[self.unit_class[positions]]
+
+        partial = 0.35 * code + 0.15 * title + 0.10 * field + 0.10 * unit
+
+        # SemanticSim <= quick_ratio (SequenceMatcher gives 1.0 for two empty strings)
+        query_chars = np.zeros(self.char_counts.shape[1], dtype=np.int32)
+        for char, count in Counter(query_norm).items():
+            index = self.char_index.get(char)
+            if index is not None:
+                query_chars[index] = count
+        shared = np.minimum(self.char_counts[positions], query_chars).sum(axis=1)
+        total = len(query_norm) + self.title_len[positions]
+        semantic_bound = np.where(total == 0, 1.0, 2.0 * shared / np.maximum(total, 1.0))
+        return partial, partial + 0.30 * semantic_bound
+
+
+_features: Optional[CatalogFeatures] = None
+_features_lock = threading.Lock()
+
+
+def _on_catalog_loaded(snapshot) -> None:
+    global _features
+    if NUMPY_AVAILABLE:
+        features = CatalogFeatures(snapshot)
+        with _features_lock:
+            _features = features
+
+
+def preselect_top_candidates(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    top_k: int,
+    query_unit: Optional[str] = None
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Candidates (in their original order) that can still make the top_k,
+    or None when the vectorized pre-pass cannot be used.
+    """
+    features = _features
+    if features is None or top_k <= 0 or len(candidates) <= top_k:
+        return None
+    positions = features.positions_for(candidates)
+    if positions is None:
+        return None
+
+    lower, upper = features.score_bounds(query, positions, query_unit)
+    # top_k-th best guaranteed score; anything that cannot reach it is out
+    threshold = lower[np.argpartition(-lower, top_k - 1)[top_k - 1]]
+    survivors = np.flatnonzero(upper >= threshold - SCORE_EPSILON)
+    if len(survivors) <= top_k:
+        return [candidates[i] for i in survivors.tolist()]
+
+    # Threshold pass: exact SemanticSim in descending upper-bound order until
+    # the top_k-th exact score is out of reach of every remaining candidate
+    query_norm = normalize_text(query)
+    order = survivors[np.argsort(-upper[survivors], kind='stable')]
+    best: List[float] = []  # min-heap of the top_k exact scores
+    keep = []
+    for index in order.tolist():
+        if len(best) == top_k and upper[index] < best[0] - SCORE_EPSILON:
+            break
+        title_norm = features.title_norm[positions[index]]
+        exact = lower[index] + 0.30 * semantic_similarity(query_norm, title_norm)
+        if len(best) < top_k:
+            heapq.heappush(best, exact)
+        elif exact > best[0]:
+            heapq.heapreplace(best, exact)
+        keep.append(index)
+    keep.sort()
+    return [candidates[i] for i in keep]
+
+add_load_listener(_on_catalog_loaded)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Data Source Registry
+====================
+The services read the CSI catalog from the SQLite database (loaded into
+the in-memory catalog snapshot). The CSI.xlsm workbook is only the input
+of update_database_from_excel.py and is optional at runtime.
+
+Every source is validated once at startup and again whenever the catalog
+is reloaded; request handlers ask source_available() (a dict lookup)
+instead of touching the filesystem on every call. /health reports
+data_source_status().
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from catalog import add_load_listener, get_catalog
+from db_config import DB_PATH
+
+# Excel workbook the database is built from (not needed to serve requests)
+CSI_EXCEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "CSI.xlsm")
+
+
+class DataSource:
+    """A named source, its validation check and the last validation result."""
+
+    def __init__(self, name: str, path: str, required: bool, check: Callable[[], Tuple[bool, str]]):
+        self.name = name
+        self.path = path
+        self.required = required
+        self.check = check
+        self.available = False
+        self.detail = 'not validated'
+        self.checked_at: Optional[float] = None
+
+    def validate(self) -> bool:
+        try:
+            result = self.check()
+        except Exception as e:
+            result = (False, str(e))
+        return self.check_result(result)
+
+    def check_result(self, result: Tuple[bool, str]) -> bool:
+        self.available, self.detail = result
+        self.checked_at = time.time()
+        return self.available
+
+    def status(self) -> Dict:
+        return {
+            'path': self.path,
+            'required': self.required,
+            'available': self.available,
+            'detail': self.detail,
+            'checked_at': self.checked_at
+        }
+
+
+_sources: Dict[str, DataSource] = {}
+_validate_lock = threading.Lock()
+
+
+def register_source(name: str, path: str, check: Callable[[], Tuple[bool, str]], required: bool = False) -> None:
+    """Register a data source; check() returns (available, detail)."""
+    _sources[name] = DataSource(name, path, required, check)
+
+
+def validate_sources() -> Dict[str, Dict]:
+    """Run every check (startup and catalog reload) and return the statuses."""
+    with _validate_lock:
+        for source in _sources.values():
+            source.validate()
+            level = 'INFO' if source.available or not source.required else 'WARNING'
+            print(f"[{level}] Data source '{source.name}': {source.detail}")
+    return data_source_status()
+
+
+def source_available(name: str) -> bool:
+    """Last validation result of a source (no I/O once validated)."""
+    source = _sources.get(name)
+    if source is None:
+        return False
+    if source.checked_at is None:
+        # Used outside app.py (scripts, tests) before validate_sources()
+        with _validate_lock:
+            if source.checked_at is None:
+                source.validate()
+    return source.available
+
+
+def data_source_status() -> Dict[str, Dict]:
+    return {name: source.status() for name, source in _sources.items()}
+
+
+def _catalog_status(snapshot) -> Tuple[bool, str]:
+    if not snapshot.items:
+        return False, f"no CSI items in {DB_PATH}"
+    return True, f"{len(snapshot.items)} items (version {snapshot.version})"
+
+
+def _check_catalog() -> Tuple[bool, str]:
+    if not os.path.exists(DB_PATH):
+        return False, f"database not found at {DB_PATH}"
+    return _catalog_status(get_catalog())
+
+
+def _check_workbook() -> Tuple[bool, str]:
+    if os.path.exists(CSI_EXCEL_PATH):
+        return True, f"found at {CSI_EXCEL_PATH}"
+    return False, f"not found at {CSI_EXCEL_PATH} (only needed to rebuild the database)"
+
+
+register_source('catalog', DB_PATH, _check_catalog, required=True)
+register_source('csi_workbook', CSI_EXCEL_PATH, _check_workbook)
+
+
+def _on_catalog_loaded(snapshot) -> None:
+    # Called inside get_catalog() while it holds the load lock, so the
+    # catalog status comes from the snapshot handed in, not get_catalog()
+    for source in _sources.values():
+        if source.name == 'catalog':
+            source.check_result(_catalog_status(snapshot))
+        else:
+            source.validate()
+
+
+add_load_listener(_on_catalog_loaded)
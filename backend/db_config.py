@@ -1,21 +1,217 @@
 """
 Database configuration module for CSI Calculator
 Uses local SQLite database for simplicity and reliability
+
+The CSI catalog is read-only at runtime, so instead of opening a new
+connection for every request each worker process keeps a small pool of
+read-only connections (URI mode=ro + query_only) and hands them out to
+request threads. Connections are checked out exclusively, so a
+connection is never used by two threads at the same time.
+
+Usage:
+    with db_connection() as conn:
+        rows = conn.execute("SELECT ...").fetchall()
+
+get_db_connection() is kept for older call sites; calling close() on the
+returned connection puts it back into the pool.
 """
 import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+# Local SQLite path (CSI_DB_PATH overrides it, e.g. for a mounted volume)
+DB_PATH = os.environ.get('CSI_DB_PATH') or os.path.join(os.path.dirname(__file__), 'csi_data.db')
+
+# Pool tuning
+POOL_MAX_IDLE = int(os.environ.get('DB_POOL_MAX_IDLE', '8'))
+DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', str(256 * 1024 * 1024)))  # bytes
+DB_CACHE_SIZE_KIB = int(os.environ.get('DB_CACHE_SIZE_KIB', str(16 * 1024)))
+
+# observer(sql, seconds) is called after each execute() on a pooled
+# connection (metrics.py); None keeps execute() untimed
+_query_observer = None
+
+
+def set_query_observer(observer):
+    global _query_observer
+    _query_observer = observer
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() returns it to the owning pool."""
+
+    def execute(self, sql, parameters=()):
+        observer = _query_observer
+        if observer is None:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observer(sql, time.perf_counter() - start)
+
+    def close(self):
+        pool = getattr(self, '_pool', None)
+        if pool is None:
+            super().close()
+        else:
+            pool.release(self)
+
+    def _close_for_real(self):
+        sqlite3.Connection.close(self)
+
+
+class ConnectionPool:
+    """
+    Per-process pool of read-only SQLite connections.
+
+    The pool is fork-aware: when gunicorn forks workers after the app was
+    imported, the first checkout in the child drops the connections that
+    were inherited from the parent and starts a fresh pool.
+    """
+
+    def __init__(self, db_path, max_idle=POOL_MAX_IDLE):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = []
+        self._pid = os.getpid()
+        self._generation = 0
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'released': 0,
+            'discarded': 0,
+            'in_use': 0,
+            'peak_in_use': 0,
+        }
+
+    def _connect(self):
+        uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            check_same_thread=False,  # handed between request threads, never shared
+            factory=PooledConnection,
+        )
+        conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KIB}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _check_fork(self):
+        # Called with the lock held
+        pid = os.getpid()
+        if pid != self._pid:
+            # Connections inherited from the parent must not be used here
+            self._idle = []
+            self._pid = pid
+            self._generation += 1
+            self._reset_stats()
+
+    def acquire(self):
+        """Check out a connection (opening a new one if none is idle)."""
+        with self._lock:
+            self._check_fork()
+            conn = self._idle.pop() if self._idle else None
+            if conn is not None:
+                self._stats['reused'] += 1
+            else:
+                self._stats['created'] += 1
+            self._stats['in_use'] += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._stats['in_use'])
+            generation = self._generation
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._stats['in_use'] -= 1
+                raise
+        conn.row_factory = sqlite3.Row
+        conn._pool = self
+        conn._generation = generation
+        conn._checked_out = True
+        return conn
+
+    def release(self, conn):
+        """Return a connection to the pool (idempotent)."""
+        if not getattr(conn, '_checked_out', False):
+            return
+        conn._checked_out = False
+        keep = False
+        with self._lock:
+            if conn._generation == self._generation:
+                self._stats['in_use'] -= 1
+                self._stats['released'] += 1
+                keep = len(self._idle) < self.max_idle
+                if keep:
+                    conn.row_factory = sqlite3.Row
+                    self._idle.append(conn)
+                else:
+                    self._stats['discarded'] += 1
+        if not keep:
+            conn._pool = None
+            conn._close_for_real()
+
+    def reset(self):
+        """Close idle connections, e.g. after the database file was replaced."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._generation += 1
+            self._stats['in_use'] = 0
+        for conn in idle:
+            conn._pool = None
+            conn._close_for_real()
+
+    def stats(self):
+        with self._lock:
+            self._check_fork()
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+            stats['max_idle'] = self.max_idle
+            stats['pid'] = self._pid
+        return stats
+
+
+_pool = ConnectionPool(DB_PATH)
 
-# Local SQLite path
-DB_PATH = os.path.join(os.path.dirname(__file__), 'csi_data.db')
 
 def get_db_connection():
     """
-    Get SQLite database connection.
-    Simple and reliable - no cloud dependencies.
+    Get a pooled SQLite database connection.
+    Call close() when done - it returns the connection to the pool.
     """
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return _pool.acquire()
+
+
+@contextmanager
+def db_connection():
+    """Context manager that checks a pooled connection out and back in."""
+    conn = _pool.acquire()
+    try:
+        yield conn
+    finally:
+        _pool.release(conn)
+
+
+def get_pool_stats():
+    """Connection pool statistics for the current worker process."""
+    return _pool.stats()
+
+
+def reset_pool():
+    """Drop pooled connections so the next checkout reopens the database."""
+    _pool.reset()
+
 
 # Print configuration on module load
 print(f"[INFO] Using SQLite database: {DB_PATH}")
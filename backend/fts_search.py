@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Full-text search over csi_items using the SQLite FTS5 index.
+
+The index (csi_items_fts) is an external-content FTS5 table over
+csi_items(full_code, description) built by update_database_from_excel.py.
+It uses the unicode61 tokenizer with diacritic removal and 2/3-character
+prefix indexes so the as-you-type queries from quick-search.js are answered
+from the index instead of a `description LIKE '%term%'` table scan.
+
+Databases built before the index existed simply report fts_available() ==
+False and callers fall back to their LIKE queries.
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+FTS_TABLE = "csi_items_fts"
+
+# Column weights for bm25(): description matters more than the code tokens
+BM25_WEIGHTS = (0.5, 1.0)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_available(conn) -> bool:
+    """Check whether the FTS5 index exists in this database."""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (FTS_TABLE,)
+    ).fetchone()
+    return row is not None
+
+
+def build_match_query(text: str, prefix_last: bool = True) -> Optional[str]:
+    """
+    Turn free user text into a safe FTS5 MATCH expression.
+
+    Every word becomes a quoted phrase (so quotes/operators in user input
+    cannot break the query) and all words must match. The last word gets a
+    prefix wildcard because it is usually still being typed.
+
+        "concrete col"  ->  "concrete" "col"*
+    """
+    tokens = _TOKEN_RE.findall((text or "").lower())
+    if not tokens:
+        return None
+    parts = [f'"{token}"' for token in tokens]
+    if prefix_last:
+        parts[-1] += "*"
+    return " ".join(parts)
+
+
+def build_any_match_query(terms: List[str], prefix: bool = False) -> Optional[str]:
+    """
+    MATCH expression that accepts any of several phrases (OR-ed).
+    With prefix=True the last word of each phrase also matches longer
+    words ("plaster" -> "plastering"), closer to a LIKE '%term%' search.
+    """
+    phrases = []
+    for term in terms:
+        tokens = _TOKEN_RE.findall((term or "").lower())
+        if tokens:
+            phrase = '"' + " ".join(tokens) + '"' + ("*" if prefix else "")
+            if phrase not in phrases:
+                phrases.append(phrase)
+    if not phrases:
+        return None
+    return " OR ".join(phrases)
+
+
+def search_items(
+    conn,
+    match_query: str,
+    limit: int = 50,
+    filters: Optional[Dict[str, Any]] = None,
+    columns: str = "ci.*",
+    with_snippet: bool = False
+):
+    """
+    Run a bm25-ranked FTS query and return sqlite3.Row results.
+
+    Args:
+        conn: Database connection
+        match_query: Expression from build_match_query()/build_any_match_query()
+        limit: Maximum number of rows
+        filters: Optional equality filters on csi_items columns
+                 (main_div_code, sub_div1_code, sub_div2_code)
+        columns: Column list to select from csi_items (aliased as ci)
+        with_snippet: Include a highlighted description snippet
+
+    Rows carry a `rank` column (bm25, lower is better) and optionally
+    `snippet`.
+    """
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    select = f"{columns}, bm25({FTS_TABLE}, {weights}) AS rank"
+    if with_snippet:
+        select += f", snippet({FTS_TABLE}, 1, '<b>', '</b>', '…', 12) AS snippet"
+
+    sql = (
+        f"SELECT {select} FROM {FTS_TABLE} "
+        f"JOIN csi_items ci ON ci.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH ?"
+    )
+    params: List[Any] = [match_query]
+
+    for column in ("main_div_code", "sub_div1_code", "sub_div2_code"):
+        if filters and filters.get(column):
+            sql += f" AND ci.{column} = ?"
+            params.append(filters[column])
+
+    sql += " ORDER BY rank LIMIT ?"
+    params.append(int(limit))
+
+    return conn.execute(sql, params).fetchall()
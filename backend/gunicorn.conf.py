@@ -0,0 +1,35 @@
+"""
+Gunicorn settings (Procfile: gunicorn -c gunicorn.conf.py app:app)
+
+The LLM routes spend their time waiting on Groq / Ollama, so workers
+serve requests on threads (gthread, the default) or greenlets
+(GUNICORN_WORKER_CLASS=gevent, needs `pip install gevent`). A slow
+completion then holds one thread, not a whole worker process.
+
+llm_limits.py caps in-flight AI calls per provider below the thread
+count, so the catalog routes always find a free thread no matter how
+slow the models are.
+"""
+import os
+
+from llm_limits import LLM_LIMITS
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', '16'))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '200'))  # gevent
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+if worker_class == 'gevent':
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        print("[WARNING] gevent not installed, using gthread workers")
+        worker_class = 'gthread'
+
+if worker_class == 'gthread' and sum(LLM_LIMITS.values()) >= threads:
+    print(f"[WARNING] LLM slots ({sum(LLM_LIMITS.values())}) >= threads ({threads}): "
+          f"slow AI calls can starve catalog requests")
@@ -5,9 +5,12 @@ Uses Gemini AI to truly understand user queries and provide intelligent response
 """
 
 import json
-import sqlite3
-import os
-from typing import Dict, Any, List, Optional
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from catalog import add_load_listener, get_catalog, sql_int
+from data_sources import source_available
+from db_config import db_connection
 
 # Import CSI Lookup Service
 try:
@@ -17,9 +20,6 @@ except ImportError:
     CSI_LOOKUP_AVAILABLE = False
     print("[WARNING] CSI Lookup Service not available")
 
-# Database path
-DB_PATH = os.path.join(os.path.dirname(__file__), "csi_data.db")
-
 # System prompt for CSI AI Assistant
 CSI_AI_SYSTEM_PROMPT = """أنت مساعد ذكي متخصص في أعمال البناء والتشييد (Construction AI).
 دورك هو فهم استفسارات المهندسين والمقاولين وحساب الإنتاجيات بدقة من قاعدة بيانات CSI MasterFormat.
@@ -166,47 +166,106 @@ If you need additional information, respond with JSON:
 """
 
 
-def get_csi_context(limit: int = 20) -> str:
-    """Get sample CSI items for context."""
-    if not os.path.exists(DB_PATH):
-        return "Database not available."
-    
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    
-    # Get diverse samples from different divisions
-    samples = []
-    
-    # Concrete items
-    rows = conn.execute(
-        "SELECT full_code, description, unit, daily_output FROM csi_items "
-        "WHERE full_code LIKE '03%' LIMIT 5"
-    ).fetchall()
-    samples.extend([dict(r) for r in rows])
-    
-    # Plastering items
-    rows = conn.execute(
-        "SELECT full_code, description, unit, daily_output FROM csi_items "
-        "WHERE full_code LIKE '092%' LIMIT 5"
-    ).fetchall()
-    samples.extend([dict(r) for r in rows])
-    
-    # Other finishing items
-    rows = conn.execute(
-        "SELECT full_code, description, unit, daily_output FROM csi_items "
-        "WHERE full_code LIKE '09%' AND full_code NOT LIKE '092%' LIMIT 5"
-    ).fetchall()
-    samples.extend([dict(r) for r in rows])
-    
-    conn.close()
-    
+# Default prompt samples: (code prefix, excluded prefix), 5 items each
+CONTEXT_SAMPLE_GROUPS = (
+    ('03', None),    # Concrete
+    ('092', None),   # Plastering
+    ('09', '092'),   # Other finishing
+)
+CONTEXT_SAMPLES_PER_GROUP = 5
+
+# (catalog version, division, limit) -> context text
+_context_cache: Dict[Tuple, str] = {}
+_context_lock = threading.Lock()
+
+
+def _format_context(samples) -> str:
     context = "## Available CSI Items (samples):\n"
     for item in samples:
-        context += f"- {item['full_code']}: {item['description']} ({item['unit']}, {item['daily_output']}/day)\n"
+        context += f"- {item.full_code}: {item.description} ({item.unit}, {item.daily_output}/day)\n"
+    return context
+
+
+def _default_samples(catalog, limit: int) -> List:
+    """Concrete, plastering and other finishing items (catalog order)."""
+    samples = []
+    for prefix, excluded in CONTEXT_SAMPLE_GROUPS:
+        group = []
+        for item in catalog.items:
+            code = item.full_code or ''
+            if code.startswith(prefix) and not (excluded and code.startswith(excluded)):
+                group.append(item)
+                if len(group) == CONTEXT_SAMPLES_PER_GROUP:
+                    break
+        samples.extend(group)
+    return samples[:limit]
+
+
+def _division_samples(catalog, division: str, limit: int) -> List:
+    """
+    Up to `limit` items of one main division ('03' or '3'), spread round-robin over its
+    subdivisions so the prompt shows every kind of work, preferring items
+    that have productivity data.
+    """
+    division_number = sql_int(division)
+    by_subdivision: Dict[str, List] = {}
+    for item in catalog.items:
+        if division_number is not None and sql_int(item.main_div_code) == division_number:
+            by_subdivision.setdefault(item.sub_div1_code, []).append(item)
+    groups = [
+        [item for item in items if item.daily_output] or items
+        for items in by_subdivision.values()
+    ]
+    samples = []
+    depth = 0
+    while len(samples) < limit and any(depth < len(group) for group in groups):
+        for group in groups:
+            if depth < len(group) and len(samples) < limit:
+                samples.append(group[depth])
+        depth += 1
+    return samples
+
+
+def build_csi_context(catalog, division: Optional[str] = None, limit: int = 20) -> str:
+    """Sample-items text for the system prompt from a catalog snapshot."""
+    if division:
+        samples = _division_samples(catalog, str(division).strip(), limit)
+    else:
+        samples = _default_samples(catalog, limit)
+    return _format_context(samples)
+
+
+def get_csi_context(limit: int = 20, division: Optional[str] = None) -> str:
+    """
+    Get sample CSI items for context.
+    Built once per catalog version (and division/limit), so the prompt text
+    costs nothing per request and is identical for identical requests.
+    """
+    if not source_available('catalog'):
+        return "Database not available."
     
+    catalog = get_catalog()
+    key = (catalog.version, division or None, limit)
+    context = _context_cache.get(key)
+    if context is None:
+        context = build_csi_context(catalog, division, limit)
+        with _context_lock:
+            if len(_context_cache) > 256:
+                _context_cache.clear()
+            _context_cache[key] = context
     return context
 
 
+def _on_catalog_loaded(snapshot) -> None:
+    # New catalog version: drop old texts and prebuild the default prompt context
+    with _context_lock:
+        _context_cache.clear()
+        _context_cache[(snapshot.version, None, 20)] = build_csi_context(snapshot)
+
+
+add_load_listener(_on_catalog_loaded)
+
+
 def preprocess_query_with_csi(query: str, lang: str = 'ar') -> Dict[str, Any]:
     """
     Preprocess user query using CSI Lookup Service.
@@ -243,12 +302,9 @@ def preprocess_query_with_csi(query: str, lang: str = 'ar') -> Dict[str, Any]:
 def search_database(search_terms: List[str], element_type: str = None, 
                    work_stage: str = None, limit: int = 10) -> List[Dict]:
     """Search CSI database with intelligent matching."""
-    if not os.path.exists(DB_PATH):
+    if not source_available('catalog'):
         return []
     
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    
     # Build conditions
     conditions = []
     
@@ -284,12 +340,11 @@ def search_database(search_terms: List[str], element_type: str = None,
     """
     
     try:
-        rows = conn.execute(sql).fetchall()
+        with db_connection() as conn:
+            rows = conn.execute(sql).fetchall()
         results = [dict(r) for r in rows]
     except Exception as e:
         results = []
-    finally:
-        conn.close()
     
     return results
 
@@ -232,32 +232,34 @@ KEYWORD_MAPPING = {
     }
 }
 
+# Plastering queries get the structured plaster-stage options in smart_ai
+PLASTERING_KEYWORDS = {
+    "ar": ["محارة", "لياسة", "بياض", "طرطشة", "ضهارة"],
+    "en": ["plaster", "plastering", "render", "stucco"]
+}
+
 def find_matching_keywords(query):
     """Find matching work items from user query"""
-    query_lower = query.lower()
+    # Keyword hits come from one Aho-Corasick pass (keyword_matcher.py)
+    from keyword_matcher import first_keywords
+    found = first_keywords(query.lower(), "keyword")
     matches = []
     
     for key, data in KEYWORD_MAPPING.items():
-        # Check Arabic keywords
-        for ar_kw in data.get("ar", []):
-            if ar_kw in query_lower:
+        # First matching Arabic keyword, then first English one (list order)
+        for language in ("ar", "en"):
+            hit = found.get((key, language))
+            if hit:
                 matches.append({
                     "key": key,
-                    "matched_keyword": ar_kw,
-                    "language": "ar",
+                    "matched_keyword": hit.keyword,
+                    "language": language,
                     **data
                 })
-                break
-        
-        # Check English keywords
-        for en_kw in data.get("en", []):
-            if en_kw in query_lower:
-                matches.append({
-                    "key": key,
-                    "matched_keyword": en_kw,
-                    "language": "en",
-                    **data
-                })
-                break
     
     return matches
+
+def is_plastering_query(query):
+    """True if the query mentions plastering work (Arabic or English)"""
+    from keyword_matcher import scan_keywords
+    return any(hit.group == "plastering" for hit in scan_keywords(query.lower()))
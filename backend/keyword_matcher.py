@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-Keyword Matcher (Aho-Corasick)
+====================================
+All Arabic and English keywords of KEYWORD_MAPPING, PLASTERING_KEYWORDS,
+CONCRETE_ELEMENTS (and their subtypes) and WORK_STAGES are compiled into a
+single Aho-Corasick automaton at import time. scan_keywords() finds every
+occurrence of every keyword in one pass over the lower-cased query, and
+the detection helpers in keyword_mapping.py / concrete_mapping.py pick
+their answer from those hits instead of running `kw in query_lower` loops.
+
+Hits are cached per query, so the four detections smart_ai runs on the
+same message cost a single scan.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from concrete_mapping import CONCRETE_ELEMENTS, WORK_STAGES
+from keyword_mapping import KEYWORD_MAPPING, PLASTERING_KEYWORDS
+
+# group:    'keyword' | 'plastering' | 'element' | 'subtype' | 'stage'
+# key:      mapping key (for 'subtype': (element_key, subtype_key))
+# language: 'ar' | 'en'
+# order:    position of the keyword in its list (list order decides ties)
+# start/end: match position in the lower-cased query
+KeywordHit = namedtuple('KeywordHit', 'group key language keyword order start end')
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton over string patterns, each with a payload."""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, object]]] = [[]]
+        self._delta: List[Dict[str, int]] = []  # goto with failure links folded in
+        self._empty: List[object] = []  # '' occurs in every text
+
+    def add(self, pattern: str, payload) -> None:
+        if not pattern:
+            self._empty.append(payload)
+            return
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append((pattern, payload))
+
+    def build(self) -> None:
+        """
+        Compute failure links (breadth first), merge outputs and fold the
+        failure links into a deterministic transition table so matching is
+        a single dict lookup per character.
+        """
+        queue = list(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+        self._delta = [{} for _ in self._goto]
+        self._delta[0] = dict(self._goto[0])
+        for state in queue:
+            delta = dict(self._delta[self._fail[state]])
+            delta.update(self._goto[state])
+            self._delta[state] = delta
+
+    def finditer(self, text: str):
+        """Yield (start, end, pattern, payload) for every occurrence in text."""
+        for payload in self._empty:
+            yield 0, 0, '', payload
+        state = 0
+        delta, out = self._delta, self._out
+        for index, char in enumerate(text):
+            state = delta[state].get(char, 0)
+            if out[state]:
+                for pattern, payload in out[state]:
+                    yield index + 1 - len(pattern), index + 1, pattern, payload
+
+
+def _build_automaton() -> AhoCorasick:
+    automaton = AhoCorasick()
+
+    def add_all(group, key, language, keywords):
+        for order, keyword in enumerate(keywords):
+            automaton.add(keyword, (group, key, language, order))
+
+    for key, data in KEYWORD_MAPPING.items():
+        add_all('keyword', key, 'ar', data.get('ar', []))
+        add_all('keyword', key, 'en', data.get('en', []))
+    add_all('plastering', None, 'ar', PLASTERING_KEYWORDS['ar'])
+    add_all('plastering', None, 'en', PLASTERING_KEYWORDS['en'])
+    for element_key, element in CONCRETE_ELEMENTS.items():
+        add_all('element', element_key, 'ar', element['ar'])
+        add_all('element', element_key, 'en', element['en'])
+        for subtype_key, subtype in element.get('subtypes', {}).items():
+            add_all('subtype', (element_key, subtype_key), 'ar', subtype.get('keywords_ar', []))
+            add_all('subtype', (element_key, subtype_key), 'en', subtype.get('keywords_en', []))
+    for stage_key, stage in WORK_STAGES.items():
+        add_all('stage', stage_key, 'ar', stage.get('keywords_ar', []))
+        add_all('stage', stage_key, 'en', stage.get('keywords_en', []))
+
+    automaton.build()
+    return automaton
+
+
+_AUTOMATON = _build_automaton()
+
+
+@lru_cache(maxsize=1024)
+def scan_keywords(query_lower: str) -> Tuple[KeywordHit, ...]:
+    """Every keyword occurrence in an already lower-cased query, in text order."""
+    return tuple(
+        KeywordHit(group, key, language, keyword, order, start, end)
+        for start, end, keyword, (group, key, language, order) in _AUTOMATON.finditer(query_lower)
+    )
+
+
+def first_keywords(query_lower: str, group: str) -> Dict[Tuple, KeywordHit]:
+    """
+    (key, language) -> hit of the earliest keyword *in list order* that
+    occurs in the query, i.e. what a `for kw in list: if kw in query: break`
+    loop would have found.
+    """
+    found: Dict[Tuple, KeywordHit] = {}
+    for hit in scan_keywords(query_lower):
+        if hit.group == group:
+            current = found.get((hit.key, hit.language))
+            if current is None or hit.order < current.order:
+                found[(hit.key, hit.language)] = hit
+    return found
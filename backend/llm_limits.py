@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Per-Provider LLM Concurrency Limits
+===================================
+Each LLM provider (Groq, Ollama, Gemini) gets a bounded number of
+in-flight calls per worker process. A request that cannot get a slot
+(within LLM_SLOT_TIMEOUT seconds) is answered 503 (Retry-After) instead of
+parking a worker thread behind slow completions, so the catalog routes
+always find a free thread (see gunicorn.conf.py for the thread budget).
+
+Works with threads and with gevent (monkey-patched threading).
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator
+
+# In-flight calls per provider and worker process
+LLM_LIMITS = {
+    'groq': int(os.environ.get('LLM_MAX_INFLIGHT_GROQ', '4')),
+    'ollama': int(os.environ.get('LLM_MAX_INFLIGHT_OLLAMA', '2')),
+    'gemini': int(os.environ.get('LLM_MAX_INFLIGHT_GEMINI', '2')),
+}
+
+# How long a request may wait for a slot before it is turned away. Waiting
+# holds a worker thread, so the default fails fast; with gevent workers a
+# short wait is cheap and smooths bursts.
+LLM_SLOT_TIMEOUT = float(os.environ.get('LLM_SLOT_TIMEOUT', '0'))
+
+# Retry-After (seconds) sent with 503 busy replies
+LLM_RETRY_AFTER = int(os.environ.get('LLM_RETRY_AFTER', '2'))
+
+
+class ProviderBusy(Exception):
+    """Every slot of the provider is taken."""
+
+    def __init__(self, provider: str):
+        super().__init__(f"{provider} is busy, try again shortly")
+        self.provider = provider
+
+
+class ProviderLimiter:
+    """Bounded semaphore with in-flight / rejected counters."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self._semaphore = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self._stats = {'in_flight': 0, 'completed': 0, 'rejected': 0}
+
+    def acquire(self, timeout: float = LLM_SLOT_TIMEOUT) -> None:
+        if not self._semaphore.acquire(timeout=timeout):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise ProviderBusy(self.name)
+        with self._lock:
+            self._stats['in_flight'] += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._stats['in_flight'] -= 1
+            self._stats['completed'] += 1
+        self._semaphore.release()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['limit'] = self.limit
+        return stats
+
+
+_limiters: Dict[str, ProviderLimiter] = {name: ProviderLimiter(name, limit) for name, limit in LLM_LIMITS.items()}
+
+
+def set_llm_limit(provider: str, limit: int) -> None:
+    """Replace a provider's limiter (tests and load tests)."""
+    _limiters[provider] = ProviderLimiter(provider, limit)
+
+
+@contextmanager
+def llm_slot(provider: str, timeout: float = LLM_SLOT_TIMEOUT):
+    """Hold one in-flight slot of `provider`; raises ProviderBusy when full."""
+    limiter = _limiters[provider]
+    limiter.acquire(timeout)
+    try:
+        yield
+    finally:
+        limiter.release()
+
+
+def limited_tokens(provider: str, tokens: Callable[[], Iterator[str]]) -> Iterator[str]:
+    """
+    Token iterator that holds a slot while the model streams. The slot is
+    taken on the first read (inside the response), so a stream that is
+    never started cannot leak it; ProviderBusy then ends the stream with
+    an error event.
+    """
+    with llm_slot(provider):
+        yield from tokens()
+
+
+def llm_limit_stats() -> Dict[str, Dict]:
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Server-Sent Events for the AI endpoints
+=======================================
+With `stream=true` (JSON body or query string) /api/intelligent-ai,
+/api/chat and the LLM branch of /api/ai relay the model's tokens as they
+arrive instead of holding a worker until the whole completion is done.
+
+Event protocol (each `data:` line is JSON):
+
+    event: token    data: {"text": "..."}      zero or more, in order
+    event: result   data: {...}                terminal: the same payload
+                                               the non-streaming call returns
+    event: error    data: {"text": "...", "status": "error"}   terminal
+
+Exactly one terminal event (result or error) ends every stream.
+"""
+
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import requests
+from flask import Response, stream_with_context
+
+
+def wants_stream(request) -> bool:
+    """True when the client opted in with stream=true (body or query string)."""
+    value = request.args.get('stream')
+    if value is None:
+        data = request.get_json(silent=True) or {}
+        value = data.get('stream') if isinstance(data, dict) else None
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events: Iterable[str]) -> Response:
+    """text/event-stream response that is not buffered by proxies."""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def relay_tokens(tokens: Iterator[str], finish: Callable[[str], Dict],
+                 on_error: Callable[[Exception], Dict]) -> Iterator[str]:
+    """
+    Yield a token event per chunk, then finish(full_text) as the terminal
+    result event. An exception from the model or from finish() becomes the
+    terminal error event on_error(exception).
+    """
+    parts: List[str] = []
+    try:
+        for token in tokens:
+            if token:
+                parts.append(token)
+                yield sse_event('token', {'text': token})
+        payload = finish(''.join(parts))
+    except Exception as e:
+        yield sse_event('error', on_error(e))
+        return
+    yield sse_event('result', payload)
+
+
+def groq_tokens(client, **kwargs) -> Iterator[str]:
+    """Text deltas of a streamed Groq chat completion."""
+    for chunk in client.chat.completions.create(stream=True, **kwargs):
+        if chunk.choices:
+            delta = chunk.choices[0].delta
+            content = getattr(delta, 'content', None)
+            if content:
+                yield content
+
+
+def ollama_tokens(url: str, model: str, messages: List[Dict], timeout: Optional[float] = None,
+                  session=None) -> Iterator[str]:
+    """Message chunks of a streamed Ollama /api/chat call (one JSON object per line)."""
+    http = session or requests
+    payload = {"model": model, "messages": messages, "stream": True}
+    with http.post(url, json=payload, stream=True, timeout=timeout) as res:
+        if res.status_code != 200:
+            raise RuntimeError(f"Error from Ollama (Model: {model}): {res.text}")
+        for line in res.iter_lines(chunk_size=None):  # lines as they arrive
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get('error'):
+                raise RuntimeError(f"Error from Ollama (Model: {model}): {chunk['error']}")
+            content = (chunk.get('message') or {}).get('content')
+            if content:
+                yield content
+            if chunk.get('done'):
+                break
+
+
+def gemini_tokens(model, prompt: str) -> Iterator[str]:
+    """Text of a streamed Gemini generate_content call."""
+    for chunk in model.generate_content(prompt, stream=True):
+        text = getattr(chunk, 'text', None)
+        if text:
+            yield text
@@ -0,0 +1,150 @@
+"""
+Load test: catalog latency while the AI routes are saturated
+Serves the app from a fixed pool of THREADS worker threads (like one
+gunicorn gthread worker) and points Ollama at a local fake server whose
+completions take LLM_DELAY seconds. AI_CLIENTS clients hammer /api/chat
+while CATALOG_CLIENTS clients call the catalog routes, once with the LLM
+slots effectively unlimited and once with the llm_limits.py defaults.
+
+Usage: python loadtest_llm_isolation.py [seconds] [llm_delay_s]
+"""
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+import app as app_module
+from ollama_client import OllamaClient
+import llm_limits
+
+DURATION = float(sys.argv[1]) if len(sys.argv) > 1 else 8
+LLM_DELAY = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+THREADS = 16
+AI_CLIENTS = 32
+CATALOG_CLIENTS = 4
+CATALOG_PATHS = ['/api/divisions', '/api/subdivisions1?main_code=3', '/api/items?main_div_code=3&limit=20']
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._send_json({"models": [{"name": "llama3.2:latest"}]})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(LLM_DELAY)
+        self._send_json({"message": {"role": "assistant", "content": "Which element is it for?"}, "done": True})
+
+    def _send_json(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log(self, *args):
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server with a fixed number of request threads (queueing beyond it)."""
+
+    def __init__(self, host, port, app, threads):
+        super().__init__(host, port, app, handler=QuietHandler)
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def run_phase(base, with_ai):
+    stop = time.monotonic() + DURATION
+    catalog_latencies = []
+    ai_status = {}
+    lock = threading.Lock()
+
+    def catalog_client(index):
+        n = index
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            requests.get(base + CATALOG_PATHS[n % len(CATALOG_PATHS)], timeout=60)
+            with lock:
+                catalog_latencies.append(time.perf_counter() - start)
+            n += 1
+            time.sleep(0.02)
+
+    def ai_client(_):
+        while time.monotonic() < stop:
+            res = requests.post(base + '/api/chat', json={"message": "concrete", "history": []}, timeout=60)
+            with lock:
+                ai_status[res.status_code] = ai_status.get(res.status_code, 0) + 1
+            if res.status_code == 503:
+                time.sleep(0.2)
+
+    clients = [threading.Thread(target=catalog_client, args=(i,)) for i in range(CATALOG_CLIENTS)]
+    if with_ai:
+        clients += [threading.Thread(target=ai_client, args=(i,)) for i in range(AI_CLIENTS)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    return catalog_latencies, ai_status
+
+
+def main():
+    fake = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllamaHandler)
+    threading.Thread(target=fake.serve_forever, daemon=True).start()
+    fake_base = f"http://127.0.0.1:{fake.server_address[1]}"
+    app_module.OLLAMA_CLIENT = OllamaClient(fake_base, app_module.DEFAULT_MODEL)
+
+    server = PooledWSGIServer('127.0.0.1', 0, app_module.app, THREADS)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    requests.get(base + '/api/divisions', timeout=30)  # warm up
+
+    phases = [
+        ("catalog only", False, llm_limits.LLM_LIMITS['ollama']),
+        ("AI load, unlimited", True, 1000),
+        ("AI load, limited", True, llm_limits.LLM_LIMITS['ollama']),
+    ]
+    print(f"{THREADS} threads, {AI_CLIENTS} AI clients ({LLM_DELAY:.1f} s completions), "
+          f"{CATALOG_CLIENTS} catalog clients, {DURATION:.0f} s per phase\n")
+    print(f"{'phase':22s}{'ollama slots':>13s}{'catalog req':>12s}{'p50 ms':>9s}{'p99 ms':>9s}  AI status codes")
+    for name, with_ai, limit in phases:
+        llm_limits.set_llm_limit('ollama', limit)
+        latencies, ai_status = run_phase(base, with_ai)
+        codes = ', '.join(f"{code}: {count}" for code, count in sorted(ai_status.items())) or '-'
+        print(f"{name:22s}{limit:13d}{len(latencies):12d}"
+              f"{percentile(latencies, 50) * 1000:9.1f}{percentile(latencies, 99) * 1000:9.1f}  {codes}")
+
+    server.shutdown()
+    fake.shutdown()
+
+
+if __name__ == "__main__":
+    main()
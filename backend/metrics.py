@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Request Metrics
+===============
+In-process metrics served at /metrics in the Prometheus text format
+(no client library needed):
+
+- csi_http_request_duration_seconds   latency histogram per route template
+- csi_http_requests_total             requests per route, method and status
+- csi_db_queries_per_request          SQL statements per request
+- csi_db_query_duration_seconds       time per SQL statement (pooled connections)
+- csi_llm_call_duration_seconds       provider call latency (circuit_breaker.provider_call)
+- csi_llm_tokens_total                prompt / completion tokens per provider
+- gauges and counters added with add_collector() (caches, pools, limits)
+
+Requests slower than SLOW_REQUEST_SECONDS are logged with the SQL they ran.
+
+Metrics are kept per worker process: with several gunicorn workers each
+scrape reports the worker that answered it.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import Response, g, has_request_context, request
+
+import db_config
+
+# Log requests slower than this (seconds); 0 disables the slow-request log
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', '1.0'))
+# At most this many statements are printed per slow request
+SLOW_REQUEST_MAX_QUERIES = int(os.environ.get('SLOW_REQUEST_MAX_QUERIES', '20'))
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# (name, type, help, [(labels, value), ...]) as returned by collectors
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+_lock = threading.Lock()
+_metrics: List['_Metric'] = []
+_collectors: List[Callable[[], Iterable[Family]]] = []
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], object] = {}
+        with _lock:
+            _metrics.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_series(dict(zip(self.labelnames, key)), value) for key, value in items)
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _render_series(self, labels, value) -> str:
+        return f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = REQUEST_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def _render_series(self, labels, series) -> str:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, series[0]):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(dict(labels, le=_format_value(bound)))} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(series[1])}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {series[2]}")
+        return '\n'.join(lines)
+
+
+REQUEST_DURATION = Histogram(
+    'csi_http_request_duration_seconds', 'Time to build the response (streams: until the first byte)',
+    ('route', 'method'))
+REQUESTS = Counter('csi_http_requests_total', 'HTTP requests', ('route', 'method', 'status'))
+DB_QUERIES_PER_REQUEST = Histogram(
+    'csi_db_queries_per_request', 'SQL statements executed per request', ('route',), QUERY_COUNT_BUCKETS)
+DB_QUERY_DURATION = Histogram(
+    'csi_db_query_duration_seconds', 'SQL statement execution time', ('route',), QUERY_BUCKETS)
+LLM_CALL_DURATION = Histogram(
+    'csi_llm_call_duration_seconds', 'LLM provider call latency (streams: whole stream)',
+    ('provider', 'outcome'), LLM_BUCKETS)
+LLM_TOKENS = Counter(
+    'csi_llm_tokens_total', 'LLM tokens by provider (streamed completions count chunks)', ('provider', 'type'))
+
+
+def add_collector(collector: Callable[[], Iterable[Family]]) -> None:
+    """Register a function that reports extra families at scrape time."""
+    _collectors.append(collector)
+
+
+def observe_llm_call(provider: str, seconds: float, outcome: str) -> None:
+    LLM_CALL_DURATION.observe(seconds, provider=provider, outcome=outcome)
+
+
+def record_llm_tokens(provider: str, prompt: Optional[int] = None, completion: Optional[int] = None) -> None:
+    """Token counts of one call; None (usage not reported) is skipped."""
+    if prompt:
+        LLM_TOKENS.inc(prompt, provider=provider, type='prompt')
+    if completion:
+        LLM_TOKENS.inc(completion, provider=provider, type='completion')
+
+
+def _route() -> str:
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def _observe_query(sql: str, seconds: float) -> None:
+    if has_request_context():
+        queries = g.get('metrics_queries')
+        if queries is not None:
+            queries.append((sql, seconds))
+        route = _route()
+    else:
+        route = 'none'
+    DB_QUERY_DURATION.observe(seconds, route=route)
+
+
+def _log_slow_request(route: str, seconds: float, queries: List[Tuple[str, float]]) -> None:
+    db_seconds = sum(duration for _, duration in queries)
+    print(f"[WARNING] Slow request: {request.method} {request.full_path.rstrip('?')} ({route}) "
+          f"{seconds * 1000:.0f} ms, {len(queries)} queries in {db_seconds * 1000:.0f} ms")
+    for sql, duration in queries[:SLOW_REQUEST_MAX_QUERIES]:
+        print(f"    {duration * 1000:8.2f} ms  {' '.join(sql.split())[:300]}")
+    if len(queries) > SLOW_REQUEST_MAX_QUERIES:
+        print(f"    ... {len(queries) - SLOW_REQUEST_MAX_QUERIES} more")
+
+
+def _before_request() -> None:
+    g.metrics_start = time.perf_counter()
+    g.metrics_queries = []
+
+
+def _after_request(response):
+    start = g.get('metrics_start')
+    if start is None:
+        return response
+    seconds = time.perf_counter() - start
+    route = _route()
+    queries = g.metrics_queries
+    REQUEST_DURATION.observe(seconds, route=route, method=request.method)
+    REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    DB_QUERIES_PER_REQUEST.observe(len(queries), route=route)
+    if SLOW_REQUEST_SECONDS and seconds >= SLOW_REQUEST_SECONDS:
+        _log_slow_request(route, seconds, queries)
+    return response
+
+
+def render_metrics() -> str:
+    lines = []
+    with _lock:
+        metrics = list(_metrics)
+    for metric in metrics:
+        lines.extend(metric.render())
+    for collector in list(_collectors):
+        try:
+            families = list(collector())
+        except Exception as e:
+            print(f"[WARNING] Metrics collector failed: {e}")
+            continue
+        for name, kind, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_response() -> Response:
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_metrics(app) -> None:
+    """Time every request of `app` and count the SQL run on pooled connections."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    db_config.set_query_observer(_observe_query)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Ollama HTTP Client
+==================
+One keep-alive requests.Session per worker process (connection pool,
+connect/read timeouts, retries on connection errors and 502/503/504)
+instead of a new TCP connection for every chat message.
+
+Model discovery (GET /api/tags) is cached:
+- a discovered model is kept for OLLAMA_MODEL_TTL seconds; after that the
+  cached name is still returned while one background thread refreshes it
+- a failed discovery is remembered for OLLAMA_MODEL_NEGATIVE_TTL seconds
+  (the default model is used meanwhile), so an unreachable server is not
+  asked again on every message
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get('OLLAMA_CONNECT_TIMEOUT', '3'))
+OLLAMA_READ_TIMEOUT = float(os.environ.get('OLLAMA_READ_TIMEOUT', '120'))
+OLLAMA_RETRIES = int(os.environ.get('OLLAMA_RETRIES', '2'))
+OLLAMA_POOL_SIZE = int(os.environ.get('OLLAMA_POOL_SIZE', '8'))
+OLLAMA_MODEL_TTL = float(os.environ.get('OLLAMA_MODEL_TTL', '300'))
+OLLAMA_MODEL_NEGATIVE_TTL = float(os.environ.get('OLLAMA_MODEL_NEGATIVE_TTL', '30'))
+
+
+def pick_model(model_names: Iterable[str], default_model: str) -> Optional[str]:
+    """
+    Preferred installed model: the default (exact, then partial match like
+    'llama3.2:latest'), then any llama3 / mistral, then anything that is
+    not an embedding model. None when nothing usable is installed.
+    """
+    model_names = list(model_names)
+    if default_model in model_names:
+        return default_model
+    for name in model_names:
+        if default_model in name:
+            return name
+    for name in model_names:
+        if 'llama3' in name or 'mistral' in name:
+            return name
+    for name in model_names:
+        if 'embed' not in name:
+            return name
+    return None
+
+
+class OllamaClient:
+    """Pooled client for one Ollama server plus the cached model choice."""
+
+    def __init__(self, host: str, default_model: str):
+        self.host = host.rstrip('/')
+        self.default_model = default_model
+        self.timeout = (OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT)
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+        self._model: Optional[str] = None
+        self._model_expires = 0.0
+        self._model_ok = False
+        self._refreshing = False
+        self._stats = {'discoveries': 0, 'discovery_failures': 0, 'background_refreshes': 0}
+
+    @property
+    def chat_url(self) -> str:
+        return f"{self.host}/api/chat"
+
+    @property
+    def tags_url(self) -> str:
+        return f"{self.host}/api/tags"
+
+    @property
+    def session(self) -> requests.Session:
+        # One session per process: a session inherited through fork is not reused
+        if self._session is None or self._session_pid != os.getpid():
+            retry = Retry(
+                total=OLLAMA_RETRIES, connect=OLLAMA_RETRIES, read=0, status=OLLAMA_RETRIES,
+                status_forcelist=(502, 503, 504), allowed_methods=frozenset({'GET', 'POST'}),
+                backoff_factor=0.2, raise_on_status=False,
+            )
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=OLLAMA_POOL_SIZE, max_retries=retry)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session, self._session_pid = session, os.getpid()
+        return self._session
+
+    # --- model discovery ---
+
+    def discover_model(self) -> Optional[str]:
+        """Ask the server which models are installed (no caching)."""
+        res = self.session.get(self.tags_url, timeout=(OLLAMA_CONNECT_TIMEOUT, 10))
+        if res.status_code != 200:
+            raise RuntimeError(f"GET {self.tags_url} returned {res.status_code}")
+        names = [m['name'] for m in res.json().get('models', [])]
+        return pick_model(names, self.default_model)
+
+    def _refresh(self) -> str:
+        try:
+            model = self.discover_model()
+            ok = model is not None
+        except Exception as e:
+            print(f"Error checking models: {e}")
+            model, ok = None, False
+        with self._lock:
+            self._stats['discoveries'] += 1
+            if ok:
+                self._model, self._model_ok = model, True
+                self._model_expires = time.monotonic() + OLLAMA_MODEL_TTL
+            else:
+                self._stats['discovery_failures'] += 1
+                # Keep a previously discovered model; otherwise use the default for a while
+                if not self._model_ok:
+                    self._model = None
+                self._model_expires = time.monotonic() + OLLAMA_MODEL_NEGATIVE_TTL
+            self._refreshing = False
+            return self._model or self.default_model
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            self._stats['background_refreshes'] += 1
+        threading.Thread(target=self._refresh, name='ollama-model-refresh', daemon=True).start()
+
+    def get_model(self) -> str:
+        """Model to use for chat calls (see module docstring for the caching rules)."""
+        now = time.monotonic()
+        with self._lock:
+            expired = now >= self._model_expires
+            if not expired:
+                return self._model or self.default_model
+            if self._model_ok and not self._refreshing:
+                # Stale but known: answer now, refresh off the request path
+                self._refreshing = True
+                background = True
+            elif self._model_ok or self._refreshing:
+                return self._model or self.default_model
+            else:
+                self._refreshing = True
+                background = False
+        if background:
+            self._refresh_in_background()
+            return self._model or self.default_model
+        return self._refresh()
+
+    def invalidate_model(self) -> None:
+        with self._lock:
+            self._model, self._model_ok, self._model_expires = None, False, 0.0
+
+    # --- chat ---
+
+    def chat(self, messages: List[Dict], model: Optional[str] = None) -> requests.Response:
+        """Non-streaming POST /api/chat (the caller reads .json())."""
+        payload = {"model": model or self.get_model(), "messages": messages, "stream": False}
+        return self.session.post(self.chat_url, json=payload, timeout=self.timeout)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'host': self.host,
+                'model': self._model or self.default_model,
+                'model_discovered': self._model_ok,
+                'model_expires_in': round(max(0.0, self._model_expires - time.monotonic()), 1),
+            })
+        return stats
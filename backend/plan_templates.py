@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""
+Planning Templates
+==================
+The element plans of /api/ai (isolated / raft / strip foundations, piles,
+columns, beams, slabs) are declarative rows in five tables instead of one
+hand-written function per element:
+
+    plan_templates   one row per scope: detection keywords, quantity unit,
+                     summary text and notes per language (str.format
+                     templates over the quantities and {total_days})
+    plan_quantities  derived quantities: name = base quantity * ratio
+    plan_steps       table rows in order: task, displayed quantity, unit,
+                     crew / equipment, and the duration rule: fixed_days, or
+                     ceil(duration_quantity / (plan_rates[rate_name] * rate_factor))
+                     (rate_factor alone when rate_name is NULL)
+    plan_rates       crew productivity rates shared by the templates
+    plan_crews       default crew / equipment text per language and activity
+
+A new element type is a new set of rows; planning.py compiles them.
+update_database_from_excel.py creates the tables and seeds the defaults
+below once; later imports keep edited rows. Databases without the tables
+plan from the same defaults.
+
+Usage (add the tables to an existing database):
+    python plan_templates.py [path/to/csi_data.db]
+"""
+
+import os
+import sqlite3
+import sys
+
+PLAN_TABLE_COLUMNS = {
+    'plan_templates': (
+        'scope', 'match_order', 'keywords', 'quantity_unit', 'integer_quantity',
+        'text_ar', 'text_en', 'notes_ar', 'notes_en',
+    ),
+    'plan_quantities': ('scope', 'name', 'ratio'),
+    'plan_steps': (
+        'scope', 'seq', 'task_ar', 'task_en', 'quantity', 'qty_format', 'unit_ar', 'unit_en',
+        'activity', 'crew_ar', 'crew_en', 'equipment_ar', 'equipment_en', 'crew_prefix',
+        'duration_quantity', 'rate_name', 'rate_factor', 'fixed_days',
+    ),
+    'plan_rates': ('name', 'value'),
+    'plan_crews': ('lang', 'activity', 'crew', 'equipment'),
+}
+
+PLAN_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS plan_templates (
+    scope TEXT PRIMARY KEY,
+    match_order INTEGER NOT NULL,     -- keyword detection order (specific scopes first)
+    keywords TEXT NOT NULL,           -- comma-separated, matched as substrings
+    quantity_unit TEXT NOT NULL,      -- 'm3', 'piles', ...
+    integer_quantity INTEGER NOT NULL DEFAULT 0,
+    text_ar TEXT NOT NULL,
+    text_en TEXT NOT NULL,
+    notes_ar TEXT,
+    notes_en TEXT
+);
+CREATE TABLE IF NOT EXISTS plan_quantities (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    scope TEXT NOT NULL,
+    name TEXT NOT NULL,
+    ratio REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS plan_steps (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    scope TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    task_ar TEXT NOT NULL,
+    task_en TEXT NOT NULL,
+    quantity TEXT NOT NULL DEFAULT 'qty',   -- 'qty' or a plan_quantities name
+    qty_format TEXT NOT NULL DEFAULT '.1f', -- format() spec of the displayed quantity
+    unit_ar TEXT NOT NULL,
+    unit_en TEXT NOT NULL,
+    activity TEXT,                          -- plan_crews activity for crew / equipment
+    crew_ar TEXT,                           -- overrides of the activity defaults
+    crew_en TEXT,
+    equipment_ar TEXT,
+    equipment_en TEXT,
+    crew_prefix TEXT,                       -- e.g. '2x ' for doubled crews
+    duration_quantity TEXT,                 -- defaults to quantity
+    rate_name TEXT,
+    rate_factor REAL,
+    fixed_days INTEGER
+);
+CREATE TABLE IF NOT EXISTS plan_rates (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS plan_crews (
+    lang TEXT NOT NULL,
+    activity TEXT NOT NULL,
+    crew TEXT NOT NULL,
+    equipment TEXT NOT NULL,
+    PRIMARY KEY (lang, activity)
+);
+CREATE INDEX IF NOT EXISTS idx_plan_quantities_scope ON plan_quantities(scope);
+CREATE INDEX IF NOT EXISTS idx_plan_steps_scope ON plan_steps(scope, seq);
+'''
+
+CARPENTRY = 'carpentry_m2_per_day_per_carpenter'
+REBAR = 'rebar_ton_per_day_per_steel_fixer'
+PUMP = 'concrete_m3_per_hour_pump'
+
+DEFAULT_RATES = [
+    {'name': CARPENTRY, 'value': 15},
+    {'name': REBAR, 'value': 0.8},
+    {'name': PUMP, 'value': 20},
+]
+
+DEFAULT_CREWS = [
+    {'lang': 'ar', 'activity': 'excavation', 'crew': 'حفار + 2 عمّال', 'equipment': 'حفّار + قلابات'},
+    {'lang': 'ar', 'activity': 'formwork', 'crew': '4 نجّارين + 2 عمّال', 'equipment': 'معدات يدويّة'},
+    {'lang': 'ar', 'activity': 'rebar', 'crew': '3 حدادين + 2 عمّال', 'equipment': 'معدات حدادة'},
+    {'lang': 'ar', 'activity': 'pour', 'crew': 'فريق صب 6 عمّال', 'equipment': 'خلاطة + مضخة'},
+    {'lang': 'ar', 'activity': 'curing', 'crew': '2 عمّال', 'equipment': 'رشّ مياه'},
+    {'lang': 'en', 'activity': 'excavation', 'crew': 'Excavator + 2 laborers', 'equipment': 'Excavator + trucks'},
+    {'lang': 'en', 'activity': 'formwork', 'crew': '4 carpenters + 2 laborers', 'equipment': 'Hand tools'},
+    {'lang': 'en', 'activity': 'rebar', 'crew': '3 steel fixers + 2 laborers', 'equipment': 'Rebar tools'},
+    {'lang': 'en', 'activity': 'pour', 'crew': 'Pouring crew 6 laborers', 'equipment': 'Mixer + pump'},
+    {'lang': 'en', 'activity': 'curing', 'crew': '2 laborers', 'equipment': 'Water spray'},
+]
+
+# Units and the summary lines most templates share
+M3 = {'unit_ar': 'م³', 'unit_en': 'm3'}
+M2 = {'unit_ar': 'م²', 'unit_en': 'm2'}
+TON = {'unit_ar': 'طن', 'unit_en': 'ton'}
+
+
+def _summary_ar(title, formwork_label='مساحة الشدّات', rebar_label='حديد التسليح', duration_label='المدة التقريبية'):
+    return (
+        f"{title}\n"
+        "- الكمية: {qty} م³\n"
+        f"- {formwork_label}: {{formwork_area:.1f}} م²\n"
+        f"- {rebar_label}: {{rebar_ton:.2f}} طن\n"
+        f"- {duration_label}: {{total_days}} يوم"
+    )
+
+
+def _summary_en(title, formwork_label='Formwork', rebar_label='Rebar', duration_label='Duration'):
+    return (
+        f"{title}\n"
+        "- Quantity: {qty} m3\n"
+        f"- {formwork_label}: {{formwork_area:.1f}} m2\n"
+        f"- {rebar_label}: {{rebar_ton:.2f}} ton\n"
+        f"- {duration_label}: {{total_days}} days"
+    )
+
+
+DEFAULT_TEMPLATES = [
+    {
+        'scope': 'slabs', 'match_order': 1,
+        'keywords': 'slab,slabs,بلاطة,بلاطات,سقف,أسقف',
+        'quantity_unit': 'm3', 'integer_quantity': 0,
+        'text_ar': _summary_ar("تم توليد خطة للبلاطات الخرسانية:"),
+        'text_en': _summary_en("Generated plan for RC Slab:"),
+        'notes_ar': "البلاطة المفترضة 20سم سمك. فك التدعيم بعد 21 يوم.",
+        'notes_en': "Assumes 200mm thick slab. Reshoring removal after 21 days.",
+        # 20 cm slab: 1 m3 = 5 m2 of soffit form
+        'quantities': {'formwork_area': 5.0, 'rebar_ton': 0.08},
+        'steps': [
+            dict(task_ar="نجارة وتدعيم بلاطة", task_en="Slab Formwork & Shoring", quantity='formwork_area', **M2,
+                 activity='formwork', equipment_ar="شدّات + جكات تدعيم", equipment_en="Forms + shoring jacks",
+                 rate_name=CARPENTRY, rate_factor=5),
+            dict(task_ar="حدادة بلاطة", task_en="Slab Rebar", quantity='rebar_ton', qty_format='.2f', **TON,
+                 activity='rebar', rate_name=REBAR, rate_factor=3),
+            dict(task_ar="تمديدات كهربائية", task_en="MEP Conduits", quantity='formwork_area', **M2,
+                 crew_ar="2 كهربائيين + 2 سباكين", crew_en="2 electricians + 2 plumbers",
+                 equipment_ar="معدات يدوية", equipment_en="Hand tools", rate_factor=200),
+            dict(task_ar="صب خرسانة بلاطة", task_en="Slab Concrete Pour", **M3,
+                 activity='pour', rate_name=PUMP, rate_factor=8),
+            dict(task_ar="معالجة وفك تدعيم", task_en="Curing & Reshoring", **M3, activity='curing', fixed_days=21),
+        ],
+    },
+    {
+        'scope': 'beams', 'match_order': 2,
+        'keywords': 'beam,beams,كمرة,كمرات,جسر,جسور',
+        'quantity_unit': 'm3', 'integer_quantity': 0,
+        'text_ar': _summary_ar("تم توليد خطة للكمرات الخرسانية:"),
+        'text_en': _summary_en("Generated plan for RC Beams:"),
+        'notes_ar': "معدلات تقريبية للكمرات (فك الشدّات بعد 14 يوم).",
+        'notes_en': "Form stripping after 14 days curing period.",
+        'quantities': {'formwork_area': 2.0, 'rebar_ton': 0.12},
+        'steps': [
+            dict(task_ar="نجارة شدّات كمرات", task_en="Beam Formwork", quantity='formwork_area', **M2,
+                 activity='formwork', rate_name=CARPENTRY, rate_factor=3.5),
+            dict(task_ar="حدادة كمرات", task_en="Beam Rebar", quantity='rebar_ton', qty_format='.2f', **TON,
+                 activity='rebar', rate_name=REBAR, rate_factor=2.5),
+            dict(task_ar="صب خرسانة كمرات", task_en="Beam Concrete Pour", **M3,
+                 activity='pour', rate_name=PUMP, rate_factor=5),
+            dict(task_ar="معالجة وفك شدّات", task_en="Curing & Stripping", **M3, activity='curing', fixed_days=14),
+        ],
+    },
+    {
+        'scope': 'columns', 'match_order': 3,
+        'keywords': 'column,columns,عمود,أعمدة,عامود',
+        'quantity_unit': 'm3', 'integer_quantity': 0,
+        'text_ar': _summary_ar("تم توليد خطة للأعمدة الخرسانية:"),
+        'text_en': _summary_en("Generated plan for RC Columns:", rebar_label='Rebar (150kg/m3)'),
+        'notes_ar': "معدلات تقريبية للأعمدة (تسليح 150 كجم/م³).",
+        'notes_en': "Rates for typical RC columns with heavy reinforcement.",
+        'quantities': {'formwork_area': 2.5, 'rebar_ton': 0.15},
+        'steps': [
+            dict(task_ar="نجارة شدّات أعمدة", task_en="Column Formwork", quantity='formwork_area', **M2,
+                 activity='formwork', rate_name=CARPENTRY, rate_factor=3),
+            dict(task_ar="حدادة أعمدة", task_en="Column Rebar", quantity='rebar_ton', qty_format='.2f', **TON,
+                 activity='rebar', rate_name=REBAR, rate_factor=2),
+            dict(task_ar="صب خرسانة أعمدة", task_en="Column Concrete Pour", **M3,
+                 activity='pour', rate_name=PUMP, rate_factor=4),
+            # Stripping runs at 1.5x the forming rate
+            dict(task_ar="فك الشدّات", task_en="Form Stripping", quantity='formwork_area', **M2,
+                 activity='formwork', rate_name=CARPENTRY, rate_factor=4.5),
+        ],
+    },
+    {
+        'scope': 'piles', 'match_order': 4,
+        'keywords': 'pile,piles,خازوق,خوازيق',
+        'quantity_unit': 'piles', 'integer_quantity': 1,
+        'text_ar': (
+            "تم توليد خطة لأعمال الخوازيق:\n"
+            "- عدد الخوازيق: {qty}\n"
+            "- حجم الخرسانة: {total_concrete:.1f} م³\n"
+            "- حديد التسليح: {rebar_ton:.2f} طن\n"
+            "- المدة التقريبية: {total_days} يوم"
+        ),
+        'text_en': (
+            "Generated plan for Pile Foundation:\n"
+            "- Number of Piles: {qty}\n"
+            "- Concrete Volume: {total_concrete:.1f} m3\n"
+            "- Rebar: {rebar_ton:.2f} ton\n"
+            "- Duration: {total_days} days"
+        ),
+        'notes_ar': "تفترض الخطة خوازيق بقطر 50سم وعمق 10م.",
+        'notes_en': "Plan assumes 500mm diameter piles at 10m depth.",
+        # 10 m deep, 0.5 m diameter: ~2 m3 and 150 kg of steel per pile
+        'quantities': {'total_concrete': 2.0, 'rebar_ton': 0.15},
+        'steps': [
+            dict(task_ar="حفر الخوازيق", task_en="Pile Drilling", qty_format='', unit_ar="خازوق", unit_en="pile",
+                 crew_ar="2 مشغّلين + 3 عمّال", crew_en="2 operators + 3 laborers",
+                 equipment_ar="ماكينة حفر خوازيق", equipment_en="Pile drilling rig", rate_factor=3),
+            dict(task_ar="تركيب أقفاص الحديد", task_en="Rebar Cage Installation", qty_format='',
+                 unit_ar="قفص", unit_en="cage", activity='rebar',
+                 equipment_ar="رافعة + معدات حدادة", equipment_en="Crane + rebar tools", rate_factor=6),
+            dict(task_ar="صب خرسانة بالتريمي", task_en="Tremie Concrete Pour", quantity='total_concrete', **M3,
+                 activity='pour', equipment_ar="مضخة + ترمي", equipment_en="Pump + tremie pipe",
+                 duration_quantity='qty', rate_factor=8),
+            dict(task_ar="تكسير رؤوس الخوازيق", task_en="Pile Head Breaking", qty_format='',
+                 unit_ar="خازوق", unit_en="pile", crew_ar="4 عمّال + مشرف", crew_en="4 laborers + supervisor",
+                 equipment_ar="هيلتي + كمبريسور", equipment_en="Jack hammer + compressor", rate_factor=10),
+        ],
+    },
+    {
+        'scope': 'strip_foundation', 'match_order': 5,
+        'keywords': 'strip,continuous,شريطي,شريطية,مستمر,سملات',
+        'quantity_unit': 'm3', 'integer_quantity': 0,
+        'text_ar': _summary_ar("تم توليد خطة للأساسات الشريطية:", 'تقدير شدّات', 'تقدير حديد'),
+        'text_en': _summary_en("Generated plan for Strip Foundations:", duration_label='Approx Duration'),
+        'notes_ar': "معدلات تقريبية للأساسات الشريطية المستمرة.",
+        'notes_en': "Approximate rates for continuous strip footings.",
+        'quantities': {'formwork_area': 0.9, 'rebar_ton': 0.07},
+        'steps': [
+            dict(task_ar="حفر خنادق", task_en="Trench Excavation", **M3, activity='excavation', rate_factor=50),
+            dict(task_ar="نجارة شدّات شريطية", task_en="Strip Formwork", quantity='formwork_area', **M2,
+                 activity='formwork', rate_name=CARPENTRY, rate_factor=4),
+            dict(task_ar="حدادة مسلّحة", task_en="Rebar Installation", quantity='rebar_ton', qty_format='.2f', **TON,
+                 activity='rebar', rate_name=REBAR, rate_factor=3),
+            dict(task_ar="صب خرسانة", task_en="Concrete Pour", **M3, activity='pour', rate_name=PUMP, rate_factor=6),
+            dict(task_ar="معالجة خرسانة", task_en="Curing", **M3, activity='curing', fixed_days=7),
+        ],
+    },
+    {
+        'scope': 'raft_foundation', 'match_order': 6,
+        'keywords': 'raft,mat,labsha,لبشة,حصيرية',
+        'quantity_unit': 'm3', 'integer_quantity': 0,
+        'text_ar': _summary_ar("تم توليد خطة للبشة الخرسانية (Raft):", 'مساحة الجوانب التقديرية',
+                               'حديد التسليح التقديري (100كجم/م³)', 'المدة الزمنية'),
+        'text_en': _summary_en("Generated plan for Raft Foundation (Mat):", 'Side Formwork', 'Rebar (approx 100kg/m3)'),
+        'notes_ar': "تم افتراض صب اللبشة باستخدام مضختين وفريقين لضمان الاستمرارية.",
+        'notes_en': "Assumed usage of 2 concrete pumps and double crew for massive pour continuity.",
+        # Mostly volume: little side form, heavier reinforcement (100 kg/m3)
+        'quantities': {'formwork_area': 0.4, 'rebar_ton': 0.10},
+        'steps': [
+            dict(task_ar="حفر لبشة", task_en="Mass Excavation", **M3, activity='excavation', rate_factor=80),
+            dict(task_ar="نجارة جوانب اللبشة", task_en="Raft Side Formwork", quantity='formwork_area', **M2,
+                 activity='formwork', rate_name=CARPENTRY, rate_factor=4),
+            dict(task_ar="حدادة اللبشة", task_en="Raft Rebar", quantity='rebar_ton', qty_format='.2f', **TON,
+                 activity='rebar', rate_name=REBAR, rate_factor=3),
+            # Long pour days with two pumps and two crews
+            dict(task_ar="صب خرسانة اللبشة", task_en="Raft Concrete Pour", **M3, activity='pour', crew_prefix='2x ',
+                 rate_name=PUMP, rate_factor=8),
+            dict(task_ar="معالجة (غمْر بالمياه)", task_en="Curing (Ponding)", **M3, activity='curing', fixed_days=14),
+        ],
+    },
+    {
+        'scope': 'isolated_foundations', 'match_order': 7,
+        'keywords': 'foundation,foundations,أساسات,قواعد,isolated,منفصلة,منفصل',
+        'quantity_unit': 'm3', 'integer_quantity': 0,
+        'text_ar': _summary_ar("تم توليد خطة للأساسات المنفصلة:", 'تقدير شدّات', 'تقدير حديد'),
+        'text_en': _summary_en("Generated plan for Isolated Foundations:", duration_label='Approx Duration'),
+        'notes_ar': "معدلات تقريبية للأساسات المنفصلة.",
+        'notes_en': "Approximate rates for isolated footings.",
+        'quantities': {'formwork_area': 1.2, 'rebar_ton': 0.08},
+        'steps': [
+            dict(task_ar="حفر", task_en="Excavation", **M3, activity='excavation', rate_factor=40),
+            dict(task_ar="نجارة شدّات", task_en="Formwork", quantity='formwork_area', **M2,
+                 activity='formwork', rate_name=CARPENTRY, rate_factor=4),
+            dict(task_ar="حدادة مسلّحة", task_en="Rebar", quantity='rebar_ton', qty_format='.2f', **TON,
+                 activity='rebar', rate_name=REBAR, rate_factor=3),
+            dict(task_ar="صب خرسانة", task_en="Concrete Pour", **M3, activity='pour', rate_name=PUMP, rate_factor=6),
+            dict(task_ar="معالجة خرسانة", task_en="Curing", **M3, activity='curing', fixed_days=7),
+        ],
+    },
+]
+
+
+def _row(table, values):
+    return {column: values.get(column) for column in PLAN_TABLE_COLUMNS[table]}
+
+
+def default_plan_rows():
+    """The default templates as {table: [row dict, ...]}, same columns as the tables."""
+    rows = {table: [] for table in PLAN_TABLE_COLUMNS}
+    for template in DEFAULT_TEMPLATES:
+        scope = template['scope']
+        rows['plan_templates'].append(_row('plan_templates', template))
+        for name, ratio in template['quantities'].items():
+            rows['plan_quantities'].append({'scope': scope, 'name': name, 'ratio': ratio})
+        for seq, step in enumerate(template['steps'], 1):
+            step = dict({'quantity': 'qty', 'qty_format': '.1f'}, **step, scope=scope, seq=seq)
+            rows['plan_steps'].append(_row('plan_steps', step))
+    rows['plan_rates'] = [dict(rate) for rate in DEFAULT_RATES]
+    rows['plan_crews'] = [dict(crew) for crew in DEFAULT_CREWS]
+    return rows
+
+
+def create_plan_tables(cursor):
+    """
+    Create the plan_* tables if missing and seed the default templates into
+    empty ones (rows edited after the first seed are kept).
+    Returns the number of rows inserted.
+    """
+    cursor.executescript(PLAN_SCHEMA)
+    inserted = 0
+    for table, rows in default_plan_rows().items():
+        if cursor.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone():
+            continue
+        columns = PLAN_TABLE_COLUMNS[table]
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [tuple(row[column] for column in columns) for row in rows]
+        )
+        inserted += len(rows)
+    return inserted
+
+
+if __name__ == '__main__':
+    db_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'csi_data.db')
+    conn = sqlite3.connect(db_path)
+    count = create_plan_tables(conn.cursor())
+    conn.commit()
+    conn.close()
+    print(f"[OK] Plan templates in {db_path}: {count} rows seeded")
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Planning Engine
+===============
+Builds the /api/ai element plans from the declarative templates in
+plan_templates.py (the plan_* tables, or the built-in defaults when the
+database has none).
+
+Templates are compiled once per catalog load into one PlanBook per
+process: every (scope, lang) pair is resolved up front (crew and equipment
+text, rates, units, summary text), so a plan is a few dict lookups plus
+one multiplication and ceil() per step. Editing the tables and touching
+the database file reloads them with the catalog.
+"""
+
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from catalog import add_load_listener, get_catalog
+from db_config import db_connection
+from plan_templates import PLAN_TABLE_COLUMNS, default_plan_rows
+
+DAY_WORD = {'ar': 'يوم', 'en': 'day'}
+LANGS = ('ar', 'en')
+
+
+class PlanStep:
+    """One table row of a compiled template for one language."""
+
+    __slots__ = ('task', 'quantity', 'qty_format', 'unit', 'crew', 'equipment',
+                 'duration_quantity', 'rate', 'fixed_days')
+
+    def __init__(self, step: Dict, lang: str, rates: Dict[str, float], crews: Dict[Tuple[str, str], Dict]):
+        self.task = step[f'task_{lang}']
+        self.quantity = step['quantity'] or 'qty'
+        self.qty_format = step['qty_format'] or ''
+        self.unit = step[f'unit_{lang}']
+        defaults = crews.get((lang, step['activity'])) or {}
+        prefix = step['crew_prefix'] or ''
+        self.crew = prefix + (step[f'crew_{lang}'] or defaults['crew'])
+        self.equipment = prefix + (step[f'equipment_{lang}'] or defaults['equipment'])
+        self.duration_quantity = step['duration_quantity'] or self.quantity
+        if step['fixed_days'] is not None:
+            self.fixed_days, self.rate = int(step['fixed_days']), None
+        else:
+            factor = step['rate_factor']
+            self.fixed_days = None
+            self.rate = rates[step['rate_name']] * factor if step['rate_name'] else factor
+            if not self.rate:
+                raise ValueError(f"step '{self.task}' has no duration rule")
+
+
+class CompiledPlan:
+    """A template resolved for one language."""
+
+    __slots__ = ('scope', 'integer_quantity', 'quantities', 'steps', 'text', 'notes', 'day_word')
+
+    def __init__(self, template: Dict, quantities: List[Dict], steps: List[Dict], lang: str,
+                 rates: Dict[str, float], crews: Dict[Tuple[str, str], Dict]):
+        self.scope = template['scope']
+        self.integer_quantity = bool(template['integer_quantity'])
+        self.quantities = tuple((q['name'], q['ratio']) for q in quantities)
+        self.steps = tuple(PlanStep(step, lang, rates, crews) for step in steps)
+        self.text = template[f'text_{lang}']
+        self.notes = template[f'notes_{lang}'] or ''
+        self.day_word = DAY_WORD[lang]
+        names = {'qty'} | {name for name, _ in self.quantities}
+        for step in self.steps:
+            for name in (step.quantity, step.duration_quantity):
+                if name not in names:
+                    raise ValueError(f"unknown quantity '{name}'")
+
+    def build(self, qty) -> Dict:
+        """The /api/ai payload for quantity `qty`."""
+        if self.integer_quantity:
+            qty = int(qty)
+        values = {'qty': qty}
+        for name, ratio in self.quantities:
+            values[name] = qty * ratio
+
+        rows = []
+        total_days = 0
+        for step in self.steps:
+            days = step.fixed_days if step.rate is None else math.ceil(values[step.duration_quantity] / step.rate)
+            total_days += days
+            rows.append({
+                "task": step.task,
+                "qty": format(values[step.quantity], step.qty_format),
+                "unit": step.unit,
+                "crew": step.crew,
+                "equipment": step.equipment,
+                "duration": f"{days} {self.day_word}"
+            })
+
+        return {
+            "text": self.text.format(total_days=total_days, **values),
+            "table": {"rows": rows},
+            "notes": self.notes
+        }
+
+
+class PlanBook:
+    """Every compiled template plus the keyword table for scope detection."""
+
+    def __init__(self, rows: Dict[str, List[Dict]], source: str):
+        self.source = source
+        rates = {rate['name']: rate['value'] for rate in rows['plan_rates']}
+        crews = {(crew['lang'], crew['activity']): crew for crew in rows['plan_crews']}
+        quantities: Dict[str, List[Dict]] = {}
+        for row in rows['plan_quantities']:
+            quantities.setdefault(row['scope'], []).append(row)
+        steps: Dict[str, List[Dict]] = {}
+        for row in sorted(rows['plan_steps'], key=lambda r: r['seq']):
+            steps.setdefault(row['scope'], []).append(row)
+
+        self.plans: Dict[Tuple[str, str], CompiledPlan] = {}
+        self.units: Dict[str, str] = {}
+        keywords = []
+        for template in sorted(rows['plan_templates'], key=lambda t: t['match_order']):
+            scope = template['scope']
+            try:
+                compiled = {
+                    lang: CompiledPlan(template, quantities.get(scope, []), steps.get(scope, []), lang, rates, crews)
+                    for lang in LANGS
+                }
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"[WARNING] Plan template '{scope}' skipped: {e!r}")
+                continue
+            for lang, plan in compiled.items():
+                self.plans[(scope, lang)] = plan
+            self.units[scope] = template['quantity_unit']
+            words = tuple(word.strip() for word in (template['keywords'] or '').split(',') if word.strip())
+            keywords.append((scope, words))
+        self.keywords: Tuple[Tuple[str, Tuple[str, ...]], ...] = tuple(keywords)
+
+    def detect_scope(self, text: str) -> Optional[str]:
+        """First template (by match_order) with a keyword in the lowercased text."""
+        for scope, words in self.keywords:
+            if any(word in text for word in words):
+                return scope
+        return None
+
+
+_book: Optional[PlanBook] = None
+_book_lock = threading.Lock()
+
+
+def load_plan_rows() -> Tuple[Dict[str, List[Dict]], str]:
+    """Rows of the plan_* tables, or the defaults when the database has none."""
+    with db_connection() as conn:
+        present = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'plan_%'"
+        )}
+        if not set(PLAN_TABLE_COLUMNS) <= present:
+            return default_plan_rows(), 'defaults'
+        rows = {}
+        for table, columns in PLAN_TABLE_COLUMNS.items():
+            cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {table}")
+            rows[table] = [dict(row) for row in cursor]
+    if not rows['plan_templates']:
+        return default_plan_rows(), 'defaults'
+    return rows, 'database'
+
+
+def _build_book(_snapshot=None) -> None:
+    global _book
+    try:
+        rows, source = load_plan_rows()
+    except Exception as e:
+        print(f"[WARNING] Plan templates not readable, using defaults: {e}")
+        rows, source = default_plan_rows(), 'defaults'
+    _book = PlanBook(rows, source)
+
+
+def get_plan_book() -> PlanBook:
+    """Compiled templates for the current catalog version."""
+    global _book
+    try:
+        get_catalog()  # reloads (and recompiles) when the database changed
+    except Exception:
+        pass
+    book = _book
+    if book is None:
+        with _book_lock:
+            if _book is None:
+                _book = PlanBook(default_plan_rows(), 'defaults')
+            book = _book
+    return book
+
+
+def detect_scope(text: str) -> Tuple[str, Optional[str]]:
+    """(scope, quantity unit) for a lowercased query; ('unknown', None) when nothing matches."""
+    book = get_plan_book()
+    scope = book.detect_scope(text)
+    if scope is None:
+        return 'unknown', None
+    return scope, book.units[scope]
+
+
+def build_plan(scope: str, qty, lang: str) -> Optional[Dict]:
+    """Plan payload for `qty` of `scope`, or None when no template exists."""
+    plan = get_plan_book().plans.get((scope, lang))
+    return plan.build(qty) if plan is not None else None
+
+
+add_load_listener(_build_book)
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+Project Planning
+================
+The math behind /api/project-plan: many assemblies and BOQ items scheduled
+together in one CPM pass (scheduler.py), leveled across the crew trades
+they share, with the daily labor and equipment histogram.
+
+Assembly components come from the cached assembly expansion (one query
+for all requested assemblies); links (assembly_dependencies), items and
+their parsed crew positions (csi_crew_members) from the catalog snapshot.
+Resources are crew positions, e.g. resource_limits {"Carpenter": 6}.
+
+The histogram has dense daily totals for labor and equipment and, per
+position, runs [first_day, end_day, units] of equal daily use (a 10k
+activity project spans thousands of days over hundreds of positions).
+"""
+
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+from assembly_expansion import expand_assemblies
+from scheduler import EPSILON, Activity, Link, ScheduleError, chain_links, crew_demands, schedule
+
+# Largest expanded project accepted by /api/project-plan
+MAX_PLAN_ACTIVITIES = int(os.environ.get('PROJECT_PLAN_MAX_ACTIVITIES', '20000'))
+
+# Most precedence links per plan: an entry-level dependency links every last
+# activity of one entry to every first activity of the other
+MAX_PLAN_LINKS = int(os.environ.get('PROJECT_PLAN_MAX_LINKS', '200000'))
+
+# Longest schedule (working days) accepted; the daily totals have one value per day
+MAX_PLAN_DAYS = int(os.environ.get('PROJECT_PLAN_MAX_DAYS', '36500'))
+
+
+class ProjectPlanError(Exception):
+    """Invalid project input; `status` is the HTTP status to report."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def assembly_links(catalog, assembly_id: int, component_ids: List) -> List[Link]:
+    """
+    Stored assembly_dependencies links between `component_ids`, or a
+    finish-to-start chain in component order when the assembly has none.
+    Links to components left out (missing CSI item) are dropped.
+    """
+    stored = catalog.dependencies_by_assembly.get(assembly_id, ())
+    if not stored:
+        return chain_links(component_ids)
+    known = set(component_ids)
+    return [
+        Link(dep['predecessor_id'], dep['component_id'], dep['dep_type'], dep['lag_days'])
+        for dep in stored
+        if dep['predecessor_id'] in known and dep['component_id'] in known
+    ]
+
+
+def _positive(value, name: str, default: Optional[float] = None) -> float:
+    try:
+        number = default if value is None else float(value)
+    except (TypeError, ValueError):
+        number = None
+    if number is None or not number > 0 or not math.isfinite(number):
+        raise ProjectPlanError(f"{name} must be a positive number")
+    return number
+
+
+class _Entry:
+    """One requested assembly or item, expanded into activities."""
+
+    def __init__(self, entry_id: str, kind: str, name: str):
+        self.id = entry_id
+        self.kind = kind
+        self.name = name
+        self.activities: List[Activity] = []
+        self.links: List[Link] = []
+
+    def ends(self) -> Tuple[List, List]:
+        """(ids without predecessors, ids without successors) inside the entry."""
+        has_pred = {link.successor for link in self.links}
+        has_succ = {link.predecessor for link in self.links}
+        ids = [a.id for a in self.activities]
+        return [i for i in ids if i not in has_pred], [i for i in ids if i not in has_succ]
+
+
+def _assembly_request(catalog, entry, index: int) -> Tuple[int, float]:
+    """(assembly_id, quantity) of an assemblies[] entry."""
+    if not isinstance(entry, dict):
+        raise ProjectPlanError(f"assemblies[{index}] must be an object")
+    try:
+        assembly_id = int(entry.get('assembly_id'))
+    except (TypeError, ValueError, OverflowError):
+        raise ProjectPlanError(f"assemblies[{index}]: assembly_id is required")
+    if assembly_id not in catalog.assemblies_by_id:
+        raise ProjectPlanError(f"Assembly not found: {assembly_id}", 404)
+    return assembly_id, _positive(entry.get('quantity'), f"assemblies[{index}].quantity")
+
+
+def _expand_assembly(catalog, entry: Dict, index: int, assembly_id: int, components: List[Dict],
+                     kinds: Dict[str, str], warnings: List[str]) -> _Entry:
+    crews_by_component = entry.get('crews') or {}
+    if not isinstance(crews_by_component, dict):
+        raise ProjectPlanError(f"assemblies[{index}].crews must be an object")
+
+    result = _Entry(str(entry.get('id') or f"A{index + 1}"), 'assembly',
+                    catalog.assemblies_by_id[assembly_id]['name_en'])
+    component_ids = []
+    for component in components:
+        component_id = component['component_id']
+        item = catalog.get_item(component['full_code']) if component['full_code'] is not None else None
+        if item is None:
+            warnings.append(f"{result.id}: component {component_id} skipped, CSI item "
+                            f"{component['csi_full_code']} not found")
+            continue
+        crews = _positive(crews_by_component.get(str(component_id), component['crew_count']),
+                          f"{result.id} component {component_id} crews", 1.0)
+        qty = component['calculated_qty']
+        duration = qty / ((component['daily_output'] or 1) * crews)
+        for member in item.crew:
+            if member.kind:
+                kinds.setdefault(member.position, member.kind)
+        result.activities.append(Activity(
+            f"{result.id}/{component_id}", duration,
+            name=component['component_role_en'] or component['description'] or '',
+            demands=crew_demands(item.crew, crews),
+            data={'entry': result.id, 'item_code': item.full_code, 'quantity': round(qty, 2),
+                  'unit': component['unit'], 'crews': crews}
+        ))
+        component_ids.append(component_id)
+
+    for link in assembly_links(catalog, assembly_id, component_ids):
+        result.links.append(Link(f"{result.id}/{link.predecessor}", f"{result.id}/{link.successor}",
+                                 link.type, link.lag))
+    return result
+
+
+def _expand_item(catalog, entry: Dict, index: int, kinds: Dict[str, str]) -> _Entry:
+    code = entry.get('item_code')
+    item = catalog.get_item(code) if isinstance(code, str) else None
+    if item is None:
+        raise ProjectPlanError(f"Item not found: {code}", 404)
+    if not item.daily_output:
+        raise ProjectPlanError(f"Item {code} does not have productivity data")
+    quantity = _positive(entry.get('quantity'), f"items[{index}].quantity")
+    crews = _positive(entry.get('number_of_crews'), f"items[{index}].number_of_crews", 1.0)
+
+    result = _Entry(str(entry.get('id') or f"I{index + 1}"), 'item', item.description or code)
+    for member in item.crew:
+        if member.kind:
+            kinds.setdefault(member.position, member.kind)
+    result.activities.append(Activity(
+        result.id, quantity / (item.daily_output * crews), name=item.description or code,
+        demands=crew_demands(item.crew, crews),
+        data={'entry': result.id, 'item_code': item.full_code, 'quantity': quantity,
+              'unit': item.unit, 'crews': crews}
+    ))
+    return result
+
+
+def _project_links(entries: List[_Entry], dependencies, max_links: int = MAX_PLAN_LINKS) -> List[Link]:
+    """
+    Links between entries or activities. An entry id stands for its last
+    activities as a predecessor and its first activities as a successor.
+    Raises ProjectPlanError past `max_links` links.
+    """
+    if dependencies is None:
+        return []
+    if not isinstance(dependencies, list):
+        raise ProjectPlanError("'dependencies' must be a list of {from, to, type, lag}")
+    by_id = {entry.id: entry for entry in entries}
+    ends: Dict[str, Tuple[List, List]] = {}
+
+    def entry_ends(entry_id):
+        if entry_id not in ends:
+            ends[entry_id] = by_id[entry_id].ends()
+        return ends[entry_id]
+
+    links = []
+    for dep in dependencies:
+        if not isinstance(dep, dict) or 'from' not in dep or 'to' not in dep:
+            raise ProjectPlanError("Each dependency needs 'from' and 'to' (entry or activity ids)")
+        source, target = str(dep['from']), str(dep['to'])
+        predecessors = entry_ends(source)[1] if source in by_id else [source]
+        successors = entry_ends(target)[0] if target in by_id else [target]
+        if len(links) + len(predecessors) * len(successors) > max_links:
+            raise ProjectPlanError(f"Too many dependency links (max {MAX_PLAN_LINKS})")
+        for p in predecessors:
+            for s in successors:
+                links.append(Link(p, s, dep.get('type', 'FS'), dep.get('lag', 0)))
+    return links
+
+
+def build_project_plan(catalog, data: Dict) -> Dict:
+    """
+    Schedule a whole project.
+
+    data = {
+        "assemblies": [{"id": "F1", "assembly_id": 1, "quantity": 100, "crews": {"<component id>": 2}}],
+        "items": [{"id": "T1", "item_code": "033 172-2950", "quantity": 300, "number_of_crews": 2}],
+        "dependencies": [{"from": "F1", "to": "T1", "type": "FS", "lag": 0}],
+        "resource_limits": {"Carpenter": 6}
+    }
+    Entries without dependencies run in parallel, subject to the limits.
+    """
+    assemblies = data.get('assemblies') or []
+    items = data.get('items') or []
+    resource_limits = data.get('resource_limits') or {}
+    if not isinstance(assemblies, list) or not isinstance(items, list):
+        raise ProjectPlanError("'assemblies' and 'items' must be lists")
+    if not assemblies and not items:
+        raise ProjectPlanError("Nothing to plan: give 'assemblies' and/or 'items'")
+    if not isinstance(resource_limits, dict):
+        raise ProjectPlanError("'resource_limits' must be an object")
+
+    kinds: Dict[str, str] = {}
+    warnings: List[str] = []
+    entries = []
+    requests = [_assembly_request(catalog, entry, index) for index, entry in enumerate(assemblies)]
+    # All assemblies in one expansion query (cached per assembly_id)
+    expanded = expand_assemblies(requests)
+    try:
+        for index, entry in enumerate(assemblies):
+            entries.append(_expand_assembly(catalog, entry, index, requests[index][0], expanded[index],
+                                            kinds, warnings))
+        for index, entry in enumerate(items):
+            if not isinstance(entry, dict):
+                raise ProjectPlanError(f"items[{index}] must be an object")
+            entries.append(_expand_item(catalog, entry, index, kinds))
+    except ScheduleError as e:
+        # e.g. a duration that overflows (huge quantity over tiny crews)
+        raise ProjectPlanError(f"Invalid schedule: {e}")
+
+    activities = [a for entry in entries for a in entry.activities]
+    if len(activities) > MAX_PLAN_ACTIVITIES:
+        raise ProjectPlanError(f"Too many activities ({len(activities)}, max {MAX_PLAN_ACTIVITIES})")
+    if len({entry.id for entry in entries}) != len(entries):
+        raise ProjectPlanError("Entry ids must be unique")
+
+    try:
+        links = [link for entry in entries for link in entry.links]
+        links.extend(_project_links(entries, data.get('dependencies'), MAX_PLAN_LINKS - len(links)))
+        plan = schedule(activities, links, resource_limits)
+    except (ScheduleError, TypeError, ValueError) as e:
+        raise ProjectPlanError(f"Invalid schedule: {e}")
+    if not plan.duration <= MAX_PLAN_DAYS:
+        raise ProjectPlanError(f"Project too long ({plan.duration:.0f} days, max {MAX_PLAN_DAYS})")
+
+    by_position = plan.daily_usage()
+    days = math.ceil(plan.duration - EPSILON) if plan.duration > 0 else 0
+    histogram: Dict = {'days': days, 'labor': {}, 'equipment': {}}
+    steps = {'labor': [0.0] * (days + 1), 'equipment': [0.0] * (days + 1)}
+    for position in sorted(by_position):
+        kind = kinds.get(position, 'labor')
+        histogram[kind][position] = by_position[position]
+        for first, end, units in by_position[position]:
+            steps[kind][first] += units
+            steps[kind][end] -= units
+    for kind in ('labor', 'equipment'):
+        level = 0.0
+        daily = []
+        for d in range(days):
+            level += steps[kind][d]
+            daily.append(round(level, 2) + 0.0)
+        histogram[f'total_{kind}'] = daily
+    histogram['peaks'] = {position: max(units for _, _, units in runs) for position, runs in by_position.items()}
+
+    result = plan.summary()
+    result.update({
+        'entries': [
+            {
+                'id': entry.id,
+                'type': entry.kind,
+                'name': entry.name,
+                'activities': len(entry.activities),
+                'start': round(min((a.start for a in entry.activities), default=0.0), 2),
+                'finish': round(max((a.finish for a in entry.activities), default=0.0), 2),
+            }
+            for entry in entries
+        ],
+        'histogram': histogram,
+        'warnings': warnings,
+    })
+    return result
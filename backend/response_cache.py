@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+AI Response Cache
+=================
+Bounded LRU + TTL cache for /api/intelligent-ai answers, so identical
+questions (same normalized query, language and recent history) do not
+spend a Groq call each time. Optionally persisted to a local SQLite file
+(AI_CACHE_PATH) so entries survive restarts and are shared by workers.
+
+Only deterministic search answers are stored by the caller, never
+errors, questions or free-text replies.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+AI_CACHE_MAX_ENTRIES = int(os.environ.get('AI_CACHE_MAX_ENTRIES', '512'))
+AI_CACHE_TTL = float(os.environ.get('AI_CACHE_TTL', '3600'))  # seconds
+AI_CACHE_HISTORY_TURNS = int(os.environ.get('AI_CACHE_HISTORY_TURNS', '6'))
+AI_CACHE_PATH = os.environ.get('AI_CACHE_PATH', '')  # empty = memory only
+
+# Request header that skips the cache lookup (the fresh answer is still stored)
+CACHE_BYPASS_HEADER = 'X-Cache-Bypass'
+
+
+def normalize_query(query: str) -> str:
+    """Lower-case and collapse whitespace."""
+    return ' '.join((query or '').lower().split())
+
+
+def make_cache_key(query: str, lang: str, history: Optional[List] = None,
+                   turns: int = AI_CACHE_HISTORY_TURNS, version: str = '') -> str:
+    """Key of normalized query + language + hash of the last `turns` history entries."""
+    recent = (history or [])[-turns:] if turns > 0 else []
+    history_hash = hashlib.sha1(
+        json.dumps(recent, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()[:16]
+    return f"{version}|{lang}|{history_hash}|{normalize_query(query)}"
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with per-entry expiry and optional SQLite persistence."""
+
+    def __init__(self, max_entries: int = AI_CACHE_MAX_ENTRIES, ttl: float = AI_CACHE_TTL,
+                 persist_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist_path = persist_path or None
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0, 'bypassed': 0}
+        self._db = None
+        self._db_pid = None
+        if self.persist_path:
+            self._connect()
+
+    def _connect(self) -> None:
+        """(Re)open the persistence file; called again in forked workers."""
+        try:
+            self._db = sqlite3.connect(self.persist_path, check_same_thread=False, timeout=5)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS response_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._db.execute('DELETE FROM response_cache WHERE expires_at <= ?', (time.time(),))
+            self._db.commit()
+            self._db_pid = os.getpid()
+        except sqlite3.Error as e:
+            print(f"[WARNING] AI cache persistence disabled ({self.persist_path}): {e}")
+            self._db = None
+            self.persist_path = None
+
+    def _check_fork(self) -> None:
+        # A connection inherited from the parent process must not be used
+        if self._db is not None and self._db_pid != os.getpid():
+            self._connect()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            self._check_fork()
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                entry = self._load(key)
+                if entry is not None:
+                    self._insert(key, entry)
+            if entry is not None and entry[0] <= now:
+                self._entries.pop(key, None)
+                self._delete(key)
+                self._stats['expired'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def put(self, key: str, value: Any) -> None:
+        entry = (time.time() + self.ttl, value)
+        with self._lock:
+            self._insert(key, entry)
+            self._stats['stores'] += 1
+            self._check_fork()
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                        (key, json.dumps(value, ensure_ascii=False), entry[0])
+                    )
+                    if self._stats['stores'] % 100 == 0:
+                        self._db.execute('DELETE FROM response_cache WHERE expires_at <= ?', (time.time(),))
+                    self._db.commit()
+                except (sqlite3.Error, TypeError, ValueError) as e:
+                    print(f"[WARNING] AI cache write failed: {e}")
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self._stats['bypassed'] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._check_fork()
+            if self._db is not None:
+                self._db.execute('DELETE FROM response_cache')
+                self._db.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['ttl'] = self.ttl
+        stats['persistent'] = self._db is not None
+        return stats
+
+    # Callers hold self._lock
+    def _insert(self, key: str, entry: tuple) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _load(self, key: str) -> Optional[tuple]:
+        try:
+            row = self._db.execute(
+                'SELECT expires_at, value FROM response_cache WHERE key = ?', (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        return (row[0], json.loads(row[1])) if row else None
+
+    def _delete(self, key: str) -> None:
+        if self._db is not None:
+            try:
+                self._db.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+                self._db.commit()
+            except sqlite3.Error:
+                pass
+
+
+# Shared cache for /api/intelligent-ai
+AI_RESPONSE_CACHE = ResponseCache(persist_path=AI_CACHE_PATH)
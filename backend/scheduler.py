@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+"""
+Activity Scheduler
+==================
+Critical path method (CPM) over activities with precedence links, plus an
+optional resource-limited pass.
+
+- Links: FS (finish-to-start, the default), SS, FF and SF, each with a lag
+  in days (negative lags are leads).
+- CPM: one topological order (Kahn), one forward pass (early start /
+  finish), one backward pass (late start / finish), so O(activities +
+  links). Total float = LS - ES; free float = slack to the nearest
+  successor; activities with zero total float are critical.
+- Resource limits: each activity needs `demands` units of named resources
+  per day (e.g. 2 Carpenter, 0.125 Labor Foreman) while it runs. With
+  limits, a parallel schedule generation pass starts activities in
+  minimum-late-start order whenever their links and the free capacity
+  allow it, in O((activities + links) log activities). Activities waiting
+  for a resource keep their priority order (no overtaking within a
+  resource queue). An activity that needs more than a limit runs alone on
+  it.
+
+Durations and times are in (fractional) working days from day 0.
+"""
+
+import heapq
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+LINK_TYPES = ('FS', 'SS', 'FF', 'SF')
+EPSILON = 1e-9
+
+
+class ScheduleError(ValueError):
+    """Invalid activities or links (unknown id, bad type, cycle)."""
+
+
+class Activity:
+    """A schedulable activity; CPM and leveled times are filled in by schedule()."""
+
+    __slots__ = ('id', 'name', 'duration', 'demands', 'data', 'index',
+                 'es', 'ef', 'ls', 'lf', 'total_float', 'free_float', 'start', 'finish')
+
+    def __init__(self, activity_id, duration: float, name: str = '',
+                 demands: Optional[Dict[str, float]] = None, data: Optional[Dict] = None):
+        if duration is None or not math.isfinite(duration) or duration < 0:
+            raise ScheduleError(f"Activity {activity_id!r} has an invalid duration: {duration!r}")
+        self.id = activity_id
+        self.name = name
+        self.duration = float(duration)
+        self.demands = {r: float(q) for r, q in (demands or {}).items() if q and q > 0}
+        if not all(math.isfinite(q) for q in self.demands.values()):
+            raise ScheduleError(f"Activity {activity_id!r} has an invalid resource demand")
+        self.data = data or {}   # passed through to the Gantt rows
+        self.index = -1
+        self.es = self.ef = self.ls = self.lf = 0.0
+        self.total_float = self.free_float = 0.0
+        self.start = self.finish = 0.0
+
+    @property
+    def critical(self) -> bool:
+        return self.total_float <= EPSILON
+
+
+class Link:
+    """predecessor -> successor precedence link."""
+
+    __slots__ = ('predecessor', 'successor', 'type', 'lag')
+
+    def __init__(self, predecessor, successor, link_type: str = 'FS', lag: float = 0.0):
+        link_type = link_type or 'FS'
+        if not isinstance(link_type, str) or link_type.upper() not in LINK_TYPES:
+            raise ScheduleError(f"Unknown link type {link_type!r} (use one of {', '.join(LINK_TYPES)})")
+        lag = float(lag or 0.0)
+        if not math.isfinite(lag):
+            raise ScheduleError(f"Link {predecessor!r} -> {successor!r} has an invalid lag: {lag!r}")
+        self.predecessor = predecessor
+        self.successor = successor
+        self.type = link_type.upper()
+        self.lag = lag
+
+
+def _earliest_start(link_type: str, lag: float, pred_start: float, pred_finish: float, duration: float) -> float:
+    """Earliest start of a successor (of `duration`) allowed by one link."""
+    if link_type == 'FS':
+        return pred_finish + lag
+    if link_type == 'SS':
+        return pred_start + lag
+    if link_type == 'FF':
+        return pred_finish + lag - duration
+    return pred_start + lag - duration  # SF
+
+
+def _latest_finish(link_type: str, lag: float, succ_start: float, succ_finish: float, duration: float) -> float:
+    """Latest finish of a predecessor (of `duration`) allowed by one link."""
+    if link_type == 'FS':
+        return succ_start - lag
+    if link_type == 'SS':
+        return succ_start - lag + duration
+    if link_type == 'FF':
+        return succ_finish - lag
+    return succ_finish - lag + duration  # SF
+
+
+def _round(value: float, digits: int) -> float:
+    return round(value, digits) + 0.0  # + 0.0 turns -0.0 into 0.0
+
+
+def _usage_runs(spans: List[Tuple[float, float, float]], digits: int) -> List[Tuple[int, int, float]]:
+    """Daily use of (start, finish, units) spans as runs; O(k log k), not O(days)."""
+    steps: Dict[int, float] = {}   # change of the daily use at the start of each day
+    for start, finish, q in spans:
+        first = int(start)
+        last = max(first, math.ceil(finish - EPSILON) - 1)
+        if first == last:
+            head = q * (finish - start)
+            steps[first] = steps.get(first, 0.0) + head
+            steps[first + 1] = steps.get(first + 1, 0.0) - head
+            continue
+        head = q * (first + 1 - start)   # part days at both ends, whole days between
+        tail = q * (finish - last)
+        steps[first] = steps.get(first, 0.0) + head
+        steps[first + 1] = steps.get(first + 1, 0.0) + q - head
+        steps[last] = steps.get(last, 0.0) + tail - q
+        steps[last + 1] = steps.get(last + 1, 0.0) - tail
+
+    runs: List[Tuple[int, int, float]] = []
+    level = 0.0
+    run_start, run_value = 0, 0.0
+    for day in sorted(steps):
+        level += steps[day]
+        value = round(level, digits) + 0.0
+        if value != run_value:
+            if run_value:
+                runs.append((run_start, day, run_value))
+            run_start, run_value = day, value
+    return runs
+
+
+class Schedule:
+    """Result of schedule(): activities in topological order with their times."""
+
+    def __init__(self, activities: List[Activity], links: List[Link], leveled: bool,
+                 resource_limits: Dict[str, float]):
+        self.activities = activities
+        self.links = links
+        self.leveled = leveled
+        self.resource_limits = resource_limits
+        self.cpm_duration = max((a.ef for a in activities), default=0.0)
+        self.duration = max((a.finish for a in activities), default=0.0)
+
+    @property
+    def critical_path(self) -> List:
+        """Ids of the critical activities in topological order."""
+        return [a.id for a in self.activities if a.critical]
+
+    def gantt(self, digits: int = 2) -> List[Dict]:
+        """Gantt rows: leveled start / finish plus the CPM dates and floats."""
+        predecessors: Dict = {}
+        for link in self.links:
+            predecessors.setdefault(link.successor, []).append(
+                {'id': link.predecessor, 'type': link.type, 'lag': link.lag}
+            )
+        rows = []
+        for a in self.activities:
+            row = {
+                'id': a.id,
+                'name': a.name,
+                'start': _round(a.start, digits),
+                'finish': _round(a.finish, digits),
+                'duration': _round(a.duration, digits),
+                'early_start': _round(a.es, digits),
+                'early_finish': _round(a.ef, digits),
+                'late_start': _round(a.ls, digits),
+                'late_finish': _round(a.lf, digits),
+                'total_float': _round(a.total_float, digits),
+                'free_float': _round(a.free_float, digits),
+                'critical': a.critical,
+                'predecessors': predecessors.get(a.id, []),
+            }
+            row.update(a.data)
+            rows.append(row)
+        return rows
+
+    def daily_usage(self, digits: int = 2) -> Dict[str, List[Tuple[int, int, float]]]:
+        """
+        Units of each resource per working day (day d covers [d, d + 1)) as
+        runs (first_day, end_day, units) of equal daily use; idle days are
+        left out. An activity running half of a day counts half its demand.
+        """
+        spans: Dict[str, List[Tuple[float, float, float]]] = {}
+        for a in self.activities:
+            if a.finish - a.start <= EPSILON:
+                continue
+            for r, q in a.demands.items():
+                spans.setdefault(r, []).append((a.start, a.finish, q))
+        return {r: _usage_runs(items, digits) for r, items in spans.items()}
+
+    def summary(self, digits: int = 2) -> Dict:
+        return {
+            'project_duration': _round(self.duration, digits),
+            'cpm_duration': _round(self.cpm_duration, digits),
+            'leveled': self.leveled,
+            'resource_limits': self.resource_limits,
+            'critical_path': self.critical_path,
+            'activities': self.gantt(digits),
+        }
+
+
+def _topological_order(activities: Sequence[Activity], preds: List[List], succs: List[List]) -> List[int]:
+    indegree = [len(p) for p in preds]
+    ready = [i for i, degree in enumerate(indegree) if degree == 0]
+    order = []
+    # FIFO over the input order keeps unlinked activities in their listed order
+    head = 0
+    while head < len(ready):
+        i = ready[head]
+        head += 1
+        order.append(i)
+        for j, _ in succs[i]:
+            indegree[j] -= 1
+            if indegree[j] == 0:
+                ready.append(j)
+    if len(order) != len(activities):
+        stuck = [activities[i].id for i, degree in enumerate(indegree) if degree > 0]
+        raise ScheduleError(f"Links form a cycle through: {stuck[:10]}")
+    return order
+
+
+def _critical_path_method(activities: List[Activity], order: List[int], preds, succs) -> None:
+    for i in order:
+        a = activities[i]
+        es = 0.0
+        for p, link in preds[i]:
+            pred = activities[p]
+            es = max(es, _earliest_start(link.type, link.lag, pred.es, pred.ef, a.duration))
+        a.es, a.ef = es, es + a.duration
+
+    project_end = max((a.ef for a in activities), default=0.0)
+    for i in reversed(order):
+        a = activities[i]
+        lf = project_end
+        for s, link in succs[i]:
+            succ = activities[s]
+            lf = min(lf, _latest_finish(link.type, link.lag, succ.ls, succ.lf, a.duration))
+        a.lf, a.ls = lf, lf - a.duration
+        a.total_float = max(0.0, a.ls - a.es)
+        free = project_end - a.ef
+        for s, link in succs[i]:
+            succ = activities[s]
+            free = min(free, _latest_finish(link.type, link.lag, succ.es, succ.ef, a.duration) - a.ef)
+        a.free_float = max(0.0, free)
+        a.start, a.finish = a.es, a.ef
+
+
+def _level(activities: List[Activity], preds, succs, limits: Dict[str, float]) -> None:
+    """Parallel schedule generation under resource limits (see module docstring)."""
+    n = len(activities)
+    # Demands above a limit are capped so the activity can still run (alone)
+    demands = []
+    for a in activities:
+        demands.append({r: min(q, limits[r]) if r in limits else q for r, q in a.demands.items()})
+    priority = [(a.ls, a.es, a.index) for a in activities]
+
+    waiting = [len(p) for p in preds]
+    release = [0.0] * n
+    pending = [(0.0, priority[i], i) for i in range(n) if waiting[i] == 0]   # by release time
+    heapq.heapify(pending)
+    running: List[Tuple[float, int]] = []                                    # by finish time
+    in_use: Dict[str, float] = {r: 0.0 for r in limits}
+    queues: Dict[str, List] = {r: [] for r in limits}                        # blocked, by priority
+    started = 0
+    t = 0.0
+
+    def blocking_resource(i):
+        for r, q in demands[i].items():
+            if r in limits and in_use[r] + q > limits[r] + EPSILON:
+                return r
+        return None
+
+    def start(i):
+        nonlocal started
+        a = activities[i]
+        a.start, a.finish = t, t + a.duration
+        for r, q in demands[i].items():
+            if r in in_use:
+                in_use[r] += q
+        heapq.heappush(running, (a.finish, i))
+        started += 1
+        for j, link in succs[i]:
+            release[j] = max(release[j], _earliest_start(link.type, link.lag, a.start, a.finish, activities[j].duration))
+            waiting[j] -= 1
+            if waiting[j] == 0:
+                heapq.heappush(pending, (release[j], priority[j], j))
+
+    def try_start(i):
+        r = blocking_resource(i)
+        if r is None:
+            start(i)
+        else:
+            heapq.heappush(queues[r], (priority[i], i))
+
+    while started < n:
+        freed = set()
+        while running and running[0][0] <= t + EPSILON:
+            finish, i = heapq.heappop(running)
+            t = max(t, finish)  # never start inside a finish that is only EPSILON away
+            for r, q in demands[i].items():
+                if r in in_use:
+                    in_use[r] -= q
+                    freed.add(r)
+        # Waiting activities first, in priority order per resource
+        for r in sorted(freed):
+            queue = queues[r]
+            while queue:
+                _, i = queue[0]
+                blocker = blocking_resource(i)
+                if blocker == r:
+                    break
+                heapq.heappop(queue)
+                if blocker is None:
+                    start(i)
+                else:
+                    heapq.heappush(queues[blocker], (priority[i], i))
+        # Then everything released by now (starts can release more at t)
+        while pending and pending[0][0] <= t + EPSILON:
+            ready = []
+            while pending and pending[0][0] <= t + EPSILON:
+                ready.append(heapq.heappop(pending))
+            ready.sort(key=lambda entry: entry[1])
+            for _, _, i in ready:
+                try_start(i)
+
+        if started == n:
+            break
+        next_times = []
+        if running:
+            next_times.append(running[0][0])
+        if pending:
+            next_times.append(pending[0][0])
+        if not next_times:
+            # Only possible with queued work and nothing running: capacity is free again
+            for r, queue in queues.items():
+                if queue:
+                    _, i = heapq.heappop(queue)
+                    start(i)
+                    break
+            continue
+        t = max(t, min(next_times))
+
+    for a in activities:
+        a.start = max(a.start, 0.0)
+
+
+def schedule(activities: Iterable[Activity], links: Iterable[Link] = (),
+             resource_limits: Optional[Dict[str, float]] = None) -> Schedule:
+    """
+    CPM dates, floats and critical path for `activities`; with
+    resource_limits ({resource: max units at a time}) also a leveled
+    start / finish per activity.
+    """
+    activities = list(activities)
+    links = list(links)
+    by_id: Dict = {}
+    for index, a in enumerate(activities):
+        if a.id in by_id:
+            raise ScheduleError(f"Duplicate activity id {a.id!r}")
+        a.index = index
+        by_id[a.id] = index
+
+    preds: List[List] = [[] for _ in activities]
+    succs: List[List] = [[] for _ in activities]
+    for link in links:
+        p = by_id.get(link.predecessor)
+        s = by_id.get(link.successor)
+        if p is None or s is None:
+            missing = link.predecessor if p is None else link.successor
+            raise ScheduleError(f"Link refers to unknown activity {missing!r}")
+        if p == s:
+            raise ScheduleError(f"Activity {link.predecessor!r} cannot depend on itself")
+        preds[s].append((p, link))
+        succs[p].append((s, link))
+
+    order = _topological_order(activities, preds, succs)
+    _critical_path_method(activities, order, preds, succs)
+
+    limits = {r: float(v) for r, v in (resource_limits or {}).items() if v is not None and float(v) > 0}
+    leveled = bool(limits) and any(r in limits for a in activities for r in a.demands)
+    if leveled:
+        _level(activities, preds, succs, limits)
+
+    ordered = [activities[i] for i in order]
+    return Schedule(ordered, links, leveled, limits)
+
+
+def chain_links(ids: Sequence) -> List[Link]:
+    """Finish-to-start links through `ids` in order (the default sequence)."""
+    return [Link(ids[k - 1], ids[k]) for k in range(1, len(ids))]
+
+
+def crew_demands(crew, crews: float = 1.0) -> Dict[str, float]:
+    """
+    Resource demand of `crews` crews of an item: parsed crew positions
+    (catalog CrewMember records) -> units, e.g. {'Carpenter': 2.0}.
+    """
+    demands: Dict[str, float] = {}
+    for member in crew:
+        if member.kind and member.count and member.position:
+            demands[member.position] = demands.get(member.position, 0.0) + member.count * crews
+    return demands
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Test: assembly expansion (assembly_expansion.py)
+A throwaway database with a full_code imported twice and a component
+whose item is missing: the view and the inline SELECT agree, every
+component appears once, and the per-assembly cache is reused until the
+database changes.
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+tmp = tempfile.mkdtemp()
+DB = os.path.join(tmp, 'csi_data.db')
+os.environ['CSI_DB_PATH'] = DB
+os.environ['CATALOG_CHECK_INTERVAL'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from testing import check, finish
+
+conn = sqlite3.connect(DB)
+conn.executescript('''
+    CREATE TABLE csi_items (id INTEGER PRIMARY KEY AUTOINCREMENT, full_code TEXT, main_div_code TEXT,
+        main_div_name TEXT, sub_div1_code TEXT, sub_div1_name TEXT, sub_div2_code TEXT, sub_div2_name TEXT,
+        item_code TEXT, description TEXT, unit TEXT, daily_output REAL, man_hours REAL, equip_hours REAL,
+        crew_structure TEXT);
+    INSERT INTO csi_items (full_code, description, unit, daily_output) VALUES
+        ('03 11 A', 'Forms', 'm2', 20), ('03 21 B', 'Rebar', 'ton', 2), ('03 11 A', 'Forms (copy)', 'm2', 99);
+''')
+with open(os.path.join(ROOT, 'database', 'schema_v3.sql'), encoding='utf-8') as f:
+    conn.executescript(f.read())
+conn.executemany(
+    'INSERT INTO assembly_components (assembly_id, csi_full_code, ratio_to_primary, ratio_type, component_role_en) '
+    'VALUES (?, ?, ?, ?, ?)',
+    [(1, '03 11 A', 12.0, 'area', 'Formwork'), (1, '03 21 B', 0.1, 'weight', 'Rebar'),
+     (1, '99 99 Z', 1.0, 'count', 'Missing')]
+)
+conn.commit()
+conn.close()
+
+import assembly_expansion
+from assembly_expansion import expand_assemblies, expansion_cache_stats, get_expansion
+
+try:
+    # Inline SELECT (no schema_v4 / v5 yet)
+    rows = get_expansion(1)
+    check("one row per component", [r['component_id'] for r in rows] == [1, 2, 3], [r['component_id'] for r in rows])
+    check("first csi_items row of a code", rows[0]['description'] == 'Forms' and rows[0]['daily_output'] == 20)
+    check("missing item kept with full_code None", rows[2]['full_code'] is None and rows[2]['csi_full_code'] == '99 99 Z')
+    inline = [dict(r) for r in rows]
+
+    # Cached: no new query
+    queries = expansion_cache_stats()['queries']
+    expanded = expand_assemblies([(1, 100), (1, 5), (42, 1)])
+    check("cached expansion reused", expansion_cache_stats()['queries'] == queries)
+    check("quantities per request", [r['calculated_qty'] for r in expanded[0][:2]] == [1200.0, 10.0]
+          and expanded[1][0]['calculated_qty'] == 60.0, expanded[0][:2])
+    check("unknown assembly is empty", expanded[2] == [])
+
+    # Applying schema v4 + v5 changes the database: cache dropped, view used
+    time.sleep(0.01)
+    conn = sqlite3.connect(DB)
+    for name in ('schema_v4.sql', 'schema_v5.sql'):
+        if name == 'schema_v5.sql':
+            conn.execute('ALTER TABLE assembly_components ADD COLUMN crew_count INTEGER DEFAULT 1')
+        with open(os.path.join(ROOT, 'database', name), encoding='utf-8') as f:
+            conn.executescript(f.read())
+    plan = ' '.join(row[-1] for row in conn.execute(
+        'EXPLAIN QUERY PLAN SELECT * FROM assembly_expansion WHERE assembly_id IN (1, 2)'))
+    conn.commit()
+    conn.close()
+    os.utime(DB, (time.time() + 5, time.time() + 5))
+
+    rows = get_expansion(1)
+    check("reloaded after the database changed", expansion_cache_stats()['queries'] == queries + 1)
+    check("view in use", assembly_expansion._source == 'assembly_expansion', assembly_expansion._source)
+    check("view matches the inline SELECT",
+          [dict(r, crew_count=None) for r in rows] == inline and rows[0]['crew_count'] == 1)
+    check("view searches by index", 'SCAN' not in plan, plan)
+finally:
+    shutil.rmtree(tmp, ignore_errors=True)
+
+finish("Assembly expansion")
@@ -0,0 +1,79 @@
+"""
+Test: circuit_breaker state machine
+(opening on failure / slow-call rate, fast rejection, half-open probing).
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, CircuitOpen, provider_call, get_breaker
+from llm_limits import ProviderBusy
+from testing import check, finish
+
+circuit_breaker.CIRCUIT_OPEN_SECONDS = 0.2
+
+# Failure rate
+breaker = CircuitBreaker('test', slow_call_seconds=1.0)
+for _ in range(circuit_breaker.CIRCUIT_MIN_CALLS - 1):
+    breaker.allow()
+    breaker.record(False, 0.01)
+check("stays closed below the minimum number of calls", breaker.state == 'closed', breaker.state)
+breaker.allow()
+breaker.record(False, 0.01)
+check("opens on failure rate", breaker.state == 'open', breaker.state)
+check("refuses calls while open", not breaker.allow() and breaker.is_open())
+
+# Half-open: one probe, success closes
+time.sleep(0.25)
+check("cool-down over", not breaker.is_open())
+check("probe allowed", breaker.allow())
+check("second call refused during the probe", not breaker.allow())
+breaker.record(True, 0.01)
+check("successful probe closes", breaker.state == 'closed' and breaker.status()['window_calls'] == 0, breaker.status())
+
+# Slow calls
+breaker = CircuitBreaker('slow', slow_call_seconds=0.5)
+for _ in range(circuit_breaker.CIRCUIT_MIN_CALLS):
+    breaker.allow()
+    breaker.record(True, 2.0)
+check("opens on slow-call rate", breaker.state == 'open', breaker.status())
+
+# Failed probe opens again
+time.sleep(0.25)
+breaker.allow()
+breaker.record(False, 0.01)
+check("failed probe reopens", breaker.state == 'open', breaker.state)
+
+# provider_call context manager
+groq = get_breaker('groq')
+for _ in range(circuit_breaker.CIRCUIT_MIN_CALLS):
+    try:
+        with provider_call('groq'):
+            raise RuntimeError("429")
+    except RuntimeError:
+        pass
+start = time.perf_counter()
+try:
+    with provider_call('groq'):
+        pass
+    check("provider_call raises CircuitOpen", False)
+except CircuitOpen as e:
+    check("provider_call raises CircuitOpen", e.provider == 'groq' and time.perf_counter() - start < 0.01)
+
+time.sleep(0.25)
+try:
+    with provider_call('groq'):
+        raise ProviderBusy('groq')
+except ProviderBusy:
+    pass
+check("busy probe does not count", groq.state == 'half_open' and groq.allow(), groq.status())
+groq.cancel()
+
+with provider_call('groq') as call:
+    call.failed()
+check("handled failure reported with failed()", groq.state == 'open', groq.state)
+
+finish("Circuit breaker")
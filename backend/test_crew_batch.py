@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Test: /api/calculate-crew/batch (crew_calculator.py)
+A throwaway catalog and a BOQ mixing good and bad lines: good lines match
+/api/calculate-crew exactly, bad lines get their own error, and the
+totals add up the good lines.
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+tmp = tempfile.mkdtemp()
+DB = os.path.join(tmp, 'csi_data.db')
+os.environ['CSI_DB_PATH'] = DB
+os.environ['CATALOG_CHECK_INTERVAL'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from crew_members import CREW_SLOTS, create_crew_members_table
+from testing import check, finish
+
+crew_columns = ', '.join(f'crew_num_{i} TEXT, crew_desc_{i} TEXT' for i in range(1, CREW_SLOTS + 1))
+conn = sqlite3.connect(DB)
+conn.execute(f'''
+    CREATE TABLE csi_items (id INTEGER PRIMARY KEY AUTOINCREMENT, full_code TEXT, main_div_code TEXT,
+        main_div_name TEXT, sub_div1_code TEXT, sub_div1_name TEXT, sub_div2_code TEXT, sub_div2_name TEXT,
+        item_code TEXT, description TEXT, unit TEXT, daily_output REAL, man_hours REAL, equip_hours REAL,
+        crew_structure TEXT, {crew_columns})
+''')
+conn.executemany(
+    'INSERT INTO csi_items (full_code, main_div_code, description, unit, daily_output, man_hours, equip_hours, '
+    'crew_num_1, crew_desc_1, crew_num_2, crew_desc_2) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+    [('03 11 A', '03', 'Forms', 'm2', 20, 0.8, 0.1, '2', 'Carpenters', '1', 'Crane, 12 Ton'),
+     ('03 21 B', '03', 'Rebar', 'ton', 2, 16, None, '4', 'Rodmen', None, None),
+     ('03 99 Z', '03', 'No productivity', 'm3', None, None, None, None, None, None, None)]
+)
+create_crew_members_table(conn.cursor())
+conn.commit()
+conn.close()
+
+from app import app
+
+client = app.test_client()
+try:
+    lines = [
+        {'item_code': '03 11 A', 'quantity': 100, 'number_of_crews': 2},
+        {'item_code': '03 21 B', 'quantity': 5, 'hours_per_day': 10},
+        {'item_code': 'missing', 'quantity': 1},
+        {'item_code': '03 99 Z', 'quantity': 1},
+        {'item_code': ['03 11 A'], 'quantity': 1},
+        {'item_code': '03 11 A', 'quantity': -3},
+        {'item_code': '03 11 A', 'quantity': 'lots'},
+        'not an object',
+    ]
+    response = client.post('/api/calculate-crew/batch', json=lines)
+    check("batch answers 200", response.status_code == 200, response.status_code)
+    body = response.get_json()
+    results = body['results']
+    check("one result per line in order", [r['line'] for r in results] == list(range(len(lines))))
+    check("good and bad lines", [r['ok'] for r in results] == [True, True] + [False] * 6)
+    check("per-line errors", [(r['status'], r['error']) for r in results[2:5]] == [
+        (404, 'Item not found'), (400, 'Item does not have productivity data'), (400, 'Invalid input')
+    ], [(r['status'], r['error']) for r in results[2:]])
+
+    for index in (0, 1):
+        single = client.post('/api/calculate-crew', json=lines[index]).get_json()
+        check(f"line {index} matches /api/calculate-crew", results[index]['result'] == single)
+
+    # Forms: 100 m2 / (20 * 2) = 2.5 days, 80 man-hours; Rebar: 5 / 2 = 2.5 days, 80 man-hours
+    totals = body['totals']
+    counts = (totals['lines'], totals['succeeded'], totals['failed'])
+    hours = (totals['total_man_hours'], totals['total_equip_hours'])
+    days = (totals['total_days_sequential'], totals['max_days'])
+    check("line counts", counts == (8, 2, 6), counts)
+    check("summed hours", hours == (160.0, 10.0), hours)
+    check("sequential and parallel days", days == (5.0, 2.5), days)
+    check("crew hours by position", totals['crew_hours_by_position'] == {
+        'Carpenters': {'type': 'labor', 'total_hours': 40.0},
+        'Crane, 12 Ton': {'type': 'equipment', 'total_hours': 20.0},
+        'Rodmen': {'type': 'labor', 'total_hours': 100.0},
+    }, totals['crew_hours_by_position'])
+
+    check("empty batch rejected", client.post('/api/calculate-crew/batch', json=[]).status_code == 400)
+finally:
+    shutil.rmtree(tmp, ignore_errors=True)
+
+finish("Crew batch")
@@ -0,0 +1,108 @@
+"""
+Test: ollama_client against a local stub Ollama server
+(keep-alive reuse, retries, model TTL / negative cache / background refresh).
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ollama_client
+from ollama_client import OllamaClient, pick_model
+from testing import check, finish
+
+
+class StubState:
+    tags_requests = 0
+    chat_requests = 0
+    client_ports = set()
+    fail_next_chat = 0
+    models = [{"name": "nomic-embed-text"}, {"name": "llama3.2:latest"}]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        StubState.tags_requests += 1
+        StubState.client_ports.add(self.client_address[1])
+        self._send(200, {"models": StubState.models})
+
+    def do_POST(self):
+        StubState.chat_requests += 1
+        StubState.client_ports.add(self.client_address[1])
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if StubState.fail_next_chat:
+            StubState.fail_next_chat -= 1
+            self._send(503, {"error": "loading model"})
+            return
+        self._send(200, {"message": {"role": "assistant", "content": f"hi from {body['model']}"}, "done": True})
+
+    def _send(self, status, data):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+base = f"http://127.0.0.1:{server.server_address[1]}"
+
+# Model choice
+check("pick_model prefers the default", pick_model(["mistral", "llama3.2"], "llama3.2") == "llama3.2")
+check("pick_model skips embedders", pick_model(["nomic-embed-text", "phi3"], "llama3.2") == "phi3")
+check("pick_model with nothing usable", pick_model(["nomic-embed-text"], "llama3.2") is None)
+
+# Discovery is cached
+client = OllamaClient(base, "llama3.2")
+models = [client.get_model() for _ in range(20)]
+check("discovered model", models[0] == "llama3.2:latest", models[0])
+check("tags asked once for 20 lookups", StubState.tags_requests == 1, StubState.tags_requests)
+
+# Keep-alive: chats reuse the pooled connection
+StubState.client_ports.clear()
+replies = [client.chat([{"role": "user", "content": "hi"}]).json()['message']['content'] for _ in range(10)]
+check("chat replies", replies[0] == "hi from llama3.2:latest", replies[0])
+check("10 chats over one connection", len(StubState.client_ports) == 1, StubState.client_ports)
+
+# Retries on 503
+StubState.fail_next_chat = 1
+res = client.chat([{"role": "user", "content": "hi"}])
+check("503 retried", res.status_code == 200, res.status_code)
+
+# Stale model: answered from cache, refreshed in the background
+ollama_client.OLLAMA_MODEL_TTL = 0.2
+client = OllamaClient(base, "llama3.2")
+client.get_model()
+before = StubState.tags_requests
+StubState.models = [{"name": "mistral:7b"}]
+time.sleep(0.3)
+start = time.perf_counter()
+stale = client.get_model()
+check("stale model returned without waiting", stale == "llama3.2:latest" and time.perf_counter() - start < 0.05, stale)
+time.sleep(0.2)
+check("background refresh picked up the new model", client.get_model() == "mistral:7b", client.get_model())
+check("one refresh request", StubState.tags_requests == before + 1, StubState.tags_requests - before)
+
+# Negative cache: an unreachable server is asked once per OLLAMA_MODEL_NEGATIVE_TTL
+server.shutdown()
+server.server_close()
+ollama_client.OLLAMA_MODEL_NEGATIVE_TTL = 60
+down = OllamaClient(base, "llama3.2")
+start = time.perf_counter()
+models = [down.get_model() for _ in range(10)]
+stats = down.stats()
+check("default model while the server is down", set(models) == {"llama3.2"}, models)
+check("failed discovery not repeated", stats['discoveries'] == 1, stats)
+
+finish("Ollama client")
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Test: planning engine (plan_templates.py + planning.py)
+Checks a few plans against the values of the former plan_* functions and
+that a template added as database rows is planned without code changes.
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from plan_templates import create_plan_tables, default_plan_rows
+from planning import PlanBook, build_plan, detect_scope
+from testing import check, finish
+
+# Former plan_columns(50.0, 'en')
+plan = build_plan('columns', 50.0, 'en')
+check("columns summary", plan['text'] == (
+    "Generated plan for RC Columns:\n- Quantity: 50.0 m3\n- Formwork: 125.0 m2\n"
+    "- Rebar (150kg/m3): 7.50 ton\n- Duration: 11 days"), plan['text'])
+check("columns rows", [(r['task'], r['qty'], r['duration']) for r in plan['table']['rows']] == [
+    ('Column Formwork', '125.0', '3 day'), ('Column Rebar', '7.50', '5 day'),
+    ('Column Concrete Pour', '50.0', '1 day'), ('Form Stripping', '125.0', '2 day')])
+
+# Former plan_raft_foundation(300.0, 'ar'): doubled pour crew
+plan = build_plan('raft_foundation', 300.0, 'ar')
+pour = plan['table']['rows'][3]
+check("raft pour crew", pour['crew'] == "2x فريق صب 6 عمّال" and pour['duration'] == "2 يوم", pour)
+check("raft total", plan['text'].endswith("- المدة الزمنية: 35 يوم"), plan['text'].splitlines()[-1])
+
+# Former plan_pile_foundation(int(24.9), 'en'): whole piles, pour duration by pile count
+plan = build_plan('piles', 24.9, 'en')
+check("piles quantity", plan['table']['rows'][0]['qty'] == '24' and plan['table']['rows'][2]['qty'] == '48.0')
+check("piles total", plan['text'].endswith("- Duration: 18 days"), plan['text'].splitlines()[-1])
+
+# Scope detection keeps the old keyword order
+check("slab before column", detect_scope("slab on columns") == ('slabs', 'm3'))
+check("piles unit", detect_scope("خوازيق 16") == ('piles', 'piles'))
+check("unknown scope", detect_scope("hello") == ('unknown', None))
+check("unknown scope has no plan", build_plan('unknown', 10, 'en') is None)
+
+# A new element type is only rows
+rows = default_plan_rows()
+rows['plan_templates'].append({
+    'scope': 'walls', 'match_order': 0, 'keywords': 'wall,حائط', 'quantity_unit': 'm3', 'integer_quantity': 0,
+    'text_ar': "حوائط {qty} م³ - {total_days} يوم", 'text_en': "Walls {qty} m3: {formwork_area:.1f} m2, {total_days} days",
+    'notes_ar': None, 'notes_en': "Both faces formed.",
+})
+rows['plan_quantities'].append({'scope': 'walls', 'name': 'formwork_area', 'ratio': 10.0})
+rows['plan_steps'].append({
+    'scope': 'walls', 'seq': 1, 'task_ar': "نجارة حوائط", 'task_en': "Wall Formwork", 'quantity': 'formwork_area',
+    'qty_format': '.1f', 'unit_ar': 'م²', 'unit_en': 'm2', 'activity': 'formwork', 'crew_ar': None, 'crew_en': None,
+    'equipment_ar': None, 'equipment_en': None, 'crew_prefix': None, 'duration_quantity': None,
+    'rate_name': 'carpentry_m2_per_day_per_carpenter', 'rate_factor': 4, 'fixed_days': None,
+})
+book = PlanBook(rows, 'test')
+plan = book.plans[('walls', 'en')].build(12.0)
+check("new template planned", plan['text'] == "Walls 12.0 m3: 120.0 m2, 2 days", plan['text'])
+check("new template detected first", book.detect_scope("concrete wall on slab") == 'walls')
+
+# A broken template is skipped, the others still plan
+rows['plan_steps'][-1]['rate_name'] = 'no_such_rate'
+book = PlanBook(rows, 'test')
+check("broken template skipped", ('walls', 'en') not in book.plans and ('slabs', 'en') in book.plans)
+
+# Seeding: once, and not over edited rows
+tmp = tempfile.mkdtemp()
+try:
+    path = os.path.join(tmp, 'plans.db')
+    conn = sqlite3.connect(path)
+    seeded = create_plan_tables(conn.cursor())
+    conn.execute("UPDATE plan_rates SET value = 30 WHERE name = 'carpentry_m2_per_day_per_carpenter'")
+    reseeded = create_plan_tables(conn.cursor())
+    value = conn.execute("SELECT value FROM plan_rates WHERE name = 'carpentry_m2_per_day_per_carpenter'").fetchone()[0]
+    conn.close()
+    check("tables seeded once", seeded > 0 and reseeded == 0, (seeded, reseeded))
+    check("edited rate kept", value == 30, value)
+finally:
+    shutil.rmtree(tmp)
+
+finish("Planning")
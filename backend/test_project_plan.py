@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Test: /api/project-plan (project_plan.py)
+A throwaway catalog with one footing assembly: invalid requests get a
+JSON error with the right status, and two assemblies plus a BOQ item
+sharing a carpenter limit are leveled with their links kept.
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+tmp = tempfile.mkdtemp()
+DB = os.path.join(tmp, 'csi_data.db')
+os.environ['CSI_DB_PATH'] = DB
+os.environ['CATALOG_CHECK_INTERVAL'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from crew_members import CREW_SLOTS, create_crew_members_table
+from testing import check, finish
+
+crew_columns = ', '.join(f'crew_num_{i} TEXT, crew_desc_{i} TEXT' for i in range(1, CREW_SLOTS + 1))
+conn = sqlite3.connect(DB)
+conn.execute(f'''
+    CREATE TABLE csi_items (id INTEGER PRIMARY KEY AUTOINCREMENT, full_code TEXT, main_div_code TEXT,
+        main_div_name TEXT, sub_div1_code TEXT, sub_div1_name TEXT, sub_div2_code TEXT, sub_div2_name TEXT,
+        item_code TEXT, description TEXT, unit TEXT, daily_output REAL, man_hours REAL, equip_hours REAL,
+        crew_structure TEXT, {crew_columns})
+''')
+conn.executemany(
+    'INSERT INTO csi_items (full_code, main_div_code, description, unit, daily_output, man_hours, '
+    'crew_num_1, crew_desc_1, crew_num_2, crew_desc_2) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+    [('03 11 A', '03', 'Forms', 'm2', 20, 0.8, '2', 'Carpenters', None, None),
+     ('03 21 B', '03', 'Rebar', 'ton', 2, 16, '4', 'Rodmen', None, None),
+     ('03 31 C', '03', 'Concrete', 'm3', 40, 0.6, '3', 'Laborers', '1', 'Concrete Pump')]
+)
+create_crew_members_table(conn.cursor())
+with open(os.path.join(ROOT, 'database', 'schema_v3.sql'), encoding='utf-8') as f:
+    conn.executescript(f.read())
+conn.executemany(
+    'INSERT INTO assembly_components (assembly_id, csi_full_code, ratio_to_primary, ratio_type, component_role_en) '
+    'VALUES (1, ?, ?, ?, ?)',
+    [('03 11 A', 12.0, 'area', 'Formwork'), ('03 21 B', 0.1, 'weight', 'Rebar'),
+     ('03 31 C', 1.0, 'volume', 'Pouring'), ('99 99 Z', 1.0, 'count', 'Missing')]
+)
+conn.commit()
+conn.close()
+
+import project_plan
+from app import app
+
+client = app.test_client()
+
+
+def post(body):
+    if isinstance(body, str):
+        return client.post('/api/project-plan', data=body, content_type='application/json')
+    return client.post('/api/project-plan', json=body)
+
+
+item = {'id': 'T1', 'item_code': '03 31 C', 'quantity': 80}
+try:
+    # Invalid requests: JSON error, never a 500
+    for name, body, status in [
+        ("not an object", [], 400),
+        ("nothing to plan", {}, 400),
+        ("assemblies not a list", {'assemblies': {}}, 400),
+        ("infinite assembly_id", '{"assemblies": [{"assembly_id": Infinity, "quantity": 1}]}', 400),
+        ("unknown assembly", {'assemblies': [{'assembly_id': 42, 'quantity': 1}]}, 404),
+        ("unknown item", {'items': [{'item_code': 'nope', 'quantity': 1}]}, 404),
+        ("negative quantity", {'items': [dict(item, quantity=-1)]}, 400),
+        ("NaN quantity", '{"items": [{"item_code": "03 31 C", "quantity": NaN}]}', 400),
+        ("infinite crews", '{"items": [{"item_code": "03 31 C", "quantity": 1, "number_of_crews": Infinity}]}', 400),
+        ("non-string link type", {'items': [item], 'dependencies': [{'from': 'T1', 'to': 'T1', 'type': 5}]}, 400),
+        ("unknown link type", {'items': [item], 'dependencies': [{'from': 'T1', 'to': 'T1', 'type': 'XX'}]}, 400),
+        ("link to unknown activity", {'items': [item], 'dependencies': [{'from': 'T1', 'to': 'X9'}]}, 400),
+        ("dependency cycle", {'items': [item, dict(item, id='T2')],
+                              'dependencies': [{'from': 'T1', 'to': 'T2'}, {'from': 'T2', 'to': 'T1'}]}, 400),
+        ("duplicate entry ids", {'items': [item, item]}, 400),
+        ("project too long", {'items': [dict(item, quantity=1e9)]}, 400),
+        ("limits not an object", {'items': [item], 'resource_limits': [1]}, 400),
+    ]:
+        response = post(body)
+        error = (response.get_json(silent=True) or {}).get('error')
+        check(f"{name} -> {status}", response.status_code == status and bool(error), (response.status_code, error))
+
+    saved = project_plan.MAX_PLAN_LINKS
+    project_plan.MAX_PLAN_LINKS = 5
+    response = post({'assemblies': [{'id': 'F1', 'assembly_id': 1, 'quantity': 10}], 'items': [item],
+                     'dependencies': [{'from': 'F1', 'to': 'T1'}] * 4})
+    project_plan.MAX_PLAN_LINKS = saved
+    check("too many links -> 400", response.status_code == 400, response.get_json())
+
+    # Two footings and a slab item; carpenters limited to one forms crew at a time.
+    # Each footing: forms 120 m2 / 20 = 6 d -> rebar 1 t / 2 = 0.5 d -> pour 10 m3 / 40 = 0.25 d
+    response = post({
+        'assemblies': [{'id': 'F1', 'assembly_id': 1, 'quantity': 10}, {'id': 'F2', 'assembly_id': 1, 'quantity': 10}],
+        'items': [item],
+        'dependencies': [{'from': 'F1', 'to': 'T1', 'type': 'FS'}],
+        'resource_limits': {'Carpenters': 2},
+    })
+    plan = response.get_json()
+    check("leveled plan answers 200", response.status_code == 200, response.status_code)
+    rows = {row['id']: row for row in plan['activities']}
+    starts = {i: (rows[i]['start'], rows[i]['finish']) for i in ('F1/1', 'F1/3', 'F2/1', 'F2/3', 'T1')}
+    check("CPM duration", plan['cpm_duration'] == 8.75, plan['cpm_duration'])
+    check("second forms wait for the carpenters", plan['leveled'] and starts['F2/1'] == (6.0, 12.0), starts)
+    check("entry link kept", starts['T1'] == (6.75, 8.75), starts)
+    check("leveled duration", plan['project_duration'] == 12.75, plan['project_duration'])
+    check("entry dates", [(e['id'], e['activities'], e['start'], e['finish']) for e in plan['entries']] == [
+        ('F1', 3, 0.0, 6.75), ('F2', 3, 6.0, 12.75), ('T1', 1, 6.75, 8.75)], plan['entries'])
+    check("missing component reported", len(plan['warnings']) == 2 and '99 99 Z' in plan['warnings'][0],
+          plan['warnings'])
+
+    histogram = plan['histogram']
+    check("carpenter peak within the limit", histogram['peaks']['Carpenters'] == 2, histogram['peaks'])
+    check("equipment kept apart", list(histogram['equipment']) == ['Concrete Pump'], list(histogram['equipment']))
+    check("one daily total per day", len(histogram['total_labor']) == histogram['days'] == 13, histogram['days'])
+finally:
+    shutil.rmtree(tmp, ignore_errors=True)
+
+finish("Project plan")
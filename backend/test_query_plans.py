@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Test: query plans (check_query_plans.py)
+Every app.py statement is found, and on a csi_items table with the
+schema_v6 indexes none of them scans the table unless allowed.
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from check_query_plans import ALLOWED_SCANS, app_statements, check_query_plans
+from testing import check, finish
+
+tmp = tempfile.mkdtemp()
+DB = os.path.join(tmp, 'csi_data.db')
+try:
+    conn = sqlite3.connect(DB)
+    conn.executescript('''
+        CREATE TABLE csi_items (id INTEGER PRIMARY KEY AUTOINCREMENT, full_code TEXT, main_div_code TEXT,
+            main_div_name TEXT, sub_div1_code TEXT, sub_div1_name TEXT, sub_div2_code TEXT, sub_div2_name TEXT,
+            item_code TEXT, description TEXT, unit TEXT, daily_output REAL, man_hours REAL, equip_hours REAL,
+            crew_structure TEXT);
+        CREATE INDEX idx_main_div ON csi_items(main_div_code);
+        CREATE INDEX idx_full_code ON csi_items(full_code);
+    ''')
+    conn.executemany(
+        'INSERT INTO csi_items (full_code, main_div_code, sub_div1_code, sub_div2_code, item_code, description) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        [(f"0{i % 9 + 1}{i % 7} {i % 50:03d}-{i}", f"0{i % 9 + 1}", f"0{i % 9 + 1}{i % 7}",
+          f"0{i % 9 + 1}{i % 7} {i % 50:03d}", str(i), f"Item {i}") for i in range(2000)]
+    )
+    conn.commit()
+
+    statements, problems = app_statements()
+    check("app.py statements found", len(statements) >= 10 and not problems, (len(statements), problems))
+    check("allowed scans are app.py statements", set(ALLOWED_SCANS) <= {sql for _, _, sql in statements},
+          set(ALLOWED_SCANS) - {sql for _, _, sql in statements})
+
+    before = check_query_plans(DB)
+    check("prefix LIKE scans without the NOCASE index", any("LIKE '03" in p for p in before), len(before))
+
+    with open(os.path.join(ROOT, 'database', 'schema_v6.sql'), encoding='utf-8') as f:
+        conn.executescript(f.read())
+    conn.close()
+    after = check_query_plans(DB)
+    check("no unexpected scans with schema_v6", after == [], after)
+finally:
+    shutil.rmtree(tmp, ignore_errors=True)
+
+finish("Query plan")
@@ -0,0 +1,59 @@
+"""
+Test: NumPy pre-pass of rerank_candidates gives the same rankings as the
+dict (reference) path, for normal and whole-division candidate lists.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from csi_reranker import CANDIDATE_COLUMNS, rerank_candidates, retrieve_candidates
+from csi_reranker_numpy import NUMPY_AVAILABLE
+from catalog import get_catalog
+from db_config import db_connection
+
+test_queries = [
+    ("isolated footing formwork", None),
+    ("raft foundation concrete 03", "CUM"),
+    ("column reinforcement rodman", None),
+    ("cement plaster SQM", "SQM"),
+    ("gypsum plaster walls", "M2"),
+    ("ceramic tiles carpenter", None),
+    ("033 172", None),
+    ("لبشة خرسانة", None),
+    ("محارة", "SQM"),
+    ("", None),
+]
+
+if not NUMPY_AVAILABLE:
+    print("numpy not installed - nothing to compare")
+    sys.exit(0)
+
+get_catalog()
+columns = ", ".join(f"{column} AS {alias}" for column, alias in CANDIDATE_COLUMNS)
+
+with db_connection() as conn:
+    divisions = [row[0] for row in conn.execute(
+        "SELECT DISTINCT main_div_code FROM csi_items WHERE main_div_code IS NOT NULL LIMIT 4")]
+    candidate_lists = []
+    for query, unit in test_queries:
+        candidate_lists.append((query, unit, retrieve_candidates(conn, query, 300)))
+        for division in divisions:
+            rows = conn.execute(f"SELECT {columns} FROM csi_items WHERE main_div_code = ?", (division,))
+            candidate_lists.append((query, unit, [dict(row) for row in rows]))
+
+failures = 0
+for query, unit, candidates in candidate_lists:
+    for top_k in (1, 7, 25):
+        reference = rerank_candidates(query, candidates, top_k=top_k, query_unit=unit, vectorized=False)
+        fast = rerank_candidates(query, candidates, top_k=top_k, query_unit=unit, vectorized=True)
+        ref_ids = [(r["id"], r["Score"]) for r in reference["results"]]
+        fast_ids = [(r["id"], r["Score"]) for r in fast["results"]]
+        if ref_ids != fast_ids:
+            failures += 1
+            print(f"[FAIL] '{query}' unit={unit} top_k={top_k} candidates={len(candidates)}")
+            print(f"   reference: {ref_ids}")
+            print(f"   numpy:     {fast_ids}")
+
+print(f"{len(candidate_lists) * 3} rankings compared, {failures} differences")
+assert failures == 0, "NumPy pre-pass changed the ranking"
+print("✅ NumPy and dict rankings are identical")
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Test: CPM scheduler (scheduler.py)
+Textbook network dates and floats, every link type, resource leveling and
+a few thousand activities with precedence and capacity verified.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scheduler import Activity, Link, ScheduleError, chain_links, schedule
+from testing import check, finish
+
+
+def times(plan):
+    return {a.id: (a.start, a.finish) for a in plan.activities}
+
+
+# A(3) -> B(2), C(4) -> D(1): critical path A-C-D, B floats 2 days
+plan = schedule(
+    [Activity('A', 3), Activity('B', 2), Activity('C', 4), Activity('D', 1)],
+    [Link('A', 'B'), Link('A', 'C'), Link('B', 'D'), Link('C', 'D')],
+)
+b = plan.activities[1]
+check("project duration", plan.duration == 8, plan.duration)
+check("critical path", plan.critical_path == ['A', 'C', 'D'], plan.critical_path)
+check("float of B", (b.id, b.es, b.ls, b.total_float, b.free_float) == ('B', 3, 5, 2, 2),
+      (b.id, b.es, b.ls, b.total_float, b.free_float))
+
+# SS, FF and SF links with lags
+plan = schedule(
+    [Activity('A', 3), Activity('C', 4), Activity('E', 5), Activity('F', 2), Activity('G', 3)],
+    [Link('A', 'C'), Link('A', 'E', 'SS', 2), Link('C', 'F', 'ff', 1), Link('A', 'G', 'SF', 5)],
+)
+check("link types", times(plan) == {'A': (0, 3), 'C': (3, 7), 'E': (2, 7), 'F': (6, 8), 'G': (2, 5)}, times(plan))
+check("SS successor float", plan.activities[2].total_float == 1, plan.activities[2].total_float)
+
+# Leads (negative lags) never start before day 0
+plan = schedule([Activity('A', 2), Activity('B', 3)], [Link('A', 'B', 'FS', -5)])
+check("lead clamps at day 0", times(plan)['B'] == (0, 3), times(plan))
+
+# Default chain keeps the old summed duration
+plan = schedule([Activity(i, d) for i, d in enumerate([2.5, 1.25, 4])], chain_links([0, 1, 2]))
+check("chain sums durations", plan.duration == 7.75, plan.duration)
+
+# Resource limits: two carpenter crews that cannot work at once
+activities = lambda: [Activity('X', 4, demands={'Carpenter': 2}), Activity('Y', 3, demands={'Carpenter': 2})]
+plan = schedule(activities(), resource_limits={'Carpenter': 2})
+check("leveled in priority order", plan.leveled and times(plan) == {'X': (0, 4), 'Y': (4, 7)}, times(plan))
+check("CPM dates kept when leveled", plan.cpm_duration == 4 and plan.duration == 7)
+plan = schedule(activities(), resource_limits={'Carpenter': 4})
+check("enough capacity runs in parallel", plan.duration == 4, times(plan))
+plan = schedule([Activity('Z', 2, demands={'Carpenter': 5}), Activity('W', 1, demands={'Carpenter': 1})],
+                resource_limits={'Carpenter': 2})
+check("demand above the limit runs alone", times(plan) == {'Z': (0, 2), 'W': (2, 3)}, times(plan))
+
+# Daily histogram runs: part days count their fraction, idle days are left out
+plan = schedule([Activity('a', 2.5, demands={'Carpenter': 2}), Activity('b', 0.25, demands={'Carpenter': 1}),
+                 Activity('c', 1, demands={'Crane': 1}), Activity('d', 10, demands={'Carpenter': 1})],
+                [Link('a', 'c')])
+usage = plan.daily_usage()
+check("daily usage runs", usage == {'Carpenter': [(0, 1, 3.25), (1, 2, 3.0), (2, 3, 2.0), (3, 10, 1.0)],
+                                    'Crane': [(2, 4, 0.5)]}, usage)
+
+# Errors
+for name, build in [
+    ("cycle", lambda: schedule([Activity(1, 1), Activity(2, 1)], [Link(1, 2), Link(2, 1)])),
+    ("unknown activity", lambda: schedule([Activity(1, 1)], [Link(1, 2)])),
+    ("unknown link type", lambda: Link(1, 2, 'XY')),
+    ("negative duration", lambda: Activity(1, -1)),
+]:
+    try:
+        build()
+        check(f"{name} rejected", False)
+    except ScheduleError:
+        check(f"{name} rejected", True)
+
+# Thousands of activities: leveled schedule respects links and limits
+rng = random.Random(7)
+trades = ['Carpenter', 'Rodman', 'Laborer', 'Crane']
+limits = {'Carpenter': 6, 'Rodman': 4, 'Laborer': 10, 'Crane': 1}
+n = 5000
+activities = [
+    Activity(i, rng.uniform(0.5, 5), demands={rng.choice(trades): rng.choice([1, 2, 3])})
+    for i in range(n)
+]
+links = [Link(rng.randrange(0, i), i, rng.choice(['FS', 'FS', 'SS', 'FF']), rng.choice([0, 0, 1]))
+         for i in range(1, n) for _ in range(2)]
+started = time.perf_counter()
+plan = schedule(activities, links, limits)
+elapsed = time.perf_counter() - started
+check(f"{n} activities scheduled", len(plan.activities) == n, f"{elapsed * 1000:.0f} ms")
+
+by_id = {a.id: a for a in plan.activities}
+violations = 0
+for link in links:
+    pred, succ = by_id[link.predecessor], by_id[link.successor]
+    bound = {'FS': pred.finish + link.lag, 'SS': pred.start + link.lag,
+             'FF': pred.finish + link.lag - succ.duration}[link.type]
+    if succ.start < bound - 1e-6:
+        violations += 1
+check("links respected", violations == 0, violations)
+
+# Sweep starts and finishes (finishes first at equal times)
+events = []
+for a in plan.activities:
+    for r, q in a.demands.items():
+        q = min(q, limits[r])
+        events.append((a.start, 1, r, q))
+        events.append((a.finish, 0, r, -q))
+use = dict.fromkeys(limits, 0.0)
+overloads = 0
+for _, _, r, q in sorted(events):
+    use[r] += q
+    overloads += use[r] > limits[r] + 1e-6
+check("limits respected", overloads == 0, overloads)
+check("leveling only delays", all(a.start >= a.es - 1e-6 for a in plan.activities))
+
+finish("Scheduler")
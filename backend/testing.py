@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+Shared helpers for the script-style backend tests (python test_*.py):
+check() prints one ✅/❌ line, finish() prints the summary and exits 1
+when a check failed.
+"""
+import sys
+
+failures = []
+
+
+def check(name, condition, detail=''):
+    print(f"{'✅' if condition else '❌'} {name}{' - ' + str(detail) if detail else ''}")
+    if not condition:
+        failures.append(name)
+
+
+def finish(title):
+    print()
+    if failures:
+        print(f"❌ {len(failures)} check(s) failed")
+        sys.exit(1)
+    print(f"✅ {title} checks passed")
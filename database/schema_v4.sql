@@ -0,0 +1,19 @@
+-- Schema V4: Component scheduling for assemblies (backend/scheduler.py)
+
+-- Precedence links between the components of one assembly.
+-- dep_type: 'FS' (finish-to-start), 'SS', 'FF' or 'SF'; lag_days may be negative (lead).
+-- Assemblies without rows here are scheduled as a finish-to-start chain in component order.
+CREATE TABLE IF NOT EXISTS assembly_dependencies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    assembly_id INTEGER NOT NULL,
+    component_id INTEGER NOT NULL,   -- successor (assembly_components.id)
+    predecessor_id INTEGER NOT NULL, -- predecessor (assembly_components.id)
+    dep_type TEXT NOT NULL DEFAULT 'FS',
+    lag_days REAL NOT NULL DEFAULT 0,
+    FOREIGN KEY (assembly_id) REFERENCES assemblies (id),
+    FOREIGN KEY (component_id) REFERENCES assembly_components (id),
+    FOREIGN KEY (predecessor_id) REFERENCES assembly_components (id)
+);
+
+-- assembly_components.crew_count (crews working the component in parallel, default 1)
+-- is added by apply_schema_v4.py, since ALTER TABLE ADD COLUMN cannot be repeated.
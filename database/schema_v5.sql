@@ -0,0 +1,19 @@
+-- Schema V5: Assembly expansion (backend/assembly_expansion.py)
+-- Requires schema_v3.sql and schema_v4.sql (assembly_components.crew_count).
+
+-- Components of an assembly are always read by assembly_id
+CREATE INDEX IF NOT EXISTS idx_assembly_components_assembly ON assembly_components(assembly_id, id);
+
+-- Component -> CSI item lookups (also created by update_database_from_excel.py)
+CREATE INDEX IF NOT EXISTS idx_full_code ON csi_items(full_code);
+
+-- One row per component with only the csi_items columns the planners read.
+-- Each component takes the first csi_items row of its full_code (lowest id);
+-- a missing item leaves full_code and the item columns NULL.
+DROP VIEW IF EXISTS assembly_expansion;
+CREATE VIEW assembly_expansion AS
+    SELECT ac.assembly_id, ac.id AS component_id, ac.csi_full_code, ac.ratio_to_primary, ac.ratio_type,
+           ac.component_role_en, ac.component_role_ar, ac.crew_count AS crew_count,
+           ci.full_code, ci.description, ci.unit, ci.daily_output, ci.crew_structure
+    FROM assembly_components ac
+    LEFT JOIN csi_items ci ON ci.id = (SELECT MIN(id) FROM csi_items WHERE full_code = ac.csi_full_code);
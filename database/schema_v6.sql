@@ -0,0 +1,23 @@
+-- Schema V6: csi_items indexes for the hot queries
+-- The same indexes are created by update_database_from_excel.py after
+-- each import; backend/check_query_plans.py verifies the query plans.
+
+-- Exact lookups by code
+CREATE INDEX IF NOT EXISTS idx_full_code ON csi_items(full_code);
+CREATE INDEX IF NOT EXISTS idx_item ON csi_items(item_code);
+CREATE INDEX IF NOT EXISTS idx_sub2 ON csi_items(sub_div2_code);
+
+-- Prefix searches (full_code LIKE '03%'): LIKE is case-insensitive, so
+-- SQLite only turns it into an index range on a NOCASE index
+CREATE INDEX IF NOT EXISTS idx_full_code_nocase ON csi_items(full_code COLLATE NOCASE);
+
+-- Hierarchy filters and listings, covering (codes with their names)
+DROP INDEX IF EXISTS idx_main_div;
+DROP INDEX IF EXISTS idx_sub1;
+CREATE INDEX IF NOT EXISTS idx_hierarchy ON csi_items(
+    main_div_code, sub_div1_code, sub_div1_name, sub_div2_code, sub_div2_name, main_div_name
+);
+CREATE INDEX IF NOT EXISTS idx_sub1_hierarchy ON csi_items(sub_div1_code, sub_div2_code, sub_div2_name);
+
+-- Planner statistics for the new indexes
+ANALYZE csi_items;
@@ -96,7 +96,7 @@ class QuickSearchManager {
     async performSearch(query) {
         try {
             // Use existing /api/items endpoint with query parameter
-            const response = await fetch(`${this.API_BASE}/items?q=${encodeURIComponent(query)}&limit=15`);
+            const response = await fetch(`${this.API_BASE}/items?q=${encodeURIComponent(query)}&limit=15&mode=fts`);
             
             if (!response.ok) {
                 throw new Error(`HTTP ${response.status}`);
@@ -5,13 +5,79 @@ Reads from CSI.xlsm and updates database/csi_data.db
 import pandas as pd
 import sqlite3
 import os
+import sys
 from datetime import datetime
 
+# Crew parsing rules are shared with the backend catalog
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from crew_members import create_crew_members_table
+from plan_templates import create_plan_tables
+from check_query_plans import check_query_plans
+
 def log(message):
     """Print timestamped log message"""
     timestamp = datetime.now().strftime("%H:%M:%S")
     print(f"[{timestamp}] {message}")
 
+# csi_items indexes (same as database/schema_v6.sql)
+CSI_INDEXES = [
+    'CREATE INDEX idx_full_code ON csi_items(full_code)',
+    'CREATE INDEX idx_item ON csi_items(item_code)',
+    'CREATE INDEX idx_sub2 ON csi_items(sub_div2_code)',
+    # full_code LIKE '03%' can only use a NOCASE index
+    'CREATE INDEX idx_full_code_nocase ON csi_items(full_code COLLATE NOCASE)',
+    # Hierarchy filters and listings, covering
+    'CREATE INDEX idx_hierarchy ON csi_items('
+    'main_div_code, sub_div1_code, sub_div1_name, sub_div2_code, sub_div2_name, main_div_name)',
+    'CREATE INDEX idx_sub1_hierarchy ON csi_items(sub_div1_code, sub_div2_code, sub_div2_name)',
+]
+
+def create_csi_indexes(cursor):
+    """Create the csi_items indexes and refresh the planner statistics."""
+    for statement in CSI_INDEXES:
+        cursor.execute(statement)
+    cursor.execute('ANALYZE csi_items')
+
+def create_fts_index(cursor):
+    """
+    Build the FTS5 full-text index over csi_items (full_code, description).
+    External-content table + triggers keep it in sync with csi_items.
+    """
+    cursor.execute('DROP TABLE IF EXISTS csi_items_fts')
+    cursor.execute('''
+    CREATE VIRTUAL TABLE csi_items_fts USING fts5(
+        full_code,
+        description,
+        content='csi_items',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    ''')
+    cursor.execute("INSERT INTO csi_items_fts(csi_items_fts) VALUES('rebuild')")
+
+    cursor.execute('''
+    CREATE TRIGGER csi_items_fts_ai AFTER INSERT ON csi_items BEGIN
+        INSERT INTO csi_items_fts(rowid, full_code, description)
+        VALUES (new.id, new.full_code, new.description);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER csi_items_fts_ad AFTER DELETE ON csi_items BEGIN
+        INSERT INTO csi_items_fts(csi_items_fts, rowid, full_code, description)
+        VALUES ('delete', old.id, old.full_code, old.description);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER csi_items_fts_au AFTER UPDATE ON csi_items BEGIN
+        INSERT INTO csi_items_fts(csi_items_fts, rowid, full_code, description)
+        VALUES ('delete', old.id, old.full_code, old.description);
+        INSERT INTO csi_items_fts(rowid, full_code, description)
+        VALUES (new.id, new.full_code, new.description);
+    END
+    ''')
+    cursor.execute("INSERT INTO csi_items_fts(csi_items_fts) VALUES('optimize')")
+
 def update_database():
     """Main function to update database from Excel"""
     
@@ -64,14 +130,27 @@ def update_database():
     # Ensure database directory exists
     os.makedirs('database', exist_ok=True)
     
-    log(f"Connecting to database: {DB_PATH}")
+    # Build into a copy and swap it in only once the query plans pass
+    BUILD_PATH = DB_PATH + '.tmp'
+    if os.path.exists(BUILD_PATH):
+        os.remove(BUILD_PATH)
+    
+    log(f"Building database: {BUILD_PATH}")
     
+    conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = sqlite3.connect(BUILD_PATH)
         cursor = conn.cursor()
         
+        # Start from the current database so the other tables (assemblies, edited plan templates) are kept
+        if os.path.exists(DB_PATH):
+            source = sqlite3.connect(DB_PATH)
+            source.backup(conn)
+            source.close()
+        
         # Drop and recreate table
         log("Recreating database table...")
+        cursor.execute('DROP TABLE IF EXISTS csi_items_fts')
         cursor.execute('DROP TABLE IF EXISTS csi_items')
         
         cursor.execute('''
@@ -120,14 +199,6 @@ def update_database():
         )
         ''')
         
-        # Create indexes for faster querying
-        log("Creating database indexes...")
-        cursor.execute('CREATE INDEX idx_main_div ON csi_items(main_div_code)')
-        cursor.execute('CREATE INDEX idx_sub1 ON csi_items(sub_div1_code)')
-        cursor.execute('CREATE INDEX idx_sub2 ON csi_items(sub_div2_code)')
-        cursor.execute('CREATE INDEX idx_item ON csi_items(item_code)')
-        cursor.execute('CREATE INDEX idx_full_code ON csi_items(full_code)')
-        
         # Insert data
         log("Inserting data into database...")
         inserted = 0
@@ -227,6 +298,23 @@ def update_database():
                 skipped += 1
                 continue
         
+        # Indexes for the hot queries (built once after the bulk insert)
+        log("Creating database indexes...")
+        create_csi_indexes(cursor)
+        
+        # Crew members parsed once into their own table
+        log("Building crew members table...")
+        crew_count = create_crew_members_table(cursor)
+        log(f"[OK] Crew members: {crew_count}")
+        
+        # Planning templates for /api/ai (seeded once, edits are kept)
+        plan_rows = create_plan_tables(cursor)
+        log(f"[OK] Plan template rows seeded: {plan_rows}")
+        
+        # Full-text search index (bulk-built once, then maintained by triggers)
+        log("Building full-text search index...")
+        create_fts_index(cursor)
+        
         # Commit changes
         conn.commit()
         
@@ -247,6 +335,20 @@ def update_database():
         
         conn.close()
         
+        # Every app.py query must search by index
+        log("Checking query plans...")
+        problems = check_query_plans(BUILD_PATH)
+        if problems:
+            for problem in problems:
+                log(f"ERROR: {problem}")
+            log(f"{DB_PATH} left unchanged")
+            os.remove(BUILD_PATH)
+            return False
+        log("[OK] Query plans use indexes")
+        
+        os.replace(BUILD_PATH, DB_PATH)
+        log(f"[OK] Database replaced: {DB_PATH}")
+        
         print("=" * 100)
         log("SUCCESS: Database updated from CSI.xlsm")
         log("You can now restart the Flask server to use the new data")
@@ -256,6 +358,10 @@ def update_database():
         
     except Exception as e:
         log(f"ERROR updating database: {e}")
+        if conn is not None:
+            conn.close()
+        if os.path.exists(BUILD_PATH):
+            os.remove(BUILD_PATH)
         return False
 
 if __name__ == "__main__":